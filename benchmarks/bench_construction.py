@@ -0,0 +1,68 @@
+"""Import time and `RhelContainer(...)` construction time.
+
+Engines are never called; a fake `podman` on PATH satisfies engine discovery, so this runs
+anywhere:
+
+    python benchmarks/bench_construction.py --handles 2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def bench_import(repeat):
+    """Best wall time of a fresh interpreter importing the package, in ms."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import rhel_containers"], check=True)
+        times.append(time.perf_counter() - start)
+    baseline = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append(time.perf_counter() - start)
+    return (min(times) - min(baseline)) * 1000
+
+
+def bench_construction(handles, cold):
+    """Mean and p95 construction time of a handle, in µs."""
+    from rhel_containers import RhelContainer
+    from rhel_containers.config import clear_config_cache
+
+    times = []
+    for i in range(handles):
+        if cold:
+            clear_config_cache()
+        start = time.perf_counter()
+        RhelContainer(name=f"rhel-{i}")
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return statistics.mean(times) * 1e6, times[int(len(times) * 0.95)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--handles", type=int, default=1000, help="handles to construct")
+    parser.add_argument("--repeat", type=int, default=5, help="interpreter starts to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = Path(tmp, "podman")
+        fake.write_text("#!/bin/sh\nexit 0\n")
+        fake.chmod(0o755)
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{os.environ['PATH']}"
+
+        print(f"import rhel_containers: {bench_import(args.repeat):8.1f} ms")
+        for label, cold in (("cold config", True), ("cached config", False)):
+            mean, p95 = bench_construction(args.handles, cold)
+            print(f"RhelContainer() {label:>13}: {mean:8.1f} µs mean {p95:8.1f} µs p95")
+
+
+if __name__ == "__main__":
+    main()
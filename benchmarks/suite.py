@@ -0,0 +1,200 @@
+"""Offline benchmark suite: RhelContainer against a stub podman/kubectl.
+
+Every container is constructed, started, runs `exec`, `setup("insights-client")` and
+`create_archive`, then is started once more with the engine watch unsupported so `start`
+falls back to `wait_for` polling. Engine calls are counted with a tracing hook; `overhead`
+is time spent beyond the simulated engine latency.
+
+    python benchmarks/suite.py --save-baseline         # record baseline.json on this machine
+    python benchmarks/suite.py                         # compare with baseline.json
+    python benchmarks/suite.py --engine kubectl --latency 0.05 --containers 1,8,32
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+
+HERE = Path(__file__).parent
+STUB = HERE.joinpath("stub", "engine")
+BASELINE = HERE.joinpath("baseline.json")
+OPERATIONS = ("construct", "start", "exec", "setup", "archive", "start.poll")
+# registration needs credentials; insights-client config goes into the stub container dir.
+CONFIG = {
+    "RHEL_CONTAINERS": {
+        "subscription": {"username": "bench", "password": "bench"},
+        "insights_client": {"conf_path": "etc/insights-client/insights-client.conf"},
+    }
+}
+
+
+class EngineCalls:
+    """Tracing hook counting engine calls per container."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        if span.name.startswith("engine."):
+            with self._lock:
+                self.counts[span.container] += 1
+
+
+def stub_environment(root, engine, latency, start_delay):
+    """Put stub `engine` first in PATH and configure it."""
+    bin_dir = Path(root, "bin")
+    bin_dir.mkdir()
+    bin_dir.joinpath(engine).symlink_to(STUB.resolve())
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    os.environ["RC_STUB_ROOT"] = str(root)
+    os.environ["RC_STUB_LATENCY"] = str(latency)
+    os.environ["RC_STUB_START_DELAY"] = str(start_delay)
+    os.environ["RC_STUB_NO_WATCH"] = "*-poll"
+
+
+def run_container(engine, name, exec_calls, archive_dir, calls):
+    """Run every operation on one container; returns {operation: (seconds, engine calls)}."""
+    results = {}
+
+    def timed(operation, func, container_name=name, repeat=1):
+        before = calls.counts[container_name]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            out = func()
+        elapsed = (time.perf_counter() - start) / repeat
+        results[operation] = (elapsed, (calls.counts[container_name] - before) / repeat)
+        return out
+
+    rc = timed("construct", lambda: RhelContainer(engine_name=engine, name=name, config=CONFIG))
+    timed("start", lambda: rc.start(timeout=30))
+    timed("exec", lambda: rc.exec("true"), repeat=exec_calls)
+    timed("setup", lambda: rc.setup("insights-client"))
+    timed("archive", lambda: rc.create_archive(archive_dir))
+    rc.stop()
+
+    poll = RhelContainer(engine_name=engine, name=f"{name}-poll", config=CONFIG)
+    timed("start.poll", lambda: poll.start(timeout=30), container_name=poll.name)
+    poll.stop()
+    return results
+
+
+def run_scale(engine, containers, exec_calls, root, latency, calls):
+    """Run `containers` containers concurrently; returns {operation: stats}."""
+    archive_dir = Path(root, "archives")
+    archive_dir.mkdir(exist_ok=True)
+    names = [f"bench-{containers}-{i}" for i in range(containers)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=containers) as executor:
+        runs = list(
+            executor.map(
+                lambda name: run_container(engine, name, exec_calls, archive_dir, calls), names
+            )
+        )
+    wall = time.perf_counter() - start
+
+    stats = {}
+    for operation in OPERATIONS:
+        seconds = [run[operation][0] for run in runs]
+        engine_calls = statistics.mean(run[operation][1] for run in runs)
+        median = statistics.median(seconds)
+        stats[operation] = {
+            "seconds": median,
+            "max": max(seconds),
+            "engine_calls": engine_calls,
+            "overhead": max(median - latency * engine_calls, 0),
+        }
+    stats["wall"] = {"seconds": wall}
+    return stats
+
+
+def compare(results, baseline, threshold, noise):
+    """Regressions as (key, seconds, baseline seconds) tuples."""
+    regressions = []
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if stats["seconds"] > base["seconds"] * (1 + threshold) + noise:
+            regressions.append((key, stats["seconds"], base["seconds"]))
+    return regressions
+
+
+def report(results, baseline):
+    print(
+        f"{'benchmark':<32}{'median':>10}{'calls':>8}{'overhead':>10}{'baseline':>10}{'delta':>8}"
+    )
+    for key, stats in results.items():
+        base = baseline.get(key, {}).get("seconds")
+        delta = f"{(stats['seconds'] / base - 1) * 100:+.0f}%" if base else ""
+        print(
+            f"{key:<32}{stats['seconds'] * 1000:>8.1f}ms"
+            f"{stats.get('engine_calls', 0):>8.1f}"
+            f"{stats.get('overhead', stats['seconds']) * 1000:>8.1f}ms"
+            + (f"{base * 1000:>8.1f}ms{delta:>8}" if base else "")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default="podman", choices=("podman", "kubectl"))
+    parser.add_argument("--containers", default="1,4,16", help="comma separated scales")
+    parser.add_argument("--exec-calls", type=int, default=20, help="exec calls per container")
+    parser.add_argument("--latency", type=float, default=0, help="seconds per engine call")
+    parser.add_argument("--start-delay", type=float, default=0.1, help="seconds until running")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown ratio")
+    parser.add_argument("--noise", type=float, default=0.005, help="ignored slowdown, seconds")
+    args = parser.parse_args()
+
+    settings = {
+        "engine": args.engine,
+        "exec_calls": args.exec_calls,
+        "latency": args.latency,
+        "start_delay": args.start_delay,
+    }
+    calls = tracing.add_hook(EngineCalls())
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        stub_environment(root, args.engine, args.latency, args.start_delay)
+        for containers in (int(n) for n in args.containers.split(",")):
+            stats = run_scale(args.engine, containers, args.exec_calls, root, args.latency, calls)
+            for operation, values in stats.items():
+                results[f"{args.engine}/{containers}/{operation}"] = values
+
+    saved = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = saved.get("results", {}) if saved.get("settings") == settings else {}
+    if not saved:
+        print(f"No baseline at {args.baseline}; record one with --save-baseline.")
+    elif not baseline:
+        print(f"Baseline {args.baseline} was recorded with other settings; not compared.")
+    report(results, baseline)
+
+    if args.save_baseline:
+        saved_results = dict(baseline)
+        saved_results.update(
+            {key: {k: round(v, 6) for k, v in stats.items()} for key, stats in results.items()}
+        )
+        data = {"settings": settings, "results": saved_results}
+        args.baseline.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.noise)
+    for key, seconds, base in regressions:
+        print(f"REGRESSION {key}: {seconds * 1000:.1f}ms, baseline {base * 1000:.1f}ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,55 +1,172 @@
+import functools
+import inspect
 import logging
 import random
-import re
 import string
 from pathlib import Path
 
-from packaging import version
+from rhel_containers.admission import AdmissionController
+from rhel_containers.admission import NOT_ADMITTED_STATUS
 from rhel_containers.config import load_config
+from rhel_containers.deadline import deadline
+from rhel_containers.deadline import RetryPolicy
+from rhel_containers.deadline import TimeoutResult
 from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import DEFAULT_TAIL
 from rhel_containers.engine import OpenshiftEngine
 from rhel_containers.engine import PodmanEngine
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.facts import ContainerFacts
+from rhel_containers.image_cache import base_profile
+from rhel_containers.image_cache import ImageCache
+from rhel_containers.image_cache import profile_name
 from rhel_containers.insights_client import InsightsClient
+from rhel_containers.packages import PackageTransaction
+from rhel_containers.pkg_cache import PackageCache
+from rhel_containers.reg_cache import RegistrationCache
+from rhel_containers.resources import ResourceLimits
+from rhel_containers.steps import Step
+from rhel_containers.steps import StepGraph
 from rhel_containers.subscription import Subscription
-from wait_for import TimedOutError
-from wait_for import wait_for
+from rhel_containers.tracing import traced
 
 EPEL_URL = "https://dl.fedoraproject.org/pub/epel/epel-release-latest-{major_ver}.noarch.rpm"
 SUPPORTED_ENV = ("ci", "qa", "prod", "stage")
 SUPPORTED_ORCHESTRATION_CLI = ("kubectl", "oc")
-SUPPORTED_ENGINE_CLI = ("podman", "docker", "kubectl", "oc")
+SUPPORTED_API_ENGINE = ("podman-api", "docker-api")
+REPLAY_ENGINE = "replay"
+SUPPORTED_ENGINE_CLI = (
+    ("podman", "docker", "kubectl", "oc") + SUPPORTED_API_ENGINE + (REPLAY_ENGINE,)
+)
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def parse_version(release):
+    from packaging import version
+
+    return version.parse(release)
+
+
 class RhelContainer:
+    podman_engine_class = PodmanEngine
+    openshift_engine_class = OpenshiftEngine
+    # None: PodmanAPIEngine, imported when an API engine is used.
+    api_engine_class = None
+    subscription_class = Subscription
+    insights_client_class = InsightsClient
+    facts_class = ContainerFacts
+    transaction_class = PackageTransaction
+    # setup profile -> method name (or function taking the RhelContainer) returning its steps.
+    setup_profiles = {
+        "insights-client": "_insights_client_steps",
+        "python": "_python_steps",
+        "ansible": "_ansible_steps",
+    }
+    # config sections a setup profile's image depends on, hashed into its image cache key;
+    # profiles not listed depend on the whole config.
+    profile_config = {
+        "insights-client": ("subscription", "insights_client", "package_cache"),
+        "python": ("package_cache",),
+        "ansible": ("package_cache",),
+    }
+
     def __init__(self, engine_name="podman", release=8.3, name=None, env="qa", *args, **kwargs):
         self.engine_name = engine_name
         self.release = str(release)
-        self.version = version.parse(self.release)
         self.name = (
             name or f"rhel-{''.join(random.choice(string.ascii_letters).lower() for _ in range(5))}"
         )
         self.env = env
         self.config = load_config(env=self.env, extra_conf=kwargs.get("config"))
+        # keep one interactive shell per container instead of an exec per command.
+        self.use_session = kwargs.get("session", False)
+
+        # Engine; `record` writes engine calls to a file `engine_name="replay"` serves them from.
+        record = {"record": kwargs["record"]} if kwargs.get("record") else {}
+        if self.use_session and (record or engine_name == REPLAY_ENGINE):
+            raise RhelContainerException(
+                msg="Shell sessions are not supported while recording or replaying."
+            )
+        if engine_name == REPLAY_ENGINE:
+            from rhel_containers.replay import replay_engine
+
+            self.engine = replay_engine(kwargs.get("recording"), name=self.name)
+        elif engine_name in SUPPORTED_ORCHESTRATION_CLI:
+            engine_class = self.openshift_engine_class
+            if record:
+                from rhel_containers.replay import recording_class
+
+                engine_class = recording_class(engine_class)
+            self.engine = engine_class(name=self.name, engine=engine_name, **record)
+        elif engine_name in SUPPORTED_API_ENGINE:
+            if record:
+                raise RhelContainerException(msg="Recording is not supported by API engines.")
+            if self.use_session:
+                raise RhelContainerException(msg="Shell sessions are not supported by API engines.")
+            engine_class = self.api_engine_class
+            if engine_class is None:
+                from rhel_containers.podman_api import PodmanAPIEngine as engine_class
+
+            self.engine = engine_class(
+                name=self.name, engine=engine_name, socket_path=kwargs.get("socket_path")
+            )
+        else:
+            engine_class = self.podman_engine_class
+            if record:
+                from rhel_containers.replay import recording_class
+
+                engine_class = recording_class(engine_class)
+            self.engine = engine_class(
+                name=self.name,
+                engine=engine_name,
+                status_provider=kwargs.get("status_provider"),
+                **record,
+            )
+
+        # Per call timeout and retry of engine errors
+        engine_config = self.config.get("engine") or {}
+        self.engine.timeout = engine_config.get("timeout")
+        self.engine.retry_policy = RetryPolicy.from_config(engine_config)
 
-        # Engine
-        self.engine = (
-            OpenshiftEngine(name=self.name, engine=engine_name)
-            if engine_name in SUPPORTED_ORCHESTRATION_CLI
-            else PodmanEngine(name=self.name, engine=engine_name)
+        # Cached packages and static facts
+        self.facts = self.facts_class(engine=self.engine)
+
+        # Images committed after setup profiles; `profiles` are the ones applied so far
+        # and `cached_profiles` the ones baked in the image container started from.
+        self.image_cache = ImageCache(engine=self.engine) if kwargs.get("image_cache") else None
+        self.profiles = []
+        self.cached_profiles = ()
+
+        # Host side package caches mounted in container
+        self.package_cache = PackageCache.from_config(
+            self.config.get("package_cache"), release=self.release
         )
 
+        # Host side copies of rhsm certificates reused by containers of the same identity
+        self.registration_cache = RegistrationCache.from_config(
+            self.config.get("registration_cache")
+        )
+
+        # Resource limits (`resources` dict overrides config) and admission control of starts
+        self.resources = kwargs.get("resources")
+        self.admission = kwargs.get("admission") or AdmissionController.from_config(
+            self.config.get("admission")
+        )
+        self.admission_ticket = None
+
         # Subscription
-        self.subscription = Subscription(
+        self.subscription = self.subscription_class(
             engine=self.engine,
             config=self.config.subscription,
             env=self.env,
+            cache=self.registration_cache,
         )
 
         # Insights-client
-        self.insights_client = InsightsClient(
-            engine=self.engine, config=self.config.insights_client, env=self.env
+        self.insights_client = self.insights_client_class(
+            engine=self.engine, config=self.config.insights_client, env=self.env, facts=self.facts
         )
 
         # check for engine
@@ -62,58 +179,194 @@ class RhelContainer:
             self.env in SUPPORTED_ENV
         ), f"'{self.env}' not supported. Supported env are {SUPPORTED_ENV}"
 
-    def start(self, hostname=None, envs=None, wait=True, *args, **kwargs):
+    @traced("start")
+    def start(self, hostname=None, envs=None, wait=True, timeout=60, profile=None, *args, **kwargs):
         """Start container.
 
         Args:
             hostname: Set container hostname
             env: List of environment variables to set in container
             wait: wait for container/pod up and running.
+            timeout: seconds to wait for container/pod up and running; if it isn't by
+                then, it is stopped and `TimeoutResult` is returned.
+            profile: setup profile (or list of profiles) to boot from image cache
+                if cached (needs `image_cache=True`); also selects its resource limits.
+                Profiles run with non default options are named by `profile_name`.
+
+        Raises:
+            RhelContainerException: container/pod reached terminal state while waiting.
         """
         logger.info(f"Provisioning RHEL-{self.version} container")
-        repo = self.config.repositories.get(self.version.major)
-        image = f"{repo}:{self.release}"
-
-        if self.version.major == 9:
-            envs = envs + ["SMDEV_CONTAINER_OFF=False"] if envs else ["SMDEV_CONTAINER_OFF=False"]
+        image, envs = self._run_args(envs, profile=profile)
+        if self.package_cache:
+            self.package_cache.evict()
+            kwargs.setdefault("volumes", self.package_cache.volumes())
+        kwargs.setdefault("resources", self.resource_limits(profile))
+        if self.admission:
+            memory = kwargs["resources"].memory if kwargs["resources"] else None
+            self.admission_ticket = self.admission.acquire(self.name, memory=memory)
+            if self.admission_ticket is None:
+                return self._not_admitted()
         out = self.engine.run(image=image, hostname=hostname, envs=envs, *args, **kwargs)
-        if wait:
+        if out.exit_status != 0:
+            self._release_admission()
+        elif wait:
             try:
-                wait_for(lambda: self.status == "Running", timeout="60s")
-            except TimedOutError:
-                print("Pod are not Running.")
+                running = self.engine.wait_running(timeout=timeout)
+            except RhelContainerException:
+                self._release_admission()
+                raise
+            if not running:
+                logger.error(f"{self.name} not running after {timeout}s, stopping it")
+                self.stop()
+                return TimeoutResult(command=out.command, timeout=timeout)
 
         if out.exit_status == 0:
             logger.info("Successfully provisioned container")
+            if self.package_cache and wait:
+                self.exec_many(self.package_cache.setup_cmds())
+            if self.use_session and wait:
+                self.open_session()
         else:
             logger.error(f"Fail to provision container: {out.stderr}")
         return out
 
+    @property
+    def version(self):
+        return parse_version(self.release)
+
+    @property
+    def base_image(self):
+        """Repository image of release."""
+        return f"{self.config.repositories.get(self.version.major)}:{self.release}"
+
+    def _run_args(self, envs=None, profile=None):
+        """Image and environment variables for `engine.run`."""
+        image = self.base_image
+        self.profiles, self.cached_profiles = [], ()
+        if self.image_cache and profile:
+            profiles = [profile] if isinstance(profile, str) else list(profile)
+            cached = self._cached_image(profiles)
+            if self.image_cache.exists(cached):
+                logger.info(f"Starting from cached image {cached}")
+                image = cached
+                self.profiles, self.cached_profiles = profiles, tuple(profiles)
+
+        if self.version.major == 9:
+            envs = envs + ["SMDEV_CONTAINER_OFF=False"] if envs else ["SMDEV_CONTAINER_OFF=False"]
+        return image, envs
+
+    def resource_limits(self, profile=None):
+        """ResourceLimits of container started with setup profile(s); None if unlimited."""
+        profiles = [profile] if isinstance(profile, str) else list(profile or [])
+        return ResourceLimits.from_config(
+            self.config.get("resources"),
+            profile=[base_profile(name) for name in profiles],
+            overrides=self.resources,
+        )
+
+    def _not_admitted(self):
+        """Result of a start given up because the host had no capacity for it."""
+        reason = f"Host has no capacity: {self.admission.last_reason}"
+        logger.error(f"{self.name} not admitted: {self.admission.last_reason}")
+        return ContCommandResult(exit_status=NOT_ADMITTED_STATUS, stdout="", stderr=reason)
+
+    def _release_admission(self):
+        if self.admission and self.admission_ticket is not None:
+            self.admission.release(self.admission_ticket)
+        self.admission_ticket = None
+
+    def _cached_image(self, profiles):
+        sections = set()
+        for name in profiles:
+            sections.update(self.profile_config.get(base_profile(name), self.config.keys()))
+        return self.image_cache.image(
+            base_image=self.base_image,
+            release=self.release,
+            env=self.env,
+            profiles=profiles,
+            config={key: self.config.get(key) for key in sections},
+        )
+
+    def _profile_done(self, profile, out):
+        """Record applied setup profile and commit it to image cache if not cached yet."""
+        if out is None or out.exit_status != 0:
+            return
+        if profile not in self.profiles:
+            self.profiles.append(profile)
+        if self.image_cache and profile not in self.cached_profiles:
+            cached = self._cached_image(self.profiles)
+            if not self.image_cache.exists(cached):
+                self.image_cache.commit(cached)
+
+    def release_resources(self):
+        """Close shell session and give back admission ticket, leaving container as is.
+
+        `stop` does it; call it directly for containers removed by other means (e.g. a
+        bulk delete of labelled pods).
+        """
+        self.close_session()
+        self._release_admission()
+
     def stop(self):
         """Stop container."""
         logger.info("Stopping container")
+        self.release_resources()
         return self.engine.stop()
 
+    def open_session(self):
+        """Open persistent shell session; following `exec` calls reuse it."""
+        return self.engine.open_session()
+
+    def close_session(self):
+        """Close persistent shell session."""
+        return self.engine.close_session()
+
     @property
     def status(self):
         """Return status of container."""
         return self.engine.status
 
-    def exec(self, cmd):
+    def exec(self, cmd, timeout=None):
         """Execute command on container.
 
         Args:
             cmd: command string
+            timeout: seconds after which command is killed; `TimeoutResult` is returned
+        """
+        return self.engine.exec(cmd=cmd, timeout=timeout)
+
+    def exec_stream(self, cmd, callback=None, sink=None, tail=DEFAULT_TAIL, timeout=None):
+        """Execute command on container handing its output over while it runs.
+
+        Args:
+            cmd: command string
+            callback: called with (stream, line) for every line
+            sink: file-like object every line gets written to
+            tail: lines of each stream kept in final result; None keeps everything
+            timeout: seconds after which command is killed; result is a `TimeoutResult`
+
+        Returns:
+            ExecStream; iterate it for (stream, line) tuples or `wait()` for the result.
         """
-        return self.engine.exec(cmd=cmd)
+        return self.engine.exec_stream(
+            cmd, callback=callback, sink=sink, tail=tail, timeout=timeout
+        )
+
+    def exec_many(self, cmds, stop_on_failure=False, timeout=None):
+        """Execute list of commands on container in one round-trip.
+
+        Args:
+            cmds: list of command strings
+            stop_on_failure: skip remaining commands after first failure
+            timeout: seconds for the whole batch
+        """
+        return self.engine.exec_many(cmds, stop_on_failure=stop_on_failure, timeout=timeout)
 
     @property
     def hostname(self):
         """It will give you current hostname."""
-        # In rhel container sometime hostname pkg missing.
-        if not self.is_pkg_installed("hostname"):
-            self.install("hostname")
-        return self.exec("hostname").stdout
+        return self.facts.hostname
 
     @property
     def pkg_mng(self):
@@ -122,54 +375,69 @@ class RhelContainer:
     @property
     def redhat_release(self):
         """It will return redhat-release"""
-        out = self.exec("cat /etc/redhat-release")
-        return out.stdout
+        return self.facts.redhat_release
 
     def install(self, pkg):
         """Install package on container.
 
         Args:
-            pkg: Package to install
+            pkg: Package (or list of packages) to install in one transaction
         """
-        return self.engine.exec(f"{self.pkg_mng} install -y {pkg}")
+        return self.engine.exec(self._install_cmd(pkg))
+
+    def _install_cmd(self, pkg):
+        pkg = pkg if isinstance(pkg, str) else " ".join(pkg)
+        return f"{self.pkg_mng} install -y {pkg}"
 
     def remove(self, pkg):
         """remove package on container.
 
         Args:
-            pkg: Package to remove
+            pkg: Package (or list of packages) to remove in one transaction
         """
+        pkg = pkg if isinstance(pkg, str) else " ".join(pkg)
         return self.engine.exec(f"{self.pkg_mng} remove -y {pkg}")
 
+    def transaction(self, skip_broken=False):
+        """Queue installs/removals and flush them as one dnf/yum transaction.
+
+        Args:
+            skip_broken: skip unavailable packages instead of failing whole transaction
+        """
+        return self.transaction_class(self, skip_broken=skip_broken)
+
     def is_pkg_installed(self, pkg):
         """Check specific package already installed or not.
 
         Args:
             pkg: Package, which you want to verify.
         """
-        out = self.engine.exec(f"which {pkg}")
-        return not out.exit_status
+        return self.facts.is_installed(pkg)
 
-    def enable_epel(self):
-        """Enable EPEL repository on container."""
+    def _enable_epel_cmds(self):
         epel = EPEL_URL.format(major_ver=self.version.major)
-        epel_status = self.install(epel)
+        cmds = [self._install_cmd(epel)]
 
         # RHEL 7 it is recommended to also enable the optional, extras, and
         # HA repositories since EPEL packages may depend on packages from these repositories
         if self.version.major == 7:
-            self.exec(
+            cmds.append(
                 'subscription-manager repos --enable "rhel-*-optional-rpms" --enable '
                 '"rhel-*-extras-rpms"  --enable "rhel-ha-for-rhel-*-server-rpms"'
             )
 
         # RHEL 8 it is required to also enable the codeready-builder-for-rhel-8-*-rpms repository since EPEL packages may depend on packages from it
         if self.version.major == 8:
-            arch = self.exec("/bin/arch").stdout
-            self.exec(
+            arch = self.facts.cached("arch") or "$(/bin/arch)"
+            cmds.append(
                 f"subscription-manager repos --enable codeready-builder-for-rhel-8-{arch}-rpms"
             )
             # self.exec("dnf config-manager --set-enabled powertools")
+        return cmds
+
+    def enable_epel(self):
+        """Enable EPEL repository on container."""
+        return self.exec_many(self._enable_epel_cmds())[0]
 
     def copy_to_cont(self, host_path, cont_path):
         """Copy file from host to container.
@@ -192,70 +460,218 @@ class RhelContainer:
     def add_file(self, filename, content, overwrite=False):
         return self.engine.add_file(filename=filename, content=content, overwrite=overwrite)
 
-    def create_archive(self, path="."):
-        """Create archive of container.
+    def put_file(self, cont_path, data=None, host_path=None, mode=None, checksum=True):
+        """Write file in container; bytes are streamed, not passed in a command line.
 
         Args:
-            hostpath: Path to save
+            cont_path: destination path in container
+            data: content as str, bytes or binary file object
+            host_path: host file to copy instead of `data`
+            mode: permission bits like 0o600
+            checksum: skip transfer if container file is already identical
         """
-        host_path = Path(path)
-        out = self.insights_client.register(keep_archive=True)
-        archive_path = Path(re.search("[^ ]*.tar.gz", out.stdout)[0])
-        if host_path.is_dir() and host_path.exists():
-            host_path = host_path.joinpath(archive_path.name)
-        return self.copy_to_host(
-            host_path=host_path.absolute().__str__(), cont_path=archive_path.absolute().__str__()
+        return self.engine.put_file(
+            cont_path, data=data, host_path=host_path, mode=mode, checksum=checksum
         )
 
-    def setup_python(self, python="3"):
-        """Install python3"""
-        if self.is_pkg_installed(f"python{python}"):
-            logger.info(f"python{python} already installed.")
-        else:
-            self.install(f"python{python}")
-            logger.info(f"Successfully installed python{python}")
-        out = self.exec(f"python{python} -m pip install --upgrade pip setuptools wheel")
+    def put_files(self, files, mode=None, checksum=True):
+        """Write many files in container with a single tar transfer.
+
+        Args:
+            files: dict of container path -> content (str/bytes) or host `pathlib.Path`
+            mode: permission bits of files from content
+            checksum: leave out files already identical in container
+        """
+        return self.engine.put_files(files, mode=mode, checksum=checksum)
+
+    def get_file(self, cont_path, dest):
+        """Copy file from container to host path or binary file object."""
+        return self.engine.get_file(cont_path, dest)
+
+    def create_archive(self, path=".", decompress=False, index=False):
+        """Create archive of container streaming it straight to host.
+
+        Args:
+            path: host file, or directory to save archive with its own name
+            decompress: save plain tar instead of `.tar.gz`
+            index: list archive members while streaming (`members` of result)
+        """
+        out = self.insights_client.collect_archive(
+            self._archive_dest(path), decompress=decompress, index=index
+        )
+        return self._archive_done(path, out)
+
+    def _archive_dest(self, path):
+        """Host file archive gets streamed to; a temporary name inside directory `path`."""
+        host_path = Path(path)
+        return host_path.joinpath(f".{self.name}.partial") if host_path.is_dir() else host_path
+
+    @staticmethod
+    def _archive_done(path, out):
+        """Rename archive streamed in directory `path` after its name in container."""
+        if out.exit_status == 0 and Path(path).is_dir() and out.stdout:
+            target = Path(path).joinpath(out.stdout)
+            Path(out.dest).rename(target)
+            out.dest = target
+        return out
+
+    def _setup_python_cmds(self, python="3"):
+        return [
+            f"which python{python} || {self._install_cmd(f'python{python}')}",
+            f"python{python} -m pip install --upgrade pip setuptools wheel",
+        ]
+
+    def _python_steps(self, python="3"):
+        return [Step(f"python{python}", self._setup_python_cmds(python))]
+
+    def profile_graph(self, profile, **kwargs):
+        """StepGraph of setup profile; kwargs go to the profile's step builder."""
+        try:
+            builder = self.setup_profiles[profile]
+        except KeyError:
+            raise ValueError(f"Unknown setup profile '{profile}'.")
+        if isinstance(builder, str):
+            return StepGraph(getattr(self, builder)(**kwargs))
+        return StepGraph(builder(self, **kwargs))
+
+    def profile_name(self, profile, **kwargs):
+        """Name setup profile run with kwargs is recorded and cached under.
+
+        Kwargs left at the step builder's default are left out, so `setup_ansible()` is
+        recorded as `ansible` and `setup_ansible(setup_ssh=False)` as
+        `ansible(setup_ssh=False)`.
+        """
+        builder = self.setup_profiles[profile]
+        builder = getattr(self, builder) if isinstance(builder, str) else builder
+        params = inspect.signature(builder).parameters
+        options = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in params or params[key].default != value
+        }
+        return profile_name(profile, options)
+
+    def run_profile(self, profile, name=None, workers=4, **kwargs):
+        """Run step graph of setup profile, independent steps at the same time.
+
+        Args:
+            profile: key of `setup_profiles`
+            name: profile name recorded for image cache; defaults to `profile_name`
+            workers: max steps running at the same time
+            kwargs: passed to the profile's step builder
+
+        Returns:
+            ProfileResult with per step results and timing in `steps`.
+        """
+        name = name or self.profile_name(profile, **kwargs)
+        out = self.profile_graph(profile, **kwargs).run(self.engine, workers=workers)
+        self._profile_done(name, out)
+        return self._log_setup(name, out)
+
+    @staticmethod
+    def _log_setup(what, out):
         if out.exit_status == 0:
-            logger.info(f"Successfully setup python{python}")
+            logger.info(f"Successfully setup {what}")
         else:
-            logger.error(f"Fail to setup python{python} >> {out.stderr}")
+            logger.error(f"Fail to setup {what} >> {out.stderr}")
         return out
 
+    def setup_python(self, python="3"):
+        """Install python3"""
+        profile = self.profile_name("python", python=python)
+        if profile in self.cached_profiles:
+            return ContCommandResult(exit_status=0, stdout=f"{profile} restored from image cache")
+        return self.run_profile("python", python=python)
+
+    def _ansible_steps(self, setup_ssh=True):
+        # python and ssh packages go in one transaction; sshd setup and pip installs of
+        # ansible only need the packages, not each other.
+        txn = self.transaction().install("python3")
+        if setup_ssh:
+            txn.install("openssh-server ed openssh-clients tlog glibc-langpack-en")
+        steps = [
+            Step("packages", txn.commands()),
+            Step(
+                "ansible",
+                self._setup_python_cmds()[1:]
+                + [
+                    "pip3 install --trusted-host pypi.org --trusted-host files.pythonhosted.org ansible"
+                ],
+                requires=["packages"],
+            ),
+        ]
+        if setup_ssh:
+            steps.append(
+                Step(
+                    "sshd",
+                    [
+                        "systemctl enable sshd",
+                        "sed -i 's/#Port.*$/Port 22/' /etc/ssh/sshd_config && chmod 775 /var/run && rm -f /var/run/nologin",
+                    ],
+                    requires=["packages"],
+                )
+            )
+        return steps
+
     def setup_ansible(self, setup_ssh=True):
         """Install ansible and setup ansible"""
-        # check for python as we are going to use pip for installation
         logger.info("Started ansible setup")
+        profile = self.profile_name("ansible", setup_ssh=setup_ssh)
+        if profile in self.cached_profiles:
+            return ContCommandResult(exit_status=0, stdout=f"{profile} restored from image cache")
         if self.is_pkg_installed("ansible"):
-            logger.info(f"ansible already installed.")
-            out = ContCommandResult(exit_status=0, stdout="ansible already installed")
-        else:
-            self.setup_python()
-            if setup_ssh:
-                self.install("openssh-server ed openssh-clients tlog glibc-langpack-en")
-                self.exec("systemctl enable sshd")
-                self.exec(
-                    "sed -i 's/#Port.*$/Port 22/' /etc/ssh/sshd_config && chmod 775 /var/run && rm -f /var/run/nologin"
-                )
-            out = self.exec(
-                "pip3 install --trusted-host pypi.org --trusted-host "
-                "files.pythonhosted.org ansible"
-            )
-            logger.info("Successfully setup ansible")
-        return out
+            logger.info("ansible already installed.")
+            return ContCommandResult(exit_status=0, stdout="ansible already installed")
+        return self.run_profile("ansible", setup_ssh=setup_ssh)
+
+    def _insights_client_steps(self):
+        """Subscribe, install, configure and register insights-client steps."""
+        # registration may be injected from cache instead of running the command.
+        steps = [Step("subscribe", action=self.subscription.register)]
+        register_requires = ["subscribe"]
+        # cached image has insights-client installed and configured; only registration
+        # was left out.
+        if self.profile_name("insights-client") not in self.cached_profiles:
+            # insights-client and hostname (needed by insights-client) in one transaction.
+            txn = self.transaction().install("insights-client", "hostname")
+            steps.append(Step("packages", txn.commands(), requires=["subscribe"]))
+            register_requires.append("packages")
+            configure_cmd = self.insights_client._configure_cmd()
+            if configure_cmd:
+                # written once the package is in, so its install can't replace the config.
+                steps.append(Step("configure", [configure_cmd], requires=["packages"]))
+                register_requires.append("configure")
+        register_cmds = self.insights_client._register_cmds(install_deps=False)
+        steps.append(Step("register", register_cmds, requires=register_requires))
+        return steps
+
+    @traced("setup")
+    def setup(self, *args, timeout=None, **kwargs):
+        """Run setup profiles in given order, stopping at first failure.
+
+        Args:
+            args: "subscribe" or keys of `setup_profiles` like "insights-client"
+            timeout: seconds for the whole setup; engine calls still running then are
+                killed and return `TimeoutResult`
+            kwargs: passed to `run_profile`
 
-    def setup(self, *args, **kwargs):
-        if "subscribe" in args:
-            out = self.subscription.register()
-            return out
-
-        if "insights-client" in args:
-            for k, v in [
-                ("subscription", "register"),
-                ("insights_client", "install"),
-                ("insights_client", "configure"),
-                ("insights_client", "register"),
-            ]:
-                out = getattr(getattr(self, k), v)()
-                if out.exit_status != 0:
-                    return out
-            return out
+        Returns:
+            result of last profile run
+        """
+        with deadline(timeout):
+            return self._setup(*args, **kwargs)
+
+    def _setup(self, *args, **kwargs):
+        out = None
+        for profile in args:
+            if profile == "subscribe":
+                out = self.subscription.register()
+            elif profile in self.setup_profiles:
+                logger.info(f"Setting up {profile} on {self.name}")
+                out = self.run_profile(profile, **kwargs)
+            else:
+                logger.error(f"Unknown setup profile '{profile}'")
+                return None
+            if out.exit_status != 0:
+                break
+        return out
@@ -0,0 +1,381 @@
+# Admission control of container starts: a start waits until the host has cpu, memory and
+# load headroom for one more container. Load averages and memory usage trail starts by
+# seconds, so every admitted container reserves its memory for a settle time on top.
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from rhel_containers import tracing
+from rhel_containers.deadline import bounded
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import PodmanEngine
+from rhel_containers.resources import parse_memory
+
+logger = logging.getLogger(__name__)
+
+# seconds between two /proc/stat samples cpu usage is computed from.
+CPU_SAMPLE_INTERVAL = 0.5
+# admission latencies kept for percentiles.
+LATENCY_WINDOW = 1024
+# exit status of a start given up for lack of host capacity (EX_TEMPFAIL); distinct from
+# a timed out (124) or failing (125) engine call, so it is neither retried nor a timeout.
+NOT_ADMITTED_STATUS = 75
+
+
+def read_meminfo(proc="/proc"):
+    """(MemTotal, MemAvailable) in bytes."""
+    info = {}
+    for line in Path(proc, "meminfo").read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key in ("MemTotal", "MemAvailable"):
+            info[key] = int(value.split()[0]) * 1024
+    return info.get("MemTotal"), info.get("MemAvailable")
+
+
+def read_loadavg(proc="/proc"):
+    """1 minute load average."""
+    return float(Path(proc, "loadavg").read_text().split()[0])
+
+
+def read_cpu_times(proc="/proc"):
+    """(busy, total) jiffies of all cpus; iowait counts as idle."""
+    fields = [int(value) for value in Path(proc, "stat").read_text().split("\n", 1)[0].split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    total = sum(fields[:8])
+    return total - idle, total
+
+
+class HostStats:
+    """Capacity of the host containers run on; None where a source doesn't tell.
+
+    Attributes:
+        cpus: number of cpus
+        load: 1 minute load average
+        cpu_busy: busy fraction of all cpus
+        mem_total: bytes of memory
+        mem_available: bytes available without swapping
+    """
+
+    __slots__ = ("cpus", "load", "cpu_busy", "mem_total", "mem_available")
+
+    def __init__(self, cpus=None, load=None, cpu_busy=None, mem_total=None, mem_available=None):
+        self.cpus = cpus
+        self.load = load
+        self.cpu_busy = cpu_busy
+        self.mem_total = mem_total
+        self.mem_available = mem_available
+
+    @classmethod
+    def from_podman_info(cls, stdout):
+        """Stats of `podman info --format json` output (host of a remote engine)."""
+        host = json.loads(stdout).get("host") or {}
+        usage = host.get("cpuUtilization") or {}
+        idle = usage.get("idlePercent")
+        return cls(
+            cpus=host.get("cpus"),
+            cpu_busy=(100 - idle) / 100 if idle is not None else None,
+            mem_total=host.get("memTotal"),
+            mem_available=host.get("memFree"),
+        )
+
+    def __repr__(self):
+        return (
+            f"HostStats(cpus={self.cpus}, load={self.load}, cpu_busy={self.cpu_busy}, "
+            f"mem_available={self.mem_available})"
+        )
+
+
+class Admission:
+    """Ticket of an admitted container; its memory is reserved until released or settled."""
+
+    __slots__ = ("name", "memory", "admitted_at", "waited")
+
+    def __init__(self, name, memory, waited):
+        self.name = name
+        self.memory = memory
+        self.admitted_at = time.monotonic()
+        self.waited = waited
+
+    def __repr__(self):
+        return f"Admission(name={self.name!r}, waited={self.waited:.2f}s)"
+
+
+class AdmissionController:
+    """Let container starts through only while the host has capacity for them.
+
+    A start is admitted when the 1 minute load per cpu is at most `max_load`, cpus are busy
+    at most `max_cpu` and `min_memory` stays available after the memory of the container
+    (its memory limit, else `reserve_memory`) and of containers admitted less than `settle`
+    seconds ago. Otherwise it waits in a queue and checks again every `interval` seconds.
+    Shared by all containers of a process (see `from_config`) or passed as `admission=`.
+
+    Stats come from one `source` only, describing the host containers run on: the local
+    /proc for a local engine, `podman info` for a remote one, as local /proc says nothing
+    about a remote host. They aren't combined: for a local engine `podman info` reports
+    the same host at the cost of a subprocess per sample, and without a load average, so
+    `max_load` isn't checked with `source: engine`.
+
+    Args:
+        max_load: max 1 minute load average per cpu
+        max_cpu: max busy fraction of all cpus
+        min_memory: bytes (or size like `1g`) which must stay available
+        reserve_memory: bytes reserved for an admitted container without memory limit
+        settle: seconds memory of an admitted container stays reserved
+        max_starting: max containers admitted within `settle` seconds; None for no limit
+        interval: seconds between capacity checks of a waiting start
+        max_wait: seconds a start waits before it is given up; None waits forever
+        source: `proc` reads the local /proc, `engine` asks `podman info` (remote engines)
+        engine: podman binary for `source: engine`
+        proc: proc filesystem root
+
+    Example:
+        admission = AdmissionController(max_load=1.0, min_memory="2g", max_starting=4)
+        conts = [RhelContainer(admission=admission) for _ in range(50)]
+        admission.to_dict()  # {"queue_depth": 12, "latency": {"p95": 8.1, ...}, ...}
+    """
+
+    def __init__(
+        self,
+        max_load=1.5,
+        max_cpu=0.9,
+        min_memory="1g",
+        reserve_memory="512m",
+        settle=30,
+        max_starting=None,
+        interval=1,
+        max_wait=600,
+        source="proc",
+        engine="auto",
+        proc="/proc",
+    ):
+        self.max_load = max_load
+        self.max_cpu = max_cpu
+        self.min_memory = parse_memory(min_memory) or 0
+        self.reserve_memory = parse_memory(reserve_memory) or 0
+        self.settle = settle
+        self.max_starting = max_starting
+        self.interval = interval
+        self.max_wait = max_wait
+        if source not in ("proc", "engine"):
+            raise ValueError(f"Unknown admission source '{source}'; use 'proc' or 'engine'.")
+        self.source = source
+        self.proc = proc
+        self._engine = None
+        if source == "engine":
+            self._engine = PodmanEngine(name="admission", engine=engine)
+        self._lock = threading.Lock()
+        self._tickets = []
+        self._cpu_sample = None
+        self._cpu_busy = None
+        # metrics
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.given_up = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.last_reason = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Controller of `admission` config section, shared by equal sections; None if disabled."""
+        if not config or not config.get("enabled"):
+            return None
+        settings = {
+            key: value for key, value in config.items() if key != "enabled" and value is not None
+        }
+        return _shared_controller(tuple(sorted(settings.items())))
+
+    def _proc_cpu_busy(self):
+        """Busy cpu fraction since previous sample at least CPU_SAMPLE_INTERVAL ago."""
+        now = time.monotonic()
+        if self._cpu_sample is None or now - self._cpu_sample[0] >= CPU_SAMPLE_INTERVAL:
+            busy, total = read_cpu_times(self.proc)
+            if self._cpu_sample is not None and total > self._cpu_sample[2]:
+                _, last_busy, last_total = self._cpu_sample
+                self._cpu_busy = (busy - last_busy) / (total - last_total)
+            self._cpu_sample = (now, busy, total)
+        return self._cpu_busy
+
+    def sample(self):
+        """Current HostStats."""
+        if self._engine is not None:
+            out = self._engine._exec([self._engine.engine, "info", "--format", "json"])
+            if out.exit_status != 0:
+                logger.warning(f"Fail to get engine stats >> {out.stderr}")
+                return HostStats()
+            return HostStats.from_podman_info(out.stdout)
+        mem_total, mem_available = read_meminfo(self.proc)
+        with self._lock:
+            cpu_busy = self._proc_cpu_busy()
+        return HostStats(
+            cpus=os.cpu_count(),
+            load=read_loadavg(self.proc),
+            cpu_busy=cpu_busy,
+            mem_total=mem_total,
+            mem_available=mem_available,
+        )
+
+    def _settling(self):
+        now = time.monotonic()
+        self._tickets = [t for t in self._tickets if now - t.admitted_at < self.settle]
+        return self._tickets
+
+    @property
+    def reserved_memory(self):
+        """Bytes reserved by containers admitted less than `settle` seconds ago."""
+        with self._lock:
+            return sum(ticket.memory for ticket in self._settling())
+
+    def check(self, stats, memory=0):
+        """Why a container needing `memory` bytes isn't admitted, or None if it is."""
+        settling = self._settling()
+        if self.max_starting is not None and len(settling) >= self.max_starting:
+            return f"{len(settling)} containers starting"
+        if stats.load is not None and stats.cpus and stats.load / stats.cpus > self.max_load:
+            return f"load {stats.load:.2f} on {stats.cpus} cpus"
+        if stats.cpu_busy is not None and stats.cpu_busy > self.max_cpu:
+            return f"cpus {stats.cpu_busy:.0%} busy"
+        if stats.mem_available is not None:
+            left = stats.mem_available - sum(t.memory for t in settling) - memory
+            if left < self.min_memory:
+                return f"{stats.mem_available // 1024**2} MiB available"
+        return None
+
+    def try_admit(self, name=None, memory=None, waited=0.0):
+        """Admission if host has capacity now, else None."""
+        memory = memory or self.reserve_memory
+        stats = self.sample()
+        with self._lock:
+            self.last_reason = reason = self.check(stats, memory)
+            if reason is not None:
+                return None
+            ticket = Admission(name, memory, waited)
+            self._tickets.append(ticket)
+            self.admitted += 1
+            self.latencies.append(waited)
+        logger.debug(f"Admitted {name} after {waited:.2f}s")
+        return ticket
+
+    def _enqueue(self, delta):
+        with self._lock:
+            self.queue_depth += delta
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def _give_up(self, name, waited):
+        with self._lock:
+            self.given_up += 1
+        logger.error(f"{name} not admitted after {waited:.1f}s: {self.last_reason}")
+
+    def acquire(self, name=None, memory=None, timeout=None):
+        """Wait until container can start; None if it can't within timeout.
+
+        Args:
+            name: container name, for logs and tracing
+            memory: bytes container may use; default `reserve_memory`
+            timeout: seconds to wait; default `max_wait`, bounded by current deadline
+        """
+        timeout = bounded(self.max_wait if timeout is None else timeout)
+        started = time.monotonic()
+        with tracing.span("admission", name) as span:
+            ticket = self.try_admit(name, memory)
+            if ticket is None:
+                logger.info(f"Waiting for host capacity to start {name}: {self.last_reason}")
+                self._enqueue(1)
+                try:
+                    while ticket is None:
+                        waited = time.monotonic() - started
+                        if timeout is not None and waited + self.interval > timeout:
+                            self._give_up(name, waited)
+                            break
+                        time.sleep(self.interval)
+                        ticket = self.try_admit(name, memory, time.monotonic() - started)
+                finally:
+                    self._enqueue(-1)
+            span.finish(_result(ticket))
+        return ticket
+
+    async def acquire_async(self, name=None, memory=None, timeout=None):
+        """`acquire` for asyncio; waiting doesn't block the event loop."""
+        import asyncio
+
+        timeout = bounded(self.max_wait if timeout is None else timeout)
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        with tracing.span("admission", name) as span:
+            # `source: engine` runs a subprocess for every sample.
+            ticket = await loop.run_in_executor(None, self.try_admit, name, memory)
+            if ticket is None:
+                logger.info(f"Waiting for host capacity to start {name}: {self.last_reason}")
+                self._enqueue(1)
+                try:
+                    while ticket is None:
+                        waited = time.monotonic() - started
+                        if timeout is not None and waited + self.interval > timeout:
+                            self._give_up(name, waited)
+                            break
+                        await asyncio.sleep(self.interval)
+                        waited = time.monotonic() - started
+                        ticket = await loop.run_in_executor(
+                            None, self.try_admit, name, memory, waited
+                        )
+                finally:
+                    self._enqueue(-1)
+            span.finish(_result(ticket))
+        return ticket
+
+    def release(self, ticket):
+        """Drop reservation of admitted container before it settled (e.g. start failed)."""
+        with self._lock:
+            if ticket in self._tickets:
+                self._tickets.remove(ticket)
+
+    def to_dict(self):
+        """Queue depth, admissions and admission latency percentiles."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            starting = len(self._settling())
+            reserved = sum(ticket.memory for ticket in self._tickets)
+            data = {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "given_up": self.given_up,
+                "starting": starting,
+                "reserved_memory": reserved,
+            }
+
+        def percentile(fraction):
+            return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)]
+
+        data["latency"] = (
+            {
+                "count": len(latencies),
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1],
+            }
+            if latencies
+            else {"count": 0}
+        )
+        return data
+
+    def __repr__(self):
+        return (
+            f"AdmissionController(queue_depth={self.queue_depth}, admitted={self.admitted}, "
+            f"given_up={self.given_up})"
+        )
+
+
+def _result(ticket):
+    """Admission span result; a start given up fails with `NOT_ADMITTED_STATUS`."""
+    return ContCommandResult(exit_status=0 if ticket is not None else NOT_ADMITTED_STATUS)
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_controller(settings):
+    return AdmissionController(**dict(settings))
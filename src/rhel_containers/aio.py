@@ -0,0 +1,572 @@
+# asyncio flavour of engines, subscription, insights-client and RhelContainer.
+#
+# Async classes reuse command building of their sync counterparts and only swap the
+# subprocess layer. Sync methods which simply return `self._exec(...)`/`engine.exec(...)`
+# become awaitable as is; methods post-processing results are overridden here.
+import asyncio
+import contextvars
+import functools
+import logging
+import subprocess
+import time
+
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.deadline import bounded
+from rhel_containers.deadline import deadline
+from rhel_containers.deadline import TimeoutResult
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import DEFAULT_TAIL
+from rhel_containers.engine import engine_operation
+from rhel_containers.engine import kill_process_group
+from rhel_containers.engine import OpenshiftEngine
+from rhel_containers.engine import PodmanEngine
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.facts import ContainerFacts
+from rhel_containers.facts import FACT_CMDS
+from rhel_containers.insights_client import InsightsClient
+from rhel_containers.packages import PackageTransaction
+from rhel_containers.status import DEFAULT_TTL
+from rhel_containers.status import parse_ps
+from rhel_containers.status import StatusProvider
+from rhel_containers.stream import CHUNK_SIZE
+from rhel_containers.stream import OutputCollector
+from rhel_containers.stream import STDERR
+from rhel_containers.stream import STDOUT
+from rhel_containers.subscription import Subscription
+from rhel_containers.tracing import redact
+from rhel_containers.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEngineMixin:
+    """Run engine commands with `asyncio.create_subprocess_exec`."""
+
+    async def _exec(self, command):
+        """Internal use to execute subprocess cmd; retries engine errors per `retry_policy`."""
+        attempt = 0
+        while True:
+            out = await self._exec_once(command)
+            delay = self.retry_policy.next_delay(out, attempt) if self.retry_policy else None
+            if delay is None:
+                return out
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _exec_once(self, command):
+        with tracing.span(engine_operation(command), self.name, command) as span:
+            timeout = bounded(self.timeout)
+            if timeout is not None and timeout <= 0:
+                return span.finish(TimeoutResult(command=command))
+            proc = await asyncio.create_subprocess_exec(
+                *command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+            )
+            communicate = asyncio.ensure_future(proc.communicate())
+            try:
+                stdout, stderr = await asyncio.wait_for(asyncio.shield(communicate), timeout)
+            except asyncio.TimeoutError:
+                kill_process_group(proc)
+                stdout, stderr = await communicate
+                logger.error(f"Timed out after {timeout:.1f}s: {redact(' '.join(command))}")
+                return span.finish(TimeoutResult(command, timeout, stdout, stderr))
+            except asyncio.CancelledError:
+                kill_process_group(proc)
+                raise
+            out = subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+            return span.finish(ContCommandResult.from_subprocess_out(out))
+
+    def open_session(self):
+        raise RhelContainerException(msg="Shell sessions are not supported by async engines.")
+
+    async def _poll_running(self, timeout):
+        end = time.monotonic() + timeout
+        while await self.status != "Running":
+            if time.monotonic() > end:
+                return False
+            await asyncio.sleep(1)
+        return True
+
+    async def wait_running(self, timeout=60):
+        """Wait for container/pod up and running; see `BaseEngine.wait_running`."""
+        timeout = bounded(timeout)
+        command = self._watch_command()
+        if command is None:
+            return await self._poll_running(timeout)
+
+        proc = await asyncio.create_subprocess_exec(
+            *command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+
+        async def _watch():
+            async for line in proc.stdout:
+                state = self._parse_event(line.decode(errors="replace").strip())
+                if state == "running":
+                    return True
+                if state:
+                    raise RhelContainerException(
+                        msg=f"{self.name} failed to start: {state}",
+                        stdout="",
+                        stderr="",
+                        command=" ".join(command),
+                    )
+            return None
+
+        end = time.monotonic() + timeout
+        try:
+            running = await asyncio.wait_for(_watch(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            kill_process_group(proc)
+            await proc.wait()
+        if running is None:
+            # watcher died (e.g. old engine); fall back to polling.
+            return await self._poll_running(max(end - time.monotonic(), 0))
+        return running
+
+    async def exec(self, cmd, timeout=None):
+        """Execute command on contaienr.
+
+        Args:
+            cmd: command string
+            timeout: seconds after which engine exec is killed; `TimeoutResult` is returned
+        """
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            return await self._exec(self._exec_command(cmd))
+
+    async def exec_stream(self, cmd, callback=None, sink=None, tail=DEFAULT_TAIL, timeout=None):
+        """Execute command handing its output to `callback`/`sink` while it runs.
+
+        Args:
+            cmd: command string
+            callback: called with (stream, line) for every line
+            sink: file-like object every line gets written to
+            tail: lines of each stream kept in result; None keeps everything
+            timeout: seconds after which engine exec is killed; `TimeoutResult` is returned
+
+        Returns:
+            ContCommandResult with captured tail of output.
+        """
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            timeout = bounded(self.timeout)
+        command = self._exec_command(cmd)
+        collector = OutputCollector(callback=callback, sink=sink, tail=tail)
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+
+        async def _read(name, reader):
+            while True:
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                collector.feed(name, chunk)
+            collector.feed(name, None)
+
+        async def _run():
+            await asyncio.gather(_read(STDOUT, proc.stdout), _read(STDERR, proc.stderr))
+            return await proc.wait()
+
+        try:
+            exit_status = await asyncio.wait_for(_run(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out after {timeout:.1f}s: {redact(' '.join(command))}")
+            out = collector.result(None, " ".join(command))
+            return TimeoutResult(out.command, timeout, out.stdout_bytes, out.stderr_bytes)
+        finally:
+            if proc.returncode is None:
+                kill_process_group(proc)
+                await proc.wait()
+        return collector.result(exit_status, " ".join(command))
+
+    async def _in_thread(self, func, *args, **kwargs):
+        # copied context carries current deadline into the worker thread.
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def put_file(self, *args, **kwargs):
+        """See `BaseEngine.put_file`; transfer runs in a worker thread."""
+        return await self._in_thread(super().put_file, *args, **kwargs)
+
+    async def put_files(self, *args, **kwargs):
+        """See `BaseEngine.put_files`; transfer runs in a worker thread."""
+        return await self._in_thread(super().put_files, *args, **kwargs)
+
+    async def get_file(self, *args, **kwargs):
+        """See `BaseEngine.get_file`; transfer runs in a worker thread."""
+        return await self._in_thread(super().get_file, *args, **kwargs)
+
+    async def exec_many(self, cmds, stop_on_failure=False, timeout=None):
+        """Execute list of commands in a single engine exec.
+
+        Args:
+            cmds: list of command strings
+            stop_on_failure: skip remaining commands after first non-zero exit status
+            timeout: seconds for the whole batch
+        """
+        if not cmds:
+            return []
+        for cmd in cmds:
+            logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(*cmds)
+        marker, command = self._batch_command(cmds, stop_on_failure=stop_on_failure)
+        with deadline(timeout):
+            return self._batch_results(cmds, marker, await self._exec(command))
+
+
+class AsyncPodmanEngine(AsyncEngineMixin, PodmanEngine):
+    """Async Podman/Docker engine wrapper."""
+
+    async def _state_changed(self, out):
+        out = await out
+        if self.status_provider is not None:
+            self.status_provider.invalidate()
+        return out
+
+    @property
+    async def status(self):
+        """Return status of container."""
+        if self.status_provider is not None:
+            return await self.status_provider.status(self.name)
+        return self._parse_status(await self._exec(command=self._status_command()))
+
+    @property
+    async def state(self):
+        """`ContainerState` (exit code, start time, health...) or None if container is gone."""
+        if self.status_provider is not None:
+            return await self.status_provider.state(self.name)
+        out = await self._exec(self._state_command())
+        return parse_ps(out.stdout).get(self.name) if out.exit_status == 0 else None
+
+
+class AsyncStatusProvider(StatusProvider):
+    """StatusProvider with awaitable methods, for AsyncPodmanEngine."""
+
+    def __init__(self, engine="auto", name_prefix=None, label=None, ttl=DEFAULT_TTL):
+        super().__init__(engine=engine, name_prefix=name_prefix, label=label, ttl=ttl)
+        self._engine = AsyncPodmanEngine(name=self._engine.name, engine=self._engine.engine)
+        self._locks = {}
+
+    def _loop_lock(self):
+        # fleets run every phase in its own `asyncio.run`; a lock belongs to one loop.
+        loop = asyncio.get_running_loop()
+        if loop not in self._locks:
+            self._locks = {loop: asyncio.Lock()}
+        return self._locks[loop]
+
+    async def states(self, max_age=None):
+        """Container name -> ContainerState; refreshed if snapshot is older than max_age."""
+        async with self._loop_lock():
+            if not self._fresh(max_age):
+                self._update(await self._engine._exec(self._ps_command()))
+            return dict(self._states)
+
+    async def state(self, name, max_age=None):
+        """ContainerState of container or None if engine doesn't know it."""
+        return (await self.states(max_age=max_age)).get(name)
+
+    async def status(self, name):
+        """Status in the form of `PodmanEngine.status`."""
+        state = await self.state(name)
+        return state.status if state is not None else f"{name} unavailable."
+
+
+class AsyncOpenshiftEngine(AsyncEngineMixin, OpenshiftEngine):
+    """Async Openshift/k8s engine wrapper."""
+
+    async def get_json(self, restype, name=None, label=None, namespace=None):
+        """Get json for resource type/name/label."""
+        command = self._get_json_command(restype, name=name, label=label, namespace=namespace)
+        return self._parse_json(await self._exec(command=command))
+
+    async def pod_states(self, label):
+        """Phase of every pod matching label selector, with a single `get pods` call."""
+        return self._parse_pod_states(await self.get_json(restype="pods", label=label))
+
+    @property
+    async def status(self):
+        """Return status of pod."""
+        return self._parse_status(await self.get_json(restype="pods", name=self.name))
+
+
+class AsyncSubscription(Subscription):
+    """Manage subscription with awaitable methods."""
+
+    @traced("subscription.register")
+    async def register(self, auto_attach=True, force=True):
+        """Subscribed system
+
+        Args:
+            auto_attach: auto attach pool
+            force: force subscribed
+        """
+        logger.info(f"Subscribing system {self._engine.name} to {self._config.serverurl}")
+        out = await self._engine.exec(self._register_cmd(auto_attach=auto_attach, force=force))
+        self._log_register(out)
+        return out
+
+
+class AsyncInsightsClient(InsightsClient):
+    """Manage insights-client with awaitable methods."""
+
+    @property
+    async def status(self):
+        out = await self._engine.exec("insights-client --status")
+        return out.stdout
+
+    async def configure(self):
+        logger.info(f"Configuring insights-client for '{self.env}' env.")
+        cmd = self._configure_cmd()
+        if cmd is None:
+            logger.info(f"Default setting selected for {self.env}")
+            return ContCommandResult(exit_status=0, stdout="No need of configuration.")
+        out = await self._engine.exec(cmd)
+        self._log_configure(out)
+        return out
+
+    @traced("insights_client.register")
+    async def register(self, disable_schedule=None, keep_archive=None, no_upload=None):
+        """Register insights-client.
+
+        Args:
+            disable_schedule: disable schedule
+            keep_archive: Keep archive while uploading
+            no_upload: don't upload data
+        """
+        logger.info("Registering insight client")
+        cmds = self._register_cmds(
+            disable_schedule=disable_schedule, keep_archive=keep_archive, no_upload=no_upload
+        )
+        out = (await self._engine.exec_many(cmds))[-1]
+        self._log_register(out)
+        return out
+
+    async def collect_archive(self, *args, **kwargs):
+        """See `InsightsClient.collect_archive`; streaming runs in a worker thread."""
+        return await self._engine._in_thread(super().collect_archive, *args, **kwargs)
+
+    async def unregister(self):
+        out = await self._engine.exec("insights-client --unregister")
+        if out.exit_status != 0:
+            logger.error(f"Fail to register insights-client for env '{self.env}'\n {out.stderr}")
+        return out
+
+    @property
+    async def version(self):
+        out = await self._engine.exec("insights-client --version")
+        return out.stdout
+
+
+class AsyncContainerFacts(ContainerFacts):
+    """ContainerFacts of an async engine; loading facts is awaited.
+
+    `cached` and `installed` stay plain methods reading memory only; properties
+    (`packages`, `arch`...) return awaitables like `get`.
+    """
+
+    async def load(self):
+        """Load facts from container (see `_load_names`); return True on success."""
+        names, key = self._load_names(), self._key()
+        results = await self._engine.exec_many([FACT_CMDS[name] for name in names])
+        return self._store(names, key, results)
+
+    async def get(self, name, load=True):
+        """Get fact; stale fact is reloaded unless `load` is False (then None)."""
+        if self._stale(name) and load:
+            await self.load()
+        return self.cached(name)
+
+    async def is_installed(self, pkg, load=True):
+        """See `ContainerFacts.is_installed`."""
+        if self.stale and load and not await self.load():
+            return False
+        return self.installed(pkg)
+
+
+class AsyncPackageTransaction(PackageTransaction):
+    """PackageTransaction flushed with `await txn.flush()` or `async with`.
+
+    Example:
+        async with rc.transaction() as txn:
+            txn.install("vim", "git")
+    """
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' for transactions of AsyncRhelContainer.")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, *exc):
+        if exc_type is None:
+            await self.flush()
+
+    def commands(self, load=False):
+        """See `PackageTransaction.commands`; load facts with `await rc.facts.load()`."""
+        if load:
+            raise TypeError("Await 'rc.facts.load()' before commands() instead of load=True.")
+        return super().commands()
+
+    async def flush(self):
+        """Run queued transaction; returns TransactionResult."""
+        if self._container.facts.stale:
+            await self._container.facts.load()
+        install, remove, outcomes, cmds = self._flush_plan()
+        results = await self._container.exec_many(cmds) if cmds else []
+        return self._finish(install, remove, outcomes, cmds, results)
+
+
+class AsyncRhelContainer(RhelContainer):
+    """RhelContainer driven by asyncio; one event loop can manage many containers.
+
+    Example:
+        rc = AsyncRhelContainer(engine_name="podman", release=8.3, env="ci")
+        await rc.start()
+        await rc.setup("insights-client")
+        await rc.stop()
+    """
+
+    podman_engine_class = AsyncPodmanEngine
+    openshift_engine_class = AsyncOpenshiftEngine
+    subscription_class = AsyncSubscription
+    insights_client_class = AsyncInsightsClient
+    facts_class = AsyncContainerFacts
+    transaction_class = AsyncPackageTransaction
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not isinstance(self.engine, AsyncEngineMixin):
+            raise RhelContainerException(msg=f"'{self.engine_name}' has no async engine.")
+        if self.use_session:
+            raise RhelContainerException(
+                msg="Shell sessions are not supported by AsyncRhelContainer."
+            )
+        if self.image_cache:
+            raise RhelContainerException(msg="Image cache is not supported by AsyncRhelContainer.")
+        if self.registration_cache:
+            raise RhelContainerException(
+                msg="Registration cache is not supported by AsyncRhelContainer."
+            )
+
+    @traced("start")
+    async def start(
+        self, hostname=None, envs=None, wait=True, timeout=60, profile=None, *args, **kwargs
+    ):
+        """Start container.
+
+        Args:
+            hostname: Set container hostname
+            env: List of environment variables to set in container
+            wait: wait for container/pod up and running.
+            timeout: seconds to wait for container/pod up and running; if it isn't by
+                then, it is stopped and `TimeoutResult` is returned.
+            profile: setup profile (or list of profiles) whose resource limits apply
+
+        Raises:
+            RhelContainerException: container/pod reached terminal state while waiting.
+        """
+        logger.info(f"Provisioning RHEL-{self.version} container")
+        image, envs = self._run_args(envs)
+        if self.package_cache:
+            self.package_cache.evict()
+            kwargs.setdefault("volumes", self.package_cache.volumes())
+        kwargs.setdefault("resources", self.resource_limits(profile))
+        if self.admission:
+            memory = kwargs["resources"].memory if kwargs["resources"] else None
+            self.admission_ticket = await self.admission.acquire_async(self.name, memory=memory)
+            if self.admission_ticket is None:
+                return self._not_admitted()
+        out = await self.engine.run(image=image, hostname=hostname, envs=envs, *args, **kwargs)
+        if out.exit_status != 0:
+            self._release_admission()
+        elif wait:
+            try:
+                running = await self.engine.wait_running(timeout=timeout)
+            except RhelContainerException:
+                self._release_admission()
+                raise
+            if not running:
+                logger.error(f"{self.name} not running after {timeout}s, stopping it")
+                await self.stop()
+                return TimeoutResult(command=out.command, timeout=timeout)
+
+        if out.exit_status == 0:
+            logger.info("Successfully provisioned container")
+            if self.package_cache and wait:
+                await self.exec_many(self.package_cache.setup_cmds())
+        else:
+            logger.error(f"Fail to provision container: {out.stderr}")
+        return out
+
+    async def is_pkg_installed(self, pkg):
+        """Check specific package already installed or not.
+
+        Args:
+            pkg: Package, which you want to verify.
+        """
+        return await self.facts.is_installed(pkg)
+
+    async def enable_epel(self):
+        """Enable EPEL repository on container."""
+        return (await self.exec_many(self._enable_epel_cmds()))[0]
+
+    async def create_archive(self, path=".", decompress=False, index=False):
+        """Create archive of container streaming it straight to host.
+
+        Args:
+            path: host file, or directory to save archive with its own name
+            decompress: save plain tar instead of `.tar.gz`
+            index: list archive members while streaming (`members` of result)
+        """
+        out = await self.insights_client.collect_archive(
+            self._archive_dest(path), decompress=decompress, index=index
+        )
+        return self._archive_done(path, out)
+
+    async def run_profile(self, profile, name=None, **kwargs):
+        """Run step graph of setup profile, independent steps as concurrent tasks."""
+        name = name or self.profile_name(profile, **kwargs)
+        out = await self.profile_graph(profile, **kwargs).run_async(self.engine)
+        return self._log_setup(name, out)
+
+    async def setup_python(self, python="3"):
+        """Install python3"""
+        return await self.run_profile("python", python=python)
+
+    async def setup_ansible(self, setup_ssh=True):
+        """Install ansible and setup ansible"""
+        logger.info("Started ansible setup")
+        if await self.is_pkg_installed("ansible"):
+            logger.info("ansible already installed.")
+            return ContCommandResult(exit_status=0, stdout="ansible already installed")
+        return await self.run_profile("ansible", setup_ssh=setup_ssh)
+
+    @traced("setup")
+    async def setup(self, *args, timeout=None, **kwargs):
+        """Run setup profiles in given order; see `RhelContainer.setup`."""
+        with deadline(timeout):
+            return await self._setup(*args, **kwargs)
+
+    async def _setup(self, *args, **kwargs):
+        out = None
+        for profile in args:
+            if profile == "subscribe":
+                out = await self.subscription.register()
+            elif profile in self.setup_profiles:
+                logger.info(f"Setting up {profile} on {self.name}")
+                out = await self.run_profile(profile, **kwargs)
+            else:
+                logger.error(f"Unknown setup profile '{profile}'")
+                return None
+            if out.exit_status != 0:
+                break
+        return out
@@ -0,0 +1,143 @@
+# Insights archives streamed from container to host while they are read, optionally
+# decompressed and indexed on the way.
+import gzip
+import logging
+import re
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from rhel_containers.engine import ContCommandResult
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+ARCHIVE_RE = re.compile(r"[^ ]*\.tar\.gz")
+
+
+class ArchiveResult(ContCommandResult):
+    """Result of archive collection.
+
+    Attributes:
+        stdout: archive name (`.tar` if decompressed)
+        stderr: insights-client output
+        dest: host path (or file object) archive was written to
+        size: bytes written to dest
+        members: list of (name, size) of archive members if indexed, else None
+    """
+
+    __slots__ = ("dest", "size", "members")
+
+    def __init__(self, dest=None, size=0, members=None, **kwargs):
+        super().__init__(**kwargs)
+        self.dest = dest
+        self.size = size
+        self.members = members
+
+
+class _TeeReader:
+    """File-like reader copying everything read to `sink`."""
+
+    def __init__(self, source, sink):
+        self._source = source
+        self._sink = sink
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        if data:
+            self._sink.write(data)
+            self.size += len(data)
+        return data
+
+
+def stream_archive(pipe, dest, decompress=False, index=False):
+    """Stream `.tar.gz` written to stdout of a started engine exec to `dest`.
+
+    Args:
+        pipe: `ExecPipe` of command writing archive; see `BaseEngine.exec_pipe`
+        dest: host path or binary file object
+        decompress: write plain tar instead of gzip
+        index: list archive members while streaming
+
+    Returns:
+        ArchiveResult; its stdout is the archive name found in command's stderr.
+    """
+    host_path = Path(dest) if isinstance(dest, (str, Path)) else None
+    fp = host_path.open("wb") if host_path else dest
+    tee = members = None
+    try:
+        source = gzip.GzipFile(fileobj=pipe.stdout, mode="rb") if decompress else pipe.stdout
+        tee = _TeeReader(source, fp)
+        if index:
+            members = []
+            try:
+                with tarfile.open(fileobj=tee, mode="r|" if decompress else "r|gz") as tar:
+                    members.extend((member.name, member.size) for member in tar)
+            except (tarfile.TarError, EOFError, OSError) as exc:
+                logger.warning(f"Fail to index archive: {exc}")
+                members = None
+        # rest of stream (tar padding or whole archive if not indexed)
+        while tee.read(CHUNK_SIZE):
+            pass
+    except (EOFError, OSError) as exc:
+        logger.warning(f"Broken archive stream: {exc}")
+        pipe.kill()
+    finally:
+        if host_path:
+            fp.close()
+    result = pipe.wait()
+
+    stderr = result.stderr
+    found = ARCHIVE_RE.findall(stderr)
+    name = Path(found[-1]).name if found else ""
+    if decompress and name:
+        name = name[: -len(".gz")]
+    out = ArchiveResult(
+        exit_status=result.exit_status,
+        stdout=name,
+        stderr=stderr,
+        command=result.command,
+        dest=dest,
+        size=tee.size if tee else 0,
+        members=members,
+    )
+    out.timed_out = result.timed_out
+    if out.exit_status != 0:
+        logger.error(f"Fail to collect archive >> {stderr}")
+        if host_path and host_path.exists():
+            host_path.unlink()
+    return out
+
+
+def collect_archives(containers, directory, workers=8, **kwargs):
+    """Collect insights archives of many containers concurrently into a directory.
+
+    Every archive is written as `<directory>/<container name>.tar.gz` (`.tar` if
+    decompressed).
+
+    Args:
+        containers: RhelContainer objects
+        directory: host directory; created if missing
+        workers: max archives collected at the same time
+        kwargs: passed to `InsightsClient.collect_archive` (decompress, index, no_upload)
+
+    Returns:
+        dict of container name -> ArchiveResult
+    """
+    containers = list(containers)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = ".tar" if kwargs.get("decompress") else ".tar.gz"
+
+    def _collect(cont):
+        try:
+            return cont.insights_client.collect_archive(
+                directory.joinpath(f"{cont.name}{suffix}"), **kwargs
+            )
+        except Exception as exc:
+            logger.error(f"Archive collection failed on {cont.name}: {exc}")
+            return ArchiveResult(exit_status=1, stderr=str(exc))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip((cont.name for cont in containers), executor.map(_collect, containers)))
@@ -1,8 +1,8 @@
+import copy
+import functools
 from pathlib import Path
 
 import rhel_containers as rc
-import yaml
-from box import Box
 
 PROJECT_PATH = Path(rc.__file__).parent
 DEFAULT_CONF = PROJECT_PATH.joinpath("conf", "conf.yaml")
@@ -29,12 +29,47 @@ def merge(a, b, path=None):
 
 
 def _load_file(path):
+    import yaml
+
     with path.open() as fp:
         return yaml.safe_load(fp)
 
 
+def _file_state(path):
+    """Modification time and size of path; None if missing."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def clear_config_cache():
+    """Drop loaded configs; next `load_config` reads files again."""
+    _load_files.cache_clear()
+
+
 def load_config(env, extra_conf=None):
-    """Load configuration files."""
+    """Load configuration files.
+
+    Conf files merged for env are cached per process (a few entries) and reused as long
+    as they are unchanged. `extra_conf` is merged on every call and never cached, so
+    per-container credentials don't stay in memory; every call gets its own copy, so
+    changing the returned Box doesn't leak to other handles.
+    """
+    from box import Box
+
+    conf = copy.deepcopy(_load_files(env, _file_state(DEFAULT_CONF), _file_state(LOCAL_CONF)))
+
+    # for iqe testing, we can pass extra_conf.
+    if extra_conf:
+        conf = merge(conf, copy.deepcopy(extra_conf))
+    return Box(conf).RHEL_CONTAINERS
+
+
+@functools.lru_cache(maxsize=16)
+def _load_files(env, *file_states):
+    """Conf files merged for env; `file_states` only key the cache on file changes."""
     conf = _load_file(DEFAULT_CONF)
 
     # overwrite local conf is available
@@ -43,9 +78,4 @@ def load_config(env, extra_conf=None):
         conf = merge(conf, local_conf)
 
     # merge data as per env
-    conf = merge(conf["default"], conf[env])
-
-    # for iqe testing, we can pass extra_conf.
-    if extra_conf:
-        conf = merge(conf, extra_conf)
-    return Box(conf).RHEL_CONTAINERS
+    return merge(conf["default"], conf[env])
@@ -0,0 +1,138 @@
+# Deadlines of engine calls and retry of engine (not command) failures.
+#
+# A deadline set with `deadline(seconds)` holds for every engine call made inside it, also
+# in threads/tasks started with a copied context (setup step graphs), and nested deadlines
+# can only shorten it. Engine calls running into it are killed with their process group and
+# return a `TimeoutResult`. This covers execs, shell sessions, file transfers, `exec_stream`
+# and API engine requests; only engine execs are retried.
+import contextlib
+import contextvars
+import logging
+import random
+import re
+import time
+
+from rhel_containers.engine import ContCommandResult
+
+logger = logging.getLogger(__name__)
+
+# exit status of timed out calls, as coreutils `timeout`.
+TIMEOUT_STATUS = 124
+# podman/docker exit status for errors of the engine itself (not of the command it ran).
+ENGINE_ERROR_STATUS = 125
+# kubectl/oc failing to talk to the API server before the command started (not to be
+# mistaken for command output). Errors which may happen mid-command, like "http2: client
+# connection lost", aren't listed: retrying would run the command twice.
+CONNECTION_ERROR_RE = re.compile(
+    r"Unable to connect to the server|The connection to the server \S+ was refused"
+    r"|the server is currently unable to handle the request|unable to upgrade connection"
+    r"|error dialing backend"
+)
+
+_deadline = contextvars.ContextVar("rhel_containers_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound engine calls made inside to `seconds` from now; None leaves them unbounded."""
+    if seconds is None:
+        yield
+        return
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left until current deadline, never negative; None without deadline."""
+    end = _deadline.get()
+    return None if end is None else max(end - time.monotonic(), 0)
+
+
+def bounded(timeout):
+    """Timeout shortened to current deadline; None if neither is set."""
+    left = remaining()
+    if timeout is None:
+        return left
+    return timeout if left is None else min(timeout, left)
+
+
+class TimeoutResult(ContCommandResult):
+    """Result of an engine call killed at its deadline; output read until then is kept."""
+
+    __slots__ = ()
+
+    def __init__(self, command=None, timeout=None, stdout=b"", stderr=b""):
+        super().__init__(exit_status=TIMEOUT_STATUS, command=command)
+        reason = f"Timed out after {timeout:.1f}s" if timeout is not None else "Deadline exceeded"
+        self.stdout = stdout or b""
+        self.stderr = (stderr or b"") + f"\n{reason}".encode()
+        self.timed_out = True
+
+    def __repr__(self):
+        return f"TimeoutResult(command={self.command!r})"
+
+
+class RetryPolicy:
+    """Retry of engine calls failing in the engine, with exponential backoff and jitter.
+
+    Only engine errors raised before the command started are retried: podman/docker exit
+    status 125 and kubectl/oc connection errors. A non-zero exit status of the command run
+    in the container is returned as is, as is a timed out call.
+
+    Args:
+        retries: retries after first attempt; 0 disables retrying
+        backoff: seconds before first retry, doubled for each following one
+        max_backoff: upper bound of backoff
+        jitter: fraction of backoff randomly taken off, so calls of a fleet don't retry
+            in lockstep
+    """
+
+    def __init__(self, retries=2, backoff=0.5, max_backoff=10, jitter=0.5):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    @classmethod
+    def from_config(cls, config):
+        """RetryPolicy from `engine` config section; None if retries are disabled."""
+        if not config or not config.get("retries"):
+            return None
+        return cls(
+            retries=config.get("retries"),
+            backoff=config.get("backoff") or 0.5,
+            max_backoff=config.get("max_backoff") or 10,
+            jitter=config.get("jitter") or 0,
+        )
+
+    @staticmethod
+    def is_engine_error(out):
+        if out.timed_out or out.exit_status in (0, None):
+            return False
+        if out.exit_status == ENGINE_ERROR_STATUS:
+            return True
+        return bool(CONNECTION_ERROR_RE.search(out.stderr or ""))
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number `attempt` (starting at 0)."""
+        delay = min(self.backoff * 2**attempt, self.max_backoff)
+        return delay * (1 - random.uniform(0, self.jitter))
+
+    def next_delay(self, out, attempt):
+        """Delay before retrying call which returned out; None if it isn't retried."""
+        if attempt >= self.retries or not self.is_engine_error(out):
+            return None
+        delay = self.delay(attempt)
+        left = remaining()
+        if left is not None and left <= delay:
+            return None
+        logger.warning(
+            f"Engine error (exit status {out.exit_status}), retry {attempt + 1}/{self.retries}"
+            f" in {delay:.2f}s >> {out.stderr}"
+        )
+        return delay
@@ -1,200 +1,882 @@
 import datetime
+import functools
 import json
 import logging
+import os
+import queue
+import re
+import shlex
 import shutil
+import signal
 import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+
+from rhel_containers import tracing
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.tracing import redact
 
 logger = logging.getLogger(__name__)
 
+# container events after which it won't come up running by itself.
+TERMINAL_EVENTS = {
+    "died": "Exited",
+    "die": "Exited",
+    "stop": "Stopped",
+    "remove": "Removed",
+    "destroy": "Removed",
+}
+TERMINAL_POD_REASONS = (
+    "ErrImagePull",
+    "ImagePullBackOff",
+    "InvalidImageName",
+    "CrashLoopBackOff",
+    "CreateContainerConfigError",
+    "CreateContainerError",
+)
+# commands which may install or remove packages (and with them commands); running one makes
+# package facts stale. rpm queries (`rpm -q...`) don't match.
+PACKAGE_CHANGE_RE = re.compile(
+    r"\b(?:dnf|yum|microdnf)\b[^;&|\n]*\b(?:install|localinstall|reinstall|remove|erase"
+    r"|autoremove|update|upgrade|downgrade|swap|distro-sync|group|module)\b"
+    r"|\brpm\s+(?:-[iUFe]|--(?:install|upgrade|freshen|erase)\b)"
+    r"|\bpip[\d.]*\s+(?:install|uninstall)\b"
+)
+# lines of each output stream kept in result of `exec_stream`.
+DEFAULT_TAIL = 1000
+
+
+def pump(pipe, lines):
+    """Move lines from pipe to queue; `None` marks end of stream."""
+    for line in iter(pipe.readline, b""):
+        lines.put(line)
+    lines.put(None)
+
+
+@functools.lru_cache(maxsize=None)
+def which(binary):
+    """`shutil.which` cached per process; engine binaries don't move while we run."""
+    return shutil.which(binary)
+
+
+def find_engine(engine, candidates):
+    """Engine binary to use; first installed of `candidates` if engine is "auto".
+
+    Raises:
+        ValueError: engine not installed.
+    """
+    found = engine
+    if engine == "auto":
+        found = next((cand for cand in candidates if which(cand)), candidates[-1])
+    if which(found) is None:
+        raise ValueError(
+            f"'{engine}' engine not found. Make sure it should installed on your system."
+        )
+    return found
 
-class ContCommandResult:
-    """A representation engine command results."""
 
-    def __init__(self, exit_status=None, stdout=None, stderr=None, command=None):
+def engine_operation(command):
+    """Span name of engine command, e.g. `engine.exec` for `podman exec ...`."""
+    return f"engine.{command[1]}" if len(command) > 1 else "engine"
+
+
+def kill_process_group(proc):
+    """Kill process started with `start_new_session=True` along with its children."""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+
+
+class Watchdog:
+    """Call `kill` once `timeout` seconds passed, unless cancelled before; None never does.
+
+    For engine calls streaming over pipes, which can't wait with `communicate(timeout)`.
+    """
+
+    def __init__(self, timeout, kill):
+        self.timeout = timeout
+        self.expired = False
+        self._timer = None
+        if timeout is not None:
+            self._timer = threading.Timer(max(timeout, 0), self._expire, [kill])
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self, kill):
+        self.expired = True
+        kill()
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+class _Spilled:
+    """Output kept in a temp file; file is removed once nothing refers to it."""
+
+    def __init__(self, data):
+        fd, self.path = tempfile.mkstemp(prefix="rhel-containers-", suffix=".out")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        self.size = len(data)
+        weakref.finalize(self, _unlink, self.path)
+
+    def read(self):
+        with open(self.path, "rb") as fp:
+            return fp.read()
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class ContCommandResult:
+    """A representation engine command results.
+
+    Output of engine commands is kept as raw bytes and only decoded (and stripped) when
+    `stdout`/`stderr` are read; streams larger than `spill_size` bytes go to a temp file
+    removed with the result. `stdout_bytes`/`stderr_bytes` give the raw output.
+
+    Args:
+        encoding: encoding raw output is decoded with
+        errors: decode error handler, e.g. "strict", "replace", "surrogateescape"
+    """
+
+    __slots__ = (
+        "exit_status",
+        "_stdout",
+        "_stderr",
+        "_command",
+        "encoding",
+        "errors",
+        "timed_out",
+    )
+    # bytes of a raw output stream above which it is kept on disk instead of in memory.
+    spill_size = 1024 * 1024
+
+    def __init__(
+        self,
+        exit_status=None,
+        stdout=None,
+        stderr=None,
+        command=None,
+        encoding="utf-8",
+        errors="replace",
+    ):
         self.exit_status = exit_status
+        # killed at its deadline; see `rhel_containers.deadline`.
+        self.timed_out = False
+        self.encoding = encoding
+        self.errors = errors
         self.stdout = stdout
         self.stderr = stderr
         self.command = command
 
     @classmethod
     def from_subprocess_out(cls, sub_out):
-        stdout = sub_out.stdout.decode().strip() if sub_out.stdout else ""
-        stderr = sub_out.stderr.decode().strip() if sub_out.stderr else ""
-        command = " ".join(sub_out.args)
-
-        if sub_out.returncode != 0 and stderr:
-            logger.warning(f"Error: {command} >> {stdout} >> {stderr}")
-
-        return cls(
-            exit_status=sub_out.returncode,
-            stdout=stdout,
-            stderr=stderr,
-            command=command,
+        out = cls(exit_status=sub_out.returncode, command=sub_out.args)
+        out._stdout = out._keep(sub_out.stdout)
+        out._stderr = out._keep(sub_out.stderr)
+
+        if sub_out.returncode != 0 and sub_out.stderr:
+            logger.warning(f"Error: {redact(out.command)} >> {out.stdout} >> {out.stderr}")
+        return out
+
+    def _share_output(self, other):
+        """Take exit status and (still undecoded) output of other result."""
+        self.exit_status = other.exit_status
+        self._stdout, self._stderr = other._stdout, other._stderr
+        self._command = other._command
+        self.encoding, self.errors = other.encoding, other.errors
+        self.timed_out = other.timed_out
+
+    def _keep(self, data):
+        if data and len(data) > self.spill_size:
+            return _Spilled(data)
+        return data or b""
+
+    def _raw(self, value):
+        if isinstance(value, _Spilled):
+            return value.read()
+        if isinstance(value, str):
+            return value.encode(self.encoding, errors=self.errors)
+        return value or b""
+
+    def _text(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return self._raw(value).decode(self.encoding, errors=self.errors).strip()
+
+    def decode(self, encoding=None, errors=None):
+        """(stdout, stderr) decoded with other encoding/error handler than the result's."""
+        encoding = encoding or self.encoding
+        errors = errors or self.errors
+        return tuple(
+            self._raw(value).decode(encoding, errors=errors).strip()
+            for value in (self._stdout, self._stderr)
         )
 
+    @property
+    def stdout(self):
+        return self._text(self._stdout)
+
+    @stdout.setter
+    def stdout(self, value):
+        self._stdout = value
+
+    @property
+    def stderr(self):
+        return self._text(self._stderr)
+
+    @stderr.setter
+    def stderr(self, value):
+        self._stderr = value
+
+    @property
+    def stdout_bytes(self):
+        """Raw stdout, not stripped."""
+        return self._raw(self._stdout)
+
+    @property
+    def stderr_bytes(self):
+        """Raw stderr, not stripped."""
+        return self._raw(self._stderr)
+
+    @property
+    def output_size(self):
+        """Bytes of stdout and stderr, without decoding them."""
+        return sum(
+            value.size if isinstance(value, _Spilled) else len(value or "")
+            for value in (self._stdout, self._stderr)
+        )
+
+    @property
+    def spilled(self):
+        """Whether any output stream is kept on disk."""
+        return isinstance(self._stdout, _Spilled) or isinstance(self._stderr, _Spilled)
+
+    @property
+    def command(self):
+        command = self._command
+        if command is None or isinstance(command, str):
+            return command
+        return " ".join(command)
+
+    @command.setter
+    def command(self, value):
+        self._command = value
+
     def __repr__(self):
         return f"ContCommandResult(exit_status={self.exit_status})"
 
 
-class PodmanEngine:
-    """Podman/Docker engine wrapper."""
+class BaseEngine:
+    """Common engine behaviour shared by Podman and Openshift wrappers."""
 
-    def __init__(self, name=None, engine="auto", *args, **kwargs):
-        if engine == "auto":
-            self.engine = "podman" if shutil.which("podman") else "docker"
-        else:
-            self.engine = engine
+    session = None
+    started_at = None
+    # bumped by every call which may change container state.
+    generation = 0
+    # bumped by commands which may change installed packages; see `ContainerFacts`.
+    package_generation = 0
+    # seconds every engine call may take (bounded further by `deadline`); None: no limit.
+    timeout = None
+    # `RetryPolicy` for engine errors; None: no retry. Only `_exec` calls are retried;
+    # sessions, file transfers and `exec_stream` are bounded by deadlines but never repeated.
+    retry_policy = None
 
-        # check engine exist or not
-        if shutil.which(self.engine) is None:
-            raise ValueError(
-                f"'{engine}' engine not found. Make sure it should installed on your system."
+    def _exec(self, command):
+        """Internal use to execute subprocess cmd; retries engine errors per `retry_policy`."""
+        return self._retrying(self._exec_once, command)
+
+    def _changing(self, *cmds):
+        """Count commands about to run in container; see `generation`/`package_generation`."""
+        self.generation += 1
+        if any(PACKAGE_CHANGE_RE.search(cmd) for cmd in cmds):
+            self.package_generation += 1
+
+    def _retrying(self, call, *args):
+        """Result of `call(*args)`, repeated on engine errors per `retry_policy`."""
+        attempt = 0
+        while True:
+            out = call(*args)
+            delay = self.retry_policy.next_delay(out, attempt) if self.retry_policy else None
+            if delay is None:
+                return out
+            time.sleep(delay)
+            attempt += 1
+
+    def _exec_once(self, command):
+        from rhel_containers.deadline import bounded
+        from rhel_containers.deadline import TimeoutResult
+
+        with tracing.span(engine_operation(command), self.name, command) as span:
+            timeout = bounded(self.timeout)
+            if timeout is not None and timeout <= 0:
+                return span.finish(TimeoutResult(command=command))
+            # own process group so a timeout kills engine client and all it spawned.
+            proc = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
             )
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                kill_process_group(proc)
+                stdout, stderr = proc.communicate()
+                logger.error(f"Timed out after {timeout:.1f}s: {redact(' '.join(command))}")
+                return span.finish(TimeoutResult(command, timeout, stdout, stderr))
+            out = subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+            return span.finish(ContCommandResult.from_subprocess_out(out))
+
+    def _exec_command(self, cmd=None, interactive=False):
+        """Engine command executing `cmd` (or an interactive shell) in container."""
+        raise NotImplementedError
+
+    def open_session(self):
+        """Keep one interactive shell open and route `exec` through it."""
+        from rhel_containers.session import ShellSession
+
+        if self.session is None or not self.session.alive:
+            self.session = ShellSession(self._exec_command(interactive=True)).start()
+        return self.session
+
+    def close_session(self):
+        """Close interactive shell session if any."""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def exec(self, cmd, timeout=None):
+        """Execute command on contaienr.
+
+        Args:
+            cmd: command string
+            timeout: seconds after which engine exec is killed; `TimeoutResult` is returned
+        """
+        from rhel_containers.deadline import deadline
+
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            if self.session is not None and self.session.alive:
+                return self.session.run(cmd, timeout=self.timeout)
+            return self._exec(self._exec_command(cmd))
+
+    def exec_stream(self, cmd, callback=None, sink=None, tail=DEFAULT_TAIL, timeout=None):
+        """Execute command handing its output over while it runs; see `ExecStream`.
+
+        Runs in its own engine exec even if a shell session is open. It is never retried,
+        its output may already be consumed.
+
+        Args:
+            cmd: command string
+            callback: called with (stream, line) for every line
+            sink: file-like object every line gets written to
+            tail: lines of each stream kept in final result; None keeps everything
+            timeout: seconds after which engine exec is killed; result is a `TimeoutResult`
+        """
+        from rhel_containers.deadline import bounded
+        from rhel_containers.deadline import deadline
+        from rhel_containers.stream import ExecStream
+
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            timeout = bounded(self.timeout)
+        stream = ExecStream(
+            self._exec_command(cmd), callback=callback, sink=sink, tail=tail, timeout=timeout
+        )
+        return stream.start()
+
+    def exec_pipe(self, cmd, timeout=None):
+        """Start command whose raw stdout is read while it runs; see `ExecPipe`.
+
+        Like `exec_stream`, runs in its own engine exec and is never retried.
+
+        Args:
+            cmd: command string
+            timeout: seconds after which engine exec is killed; result is a `TimeoutResult`
+        """
+        from rhel_containers.deadline import bounded
+        from rhel_containers.deadline import deadline
+        from rhel_containers.stream import ExecPipe
+
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            timeout = bounded(self.timeout)
+        return ExecPipe(self._exec_command(cmd), timeout=timeout).start()
+
+    def exec_many(self, cmds, stop_on_failure=False, timeout=None):
+        """Execute list of commands in a single engine exec.
+
+        Args:
+            cmds: list of command strings
+            stop_on_failure: skip remaining commands after first non-zero exit status
+            timeout: seconds for the whole batch
+
+        Returns:
+            list of ContCommandResult, one per executed command. If engine itself fails
+            (or times out) before all commands are done, its result is appended last.
+        """
+        from rhel_containers.deadline import deadline
+
+        if not cmds:
+            return []
+        for cmd in cmds:
+            logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(*cmds)
+        with deadline(timeout):
+            if self.session is not None and self.session.alive:
+                return self.session.run_many(
+                    cmds, stop_on_failure=stop_on_failure, timeout=self.timeout
+                )
+            marker, command = self._batch_command(cmds, stop_on_failure=stop_on_failure)
+            return self._batch_results(cmds, marker, self._exec(command))
+
+    def _batch_command(self, cmds, stop_on_failure=False):
+        """Engine command running framed batch of commands; returns marker and command."""
+        from rhel_containers.session import frame_commands
+
+        marker = f"__RHEL_CONT_{uuid.uuid4().hex}__"
+        script = frame_commands(cmds, marker, stop_on_failure=stop_on_failure)
+        return marker, self._exec_command(script)
+
+    def _batch_results(self, cmds, marker, out):
+        """Split output of framed batch into per-command results."""
+        from rhel_containers.session import frames_to_results, read_frames
+
+        stdout_frames, complete = read_frames(out.stdout.splitlines(keepends=True), marker)
+        stderr_frames, _ = read_frames(out.stderr.splitlines(keepends=True), marker)
+        results = frames_to_results(cmds, stdout_frames, stderr_frames)
+        if not complete:
+            results.append(out)
+        return results
+
+    def _watch_command(self):
+        """Engine command streaming state changes of container, one per line."""
+        return None
+
+    def _parse_event(self, line):
+        """Map watch output line to "running", terminal state name or None."""
+        return None
+
+    def _poll_running(self, timeout):
+        from wait_for import TimedOutError
+        from wait_for import wait_for
+
+        try:
+            wait_for(lambda: self.status == "Running", timeout=f"{timeout}s")
+            return True
+        except TimedOutError:
+            return False
+
+    def wait_running(self, timeout=60):
+        """Wait for container/pod up and running.
+
+        State changes are read from engine event stream (`_watch_command`) so this
+        returns as soon as container runs; engines without one fall back to polling
+        `status`.
+
+        Args:
+            timeout: seconds to wait
+
+        Returns:
+            True if running, False on timeout.
+
+        Raises:
+            RhelContainerException: container reached a terminal state.
+        """
+        from rhel_containers.deadline import bounded
+
+        timeout = bounded(timeout)
+        command = self._watch_command()
+        if command is None:
+            return self._poll_running(timeout)
+
+        proc = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        lines = queue.Queue()
+        threading.Thread(target=pump, args=(proc.stdout, lines), daemon=True).start()
+        end = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    line = lines.get(timeout=max(end - time.monotonic(), 0))
+                except queue.Empty:
+                    return False
+                if line is None:
+                    # watcher died (e.g. old engine); fall back to polling.
+                    return self._poll_running(max(end - time.monotonic(), 0))
+                state = self._parse_event(line.decode(errors="replace").strip())
+                if state == "running":
+                    return True
+                if state:
+                    raise RhelContainerException(
+                        msg=f"{self.name} failed to start: {state}",
+                        stdout="",
+                        stderr="",
+                        command=" ".join(command),
+                    )
+        finally:
+            kill_process_group(proc)
+            proc.wait()
+
+    def cp(self, source, dest):
+        """Copy file from sorce to destination.
+
+        Args:
+            source: sorce path
+            dest: destination path
+        """
+        command = [self.engine, "cp", source, dest]
+        self.generation += 1
+        return self._exec(command)
+
+    def _add_file_command(self, filename, content, overwrite=False):
+        """Command writing text file with a heredoc; used where commands get batched."""
+        redirect = ">" if overwrite else ">>"
+        # quoted unique delimiter: no expansion of `$` and content may contain "EOF".
+        delimiter = f"EOF_{uuid.uuid4().hex}"
+        return f"cat {redirect}{filename} <<'{delimiter}'\n{content}\n{delimiter}"
+
+    def add_file(self, filename, content, overwrite=False):
+        """Write text file (with trailing newline) in container, appending by default."""
+        return self.put_file(
+            filename, data=f"{content}\n", checksum=overwrite, append=not overwrite
+        )
+
+    def put_file(
+        self, cont_path, data=None, host_path=None, mode=None, checksum=True, append=False
+    ):
+        """Write file in container streaming content over exec stdin.
+
+        Args:
+            cont_path: destination path in container; parent directories are created
+            data: content as str, bytes or binary file object
+            host_path: host file to copy instead of `data`
+            mode: permission bits like 0o600
+            checksum: skip transfer if container file already has the same sha256
+            append: append to file instead of replacing it
+
+        Returns:
+            ContCommandResult; stdout is "SKIP" if file was already identical.
+        """
+        from rhel_containers.deadline import bounded
+        from rhel_containers.transfer import put_script, send, Source
+
+        source = Source(data=data, host_path=host_path)
+        digest = source.sha256() if checksum and not append else None
+        script = put_script(cont_path, digest=digest, mode=mode, append=append)
+        logger.info(f"Putting file {redact(cont_path)}")
+        self.generation += 1
+        command = self._exec_command(script, interactive=True)
+        return send(command, source, handshake=True, timeout=bounded(self.timeout))
+
+    def put_files(self, files, mode=None, checksum=True):
+        """Write many files in container with one tar stream.
+
+        Args:
+            files: dict of container path -> content (str/bytes) or host `pathlib.Path`
+            mode: permission bits of files from content; host files keep their own
+            checksum: leave out files already identical in container (one extra exec)
+
+        Returns:
+            ContCommandResult; stdout lists transferred paths.
+        """
+        from rhel_containers.deadline import bounded
+        from rhel_containers.transfer import hash_script, parse_hashes, run, send_tar, Source
+
+        sources = {
+            path: Source(host_path=content) if isinstance(content, Path) else Source(data=content)
+            for path, content in files.items()
+        }
+        if checksum and sources:
+            command = self._exec_command(hash_script(list(sources)))
+            hashes = parse_hashes(run(command, timeout=bounded(self.timeout)).stdout)
+            sources = {
+                path: source
+                for path, source in sources.items()
+                if hashes.get(path) != source.sha256()
+            }
+        logger.info(f"Putting {len(sources)} of {len(files)} files")
+        if not sources:
+            return ContCommandResult(exit_status=0, stdout="", command="put_files")
+        self.generation += 1
+        members = [(path, source, mode) for path, source in sources.items()]
+        command = self._exec_command("tar -xpf - -C /", interactive=True)
+        out = send_tar(command, members, timeout=bounded(self.timeout))
+        if out.exit_status == 0:
+            out.stdout = "\n".join(sources)
+        return out
+
+    def get_file(self, cont_path, dest):
+        """Copy file from container streaming it over exec stdout.
+
+        Args:
+            cont_path: file path in container
+            dest: host path or binary file object
+        """
+        from rhel_containers.deadline import bounded
+        from rhel_containers.transfer import receive
+
+        logger.info(f"Getting file {cont_path}")
+        command = self._exec_command(f"cat {shlex.quote(cont_path)}")
+        return receive(command, dest, timeout=bounded(self.timeout))
+
+
+class PodmanEngine(BaseEngine):
+    """Podman/Docker engine wrapper.
+
+    Args:
+        status_provider: `StatusProvider` shared with other engines; `status` is then served
+            from its bulk `ps` snapshot instead of an `inspect` per call.
+    """
+
+    status_provider = None
+
+    def __init__(self, name=None, engine="auto", status_provider=None, *args, **kwargs):
+        self.engine = find_engine(engine, ("podman", "docker"))
         self.name = name or f"rhel-{datetime.datetime.now().strftime('%y%m%d-%H%M%S')}"
+        self.status_provider = status_provider
 
-    def _exec(self, command):
-        """Internal use to execute subprocess cmd."""
-        out = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return ContCommandResult.from_subprocess_out(out)
+    def _state_changed(self, out):
+        """Drop shared status snapshot after a call changing container state."""
+        if self.status_provider is not None:
+            self.status_provider.invalidate()
+        return out
 
-    def run(self, image, hostname=None, envs=None, *args, **kwargs):
+    def run(self, image, hostname=None, envs=None, volumes=None, resources=None, *args, **kwargs):
         """run container.
         Args:
             image: Image of rhel container
             hostname: Set container hostname
             env: List of environment variables to set in container
+            volumes: list of (host path, container path, read only) to mount
+            resources: `ResourceLimits` of container
         """
         cmd = [self.engine, "run", "--name", self.name, "--rm", "-d"]
+        if resources:
+            cmd.extend(resources.podman_args())
 
         if hostname:
             cmd.extend(["--hostname", hostname])
         if envs:
             cmd.extend(["--env", " ".join(envs)])
+        for host_path, cont_path, read_only in volumes or []:
+            # `z`: relabel for SELinux, shared between containers.
+            cmd.extend(["--volume", f"{host_path}:{cont_path}:{'ro,' if read_only else ''}z"])
 
         cmd.extend([image])
-        return self._exec(cmd)
+        self.started_at = time.time()
+        self.generation += 1
+        return self._state_changed(self._exec(cmd))
 
     def kill(self):
         """Kill running container."""
-        return self._exec([self.engine, "kill", self.name])
+        return self._state_changed(self._exec([self.engine, "kill", self.name]))
 
     def rm(self):
         """Remove container."""
-        return self._exec([self.engine, "rm", self.name])
+        return self._state_changed(self._exec([self.engine, "rm", self.name]))
 
     def stop(self):
         """Stop container."""
-        return self._exec([self.engine, "stop", self.name])
+        return self._state_changed(self._exec([self.engine, "stop", self.name]))
 
-    def exec(self, cmd):
-        """Execute command on contaienr.
+    def commit(self, image):
+        """Commit container to image.
 
         Args:
-            cmd: command string
+            image: image name with tag
         """
-        command = [self.engine, "exec", self.name, "bash", "-c", cmd]
-        logger.info(f"Executing '{cmd}'")
-        return self._exec(command)
-
-    def cp(self, source, dest):
-        """Copy file from sorce to destination.
-
-        Args:
-            source: sorce path
-            dest: destination path
-        """
-        command = [self.engine, "cp", source, dest]
-        return self._exec(command)
-
-    def add_file(self, filename, content, overwrite=False):
-        if overwrite:
-            if self.exec(f"[ -f {filename} ]").exit_status == 0:
-                self.exec(f"rm {filename}")
-        return self.exec(f"cat >>{filename} <<EOF\n{content}\nEOF")
+        return self._exec([self.engine, "commit", self.name, image])
+
+    def image_id(self, image):
+        """Return id of local image or None if image not present."""
+        # `images -q` exits 0 for unknown images, so a miss isn't logged as an error.
+        out = self._exec([self.engine, "images", "--quiet", "--no-trunc", image])
+        return out.stdout.split()[0] if out.exit_status == 0 and out.stdout else None
+
+    def images(self, repository):
+        """List local images of repository as (image, id, created) tuples."""
+        out = self._exec(
+            [
+                self.engine,
+                "images",
+                "--filter",
+                f"reference={repository}",
+                "--format",
+                "{{.Repository}}:{{.Tag}}\t{{.ID}}\t{{.CreatedAt}}",
+            ]
+        )
+        if out.exit_status != 0:
+            return []
+        return [tuple(line.split("\t", 2)) for line in out.stdout.splitlines() if line]
+
+    def rmi(self, image):
+        """Remove local image."""
+        return self._exec([self.engine, "rmi", image])
+
+    def _exec_command(self, cmd=None, interactive=False):
+        command = [self.engine, "exec"]
+        if interactive:
+            command.append("-i")
+        command.extend([self.name, "bash"])
+        return command if cmd is None else command + ["-c", cmd]
+
+    def _status_command(self):
+        return [self.engine, "inspect", "--format", "{{.State.Status}}", self.name]
+
+    def _watch_command(self):
+        if self.started_at is None:
+            return None
+        # replay events since `run` so a start happened before subscribing isn't missed.
+        return [
+            self.engine,
+            "events",
+            "--since",
+            str(int(self.started_at) - 1),
+            "--filter",
+            f"container={self.name}",
+            "--format",
+            "{{.Status}}",
+        ]
+
+    def _parse_event(self, line):
+        if line.startswith("{"):
+            # JSON event (`--format json`): `Status` on podman, `status` on docker.
+            try:
+                event = json.loads(line)
+            except ValueError:
+                return None
+            line = event.get("Status") or event.get("status") or ""
+        if line == "start":
+            return "running"
+        if line in TERMINAL_EVENTS:
+            return TERMINAL_EVENTS[line]
+        return None
+
+    def _parse_status(self, out):
+        if out.exit_status != 0:
+            return f"{self.name} unavailable."
+        return out.stdout.title()
 
     @property
     def status(self):
         """Return status of container."""
-        command = [self.engine, "inspect", "--format", "{{.State.Status}}", self.name]
-        out = self._exec(command=command)
-        if out.exit_status != 0:
-            return f"{self.name} unavailable."
-        return out.stdout.title()
+        if self.status_provider is not None:
+            return self.status_provider.status(self.name)
+        return self._parse_status(self._exec(command=self._status_command()))
 
+    def _state_command(self):
+        return [self.engine, "ps", "-a", "--format", "json", "--filter", f"name=^{self.name}$"]
+
+    @property
+    def state(self):
+        """`ContainerState` (exit code, start time, health...) or None if container is gone."""
+        from rhel_containers.status import parse_ps
 
-class OpenshiftEngine:
+        if self.status_provider is not None:
+            return self.status_provider.state(self.name)
+        out = self._exec(self._state_command())
+        return parse_ps(out.stdout).get(self.name) if out.exit_status == 0 else None
+
+
+def label_selector(labels):
+    """`k=v,k2=v2` selector of labels dict."""
+    return ",".join(f"{key}={value}" for key, value in labels.items())
+
+
+class OpenshiftEngine(BaseEngine):
     """Openshift/k8s engine wrapper."""
 
     def __init__(self, name=None, engine="auto", *args, **kwargs):
-        if engine == "auto":
-            self.engine = "oc" if shutil.which("oc") else "kubectl"
-        else:
-            self.engine = engine
-
-        # check engine exist or not
-        if shutil.which(self.engine) is None:
-            raise ValueError(
-                f"'{engine}' engine not found. Make sure it should installed on your system."
-            )
+        self.engine = find_engine(engine, ("oc", "kubectl"))
         self.name = name or f"rhel-{datetime.datetime.now().strftime('%y%m%d-%H%M%S')}"
 
-    def _exec(self, command):
-        """Internal use to execute subprocess cmd."""
-        out = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return ContCommandResult.from_subprocess_out(out)
-
-    def run(self, image, hostname=None, envs=None, *args, **kwargs):
+    def run(
+        self,
+        image,
+        hostname=None,
+        envs=None,
+        volumes=None,
+        labels=None,
+        resources=None,
+        *args,
+        **kwargs,
+    ):
         """run container.
         Args:
             hostname: Set container hostname
             env: dict of environment variables to set in container
+            volumes: list of (host path, container path, read only) mounted as hostPath
+                volumes; host paths are on the node running the pod.
+            labels: dict of pod labels
+            resources: `ResourceLimits` of container; set as container resources
         """
         cmd = [self.engine, "run", self.name]
 
         if envs:
             cmd.extend([f"--env='{k}={v}'" for k, v in envs.items()])
+        if labels:
+            cmd.append(f"--labels={label_selector(labels)}")
 
         cmd.extend([f"--image={image}"])
+        spec = {}
         if hostname:
-            cmd.extend([f"--overrides={{'spec': {{'hostname': '{hostname}'}}"])
+            spec["hostname"] = hostname
+        container = {}
+        if volumes:
+            spec["volumes"] = [
+                {"name": f"vol-{i}", "hostPath": {"path": host_path, "type": "DirectoryOrCreate"}}
+                for i, (host_path, _, _) in enumerate(volumes)
+            ]
+            container["volumeMounts"] = [
+                {"name": f"vol-{i}", "mountPath": cont_path, "readOnly": read_only}
+                for i, (_, cont_path, read_only) in enumerate(volumes)
+            ]
+        if resources and resources.k8s_resources():
+            container["resources"] = resources.k8s_resources()
+        if container:
+            spec["containers"] = [{"name": self.name, "image": image, **container}]
+        if spec:
+            cmd.extend([f"--overrides={json.dumps({'spec': spec})}"])
+        self.started_at = time.time()
+        self.generation += 1
         return self._exec(cmd)
 
     def stop(self):
         """Delete container than stopping."""
         return self._exec([self.engine, "delete", "pod", self.name])
 
-    def exec(self, cmd):
-        """Execute command on contaienr.
+    def _delete_label_command(self, label):
+        return [self.engine, "delete", "pods", "-l", label, "--wait=false"]
 
-        Args:
-            cmd: command string
-        """
-        command = [self.engine, "exec", self.name, "--", "bash", "-c", cmd]
-        logger.info(f"Executing: '{cmd}'")
-        return self._exec(command)
-
-    def cp(self, source, dest):
-        """Copy file from sorce to destination.
-
-        Args:
-            source: sorce path
-            dest: destination path
-        """
-        command = [self.engine, "cp", source, dest]
-        return self._exec(command)
+    def delete_label(self, label):
+        """Delete all pods matching label selector in one call."""
+        return self._exec(self._delete_label_command(label))
 
-    def add_file(self, filename, content, overwrite=False):
-        if overwrite:
-            if self.exec(f"[ -f {filename} ]").exit_status == 0:
-                self.exec(f"rm {filename}")
-        return self.exec(f"cat >>{filename} <<EOF\n{content}\nEOF")
+    def _exec_command(self, cmd=None, interactive=False):
+        command = [self.engine, "exec"]
+        if interactive:
+            command.append("-i")
+        command.extend([self.name, "--", "bash"])
+        return command if cmd is None else command + ["-c", cmd]
 
-    def get_json(self, restype, name=None, label=None, namespace=None):
-        """
-        Get json for resource type/name/label.
-        If name is None all resources of this type are returned
-        If label is not provided, then "oc get" will not be filtered on label
-        """
+    def _get_json_command(self, restype, name=None, label=None, namespace=None):
         command = [self.engine, "get", restype]
         if name:
             command.append(name)
@@ -204,8 +886,10 @@ class OpenshiftEngine:
             command.extend(["-n", namespace])
 
         command.extend(["-o", "json"])
-        out = self._exec(command=command)
+        return command
 
+    @staticmethod
+    def _parse_json(out):
         if out.exit_status != 0:
             return {}
         try:
@@ -213,10 +897,54 @@ class OpenshiftEngine:
         except ValueError:
             return {}
 
-    @property
-    def status(self):
-        """Return status of pod."""
-        out = self.get_json(restype="pods", name=self.name)
+    def get_json(self, restype, name=None, label=None, namespace=None):
+        """
+        Get json for resource type/name/label.
+        If name is None all resources of this type are returned
+        If label is not provided, then "oc get" will not be filtered on label
+        """
+        command = self._get_json_command(restype, name=name, label=label, namespace=namespace)
+        return self._parse_json(self._exec(command=command))
+
+    def _parse_status(self, out):
         if not out:
             return f"{self.name} unavailable."
         return out["status"]["phase"]
+
+    @staticmethod
+    def _parse_pod_states(data):
+        """Pod name -> phase of `get pods -o json` list; terminal waiting reason wins."""
+        states = {}
+        for pod in data.get("items", []):
+            status = pod.get("status", {})
+            state = status.get("phase", "Unknown")
+            for cont in status.get("containerStatuses", []):
+                reason = cont.get("state", {}).get("waiting", {}).get("reason")
+                if reason in TERMINAL_POD_REASONS:
+                    state = reason
+            states[pod["metadata"]["name"]] = state
+        return states
+
+    def pod_states(self, label):
+        """Phase of every pod matching label selector, with a single `get pods` call."""
+        return self._parse_pod_states(self.get_json(restype="pods", label=label))
+
+    def _watch_command(self):
+        jsonpath = '{.status.phase}{" "}{.status.containerStatuses[*].state.waiting.reason}{"\\n"}'
+        return [self.engine, "get", "pod", self.name, "--watch", "-o", f"jsonpath={jsonpath}"]
+
+    def _parse_event(self, line):
+        phase, _, reasons = line.partition(" ")
+        if phase == "Running":
+            return "running"
+        if phase in ("Failed", "Succeeded"):
+            return phase
+        for reason in reasons.split():
+            if reason in TERMINAL_POD_REASONS:
+                return reason
+        return None
+
+    @property
+    def status(self):
+        """Return status of pod."""
+        return self._parse_status(self.get_json(restype="pods", name=self.name))
@@ -0,0 +1,122 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# fact name -> command; all loaded with a single `exec_many`.
+FACT_CMDS = {
+    "packages": "rpm -qa --qf '%{NAME}\\n'",
+    "commands": "compgen -c | sort -u",
+    "redhat_release": "cat /etc/redhat-release",
+    "arch": "/bin/arch",
+    "hostname": "cat /proc/sys/kernel/hostname",
+}
+# facts changed by installing or removing packages; the others hold for container lifetime.
+PACKAGE_FACTS = ("packages", "commands")
+
+
+class ContainerFacts:
+    """In-memory cache of installed packages and static facts of a container.
+
+    Facts are loaded in one round-trip and served from memory. Static facts (release,
+    arch, hostname) hold until the engine runs a new container. Package and command
+    facts also go stale once a command which may install or remove packages ran
+    (dnf/yum/rpm/pip, as run by package transactions and setup steps), which bumps
+    `engine.package_generation`; `invalidate` them after changing packages otherwise.
+
+    Args:
+        engine: container engine
+    """
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._facts = None
+        self._started_at = None
+        self._package_generation = None
+
+    @property
+    def static_stale(self):
+        """True if static facts need loading."""
+        return self._facts is None or self._started_at != self._engine.started_at
+
+    @property
+    def stale(self):
+        """True if any fact, package facts included, needs loading."""
+        return self.static_stale or self._package_generation != self._engine.package_generation
+
+    def _stale(self, name):
+        return self.static_stale if name not in PACKAGE_FACTS else self.stale
+
+    def invalidate(self):
+        """Drop cached package and command facts; static ones go with the container."""
+        self._package_generation = None
+
+    def _load_names(self):
+        """Facts `load` fetches: all of them for a new container, else package facts."""
+        return list(FACT_CMDS) if self.static_stale else list(PACKAGE_FACTS)
+
+    def load(self):
+        """Load facts from container (see `_load_names`); return True on success."""
+        names, key = self._load_names(), self._key()
+        return self._store(names, key, self._engine.exec_many([FACT_CMDS[n] for n in names]))
+
+    def _key(self):
+        """Engine state facts loaded now belong to; taken before running the fact commands."""
+        return self._engine.started_at, self._engine.package_generation
+
+    def _store(self, names, key, results):
+        """Keep facts `names` of their `exec_many` results; return True on success."""
+        if len(results) != len(names) or results[0].exit_status != 0:
+            logger.warning(f"Fail to load facts of {self._engine.name}")
+            self._facts = None
+            return False
+
+        facts = dict(self._facts or {})
+        for name, out in zip(names, results):
+            facts[name] = frozenset(out.stdout.split()) if name in PACKAGE_FACTS else out.stdout
+        self._facts = facts
+        self._started_at, self._package_generation = key
+        return True
+
+    def cached(self, name):
+        """Fact from memory, never running anything; None if it is stale."""
+        return None if self._stale(name) else self._facts[name]
+
+    def get(self, name, load=True):
+        """Get fact; stale fact is reloaded unless `load` is False (then None)."""
+        if self._stale(name) and load:
+            self.load()
+        return self.cached(name)
+
+    def installed(self, pkg):
+        """Whether package or command is available, from memory; None if cache is stale."""
+        if self.stale:
+            return None
+        return pkg in self._facts["packages"] or pkg in self._facts["commands"]
+
+    def is_installed(self, pkg, load=True):
+        """Check package (rpm name) or command is available in container.
+
+        Args:
+            pkg: rpm name or command
+            load: reload stale cache; if False, None is returned for stale cache.
+        """
+        if self.stale and load and not self.load():
+            return False
+        return self.installed(pkg)
+
+    @property
+    def packages(self):
+        """Names of installed rpm packages."""
+        return self.get("packages")
+
+    @property
+    def redhat_release(self):
+        return self.get("redhat_release")
+
+    @property
+    def arch(self):
+        return self.get("arch")
+
+    @property
+    def hostname(self):
+        return self.get("hostname")
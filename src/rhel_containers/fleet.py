@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import random
+import string
+import time
+from pathlib import Path
+
+from rhel_containers.aio import AsyncOpenshiftEngine
+from rhel_containers.aio import AsyncRhelContainer
+from rhel_containers.aio import AsyncStatusProvider
+from rhel_containers.engine import label_selector
+from rhel_containers.engine import TERMINAL_POD_REASONS
+from rhel_containers.exception import RhelContainerException
+
+logger = logging.getLogger(__name__)
+
+# label every pod of an OpenshiftFleet carries, value is the fleet run id.
+RUN_LABEL = "rhel-containers/run"
+
+
+class FleetResult:
+    """Aggregated outcome of one fleet phase.
+
+    Attributes:
+        phase: phase name (start, setup, exec, stop...)
+        results: container name -> value returned by the phase
+        errors: container name -> exception raised by the phase
+        durations: container name -> seconds spent on that container
+        duration: wall-clock seconds of the whole phase
+    """
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.results = {}
+        self.errors = {}
+        self.durations = {}
+        self.duration = None
+
+    @property
+    def failed(self):
+        """Names of containers which raised or returned a non-zero exit status."""
+        failed = set(self.errors)
+        for name, out in self.results.items():
+            outs = out if isinstance(out, list) else [out]
+            if any(getattr(o, "exit_status", 0) != 0 for o in outs):
+                failed.add(name)
+        return sorted(failed)
+
+    @property
+    def succeeded(self):
+        return sorted(set(self.results) - set(self.failed))
+
+    def __repr__(self):
+        return (
+            f"FleetResult(phase={self.phase!r}, succeeded={len(self.succeeded)}, "
+            f"failed={len(self.failed)}, duration={self.duration:.2f}s)"
+        )
+
+
+class RhelContainerFleet:
+    """Manage N RHEL containers concurrently with bounded parallelism.
+
+    Every phase runs on one event loop (see `rhel_containers.aio`); a failing container
+    is reported in the phase result and skipped by following phases, other containers
+    carry on. Sync methods use `asyncio.run`, use `run` from async code.
+
+    Args:
+        count: number of containers
+        concurrency: max containers handled at the same time
+        name_prefix: prefix for container names
+        kwargs: passed to AsyncRhelContainer (engine_name, release, env, config...)
+
+    Example:
+        fleet = RhelContainerFleet(count=50, concurrency=10, release=8.3, env="ci")
+        fleet.start()
+        fleet.setup("insights-client")
+        fleet.stop()
+        fleet.timings  # {"start": 12.1, "setup": 80.4, "stop": 5.2}
+    """
+
+    def __init__(self, count, concurrency=10, name_prefix=None, **kwargs):
+        self.concurrency = concurrency
+        self.prefix = prefix = (
+            name_prefix
+            or f"rhel-{''.join(random.choice(string.ascii_letters).lower() for _ in range(5))}"
+        )
+        # podman/docker containers share one bulk `ps` for their status.
+        self.status_provider = None
+        if kwargs.get("engine_name", "podman") in ("podman", "docker"):
+            self.status_provider = kwargs.setdefault(
+                "status_provider",
+                AsyncStatusProvider(engine=kwargs.get("engine_name", "podman"), name_prefix=prefix),
+            )
+        self.containers = [
+            AsyncRhelContainer(name=f"{prefix}-{index}", **kwargs) for index in range(count)
+        ]
+        self.history = []
+        self.failed = set()
+
+    def __len__(self):
+        return len(self.containers)
+
+    def __iter__(self):
+        return iter(self.containers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def timings(self):
+        """Wall-clock duration of each phase run so far."""
+        return {result.phase: result.duration for result in self.history}
+
+    @property
+    def healthy(self):
+        """Containers which did not fail in any phase so far."""
+        return [cont for cont in self.containers if cont.name not in self.failed]
+
+    async def container_states(self):
+        """Container name -> ContainerState of fleet containers, with one `ps` call."""
+        if self.status_provider is None:
+            raise NotImplementedError("Container states need a podman/docker fleet.")
+        states = await self.status_provider.states(max_age=0)
+        return {cont.name: states.get(cont.name) for cont in self.containers}
+
+    def states(self):
+        return asyncio.run(self.container_states())
+
+    async def run(self, phase, func, include_failed=False, mark_failed=True):
+        """Run coroutine function on every container.
+
+        Args:
+            phase: phase name used in result and logs
+            func: coroutine function taking an AsyncRhelContainer
+            include_failed: also run on containers which failed previous phases
+            mark_failed: skip containers failing this phase in following phases
+        """
+        containers = self.containers if include_failed else self.healthy
+        semaphore = asyncio.Semaphore(self.concurrency)
+        result = FleetResult(phase)
+
+        async def _run(cont):
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    result.results[cont.name] = await func(cont)
+                except Exception as exc:
+                    logger.error(f"{phase} failed on {cont.name}: {exc}")
+                    result.errors[cont.name] = exc
+                finally:
+                    result.durations[cont.name] = time.monotonic() - started
+
+        logger.info(f"Running {phase} on {len(containers)} containers")
+        started = time.monotonic()
+        await asyncio.gather(*(_run(cont) for cont in containers))
+        result.duration = time.monotonic() - started
+
+        if mark_failed:
+            self.failed.update(result.failed)
+        self.history.append(result)
+        logger.info(f"{result}")
+        return result
+
+    def start(self, **kwargs):
+        """Start all containers; kwargs are passed to `AsyncRhelContainer.start`."""
+        return asyncio.run(self.run("start", lambda cont: cont.start(**kwargs)))
+
+    def setup(self, *args, **kwargs):
+        """Run `setup` on all running containers."""
+        return asyncio.run(self.run("setup", lambda cont: cont.setup(*args, **kwargs)))
+
+    def exec(self, cmd):
+        """Execute command on all running containers."""
+        return asyncio.run(self.run("exec", lambda cont: cont.exec(cmd), mark_failed=False))
+
+    def exec_many(self, cmds, stop_on_failure=False):
+        """Execute list of commands on all running containers."""
+        return asyncio.run(
+            self.run(
+                "exec_many",
+                lambda cont: cont.exec_many(cmds, stop_on_failure=stop_on_failure),
+                mark_failed=False,
+            )
+        )
+
+    def collect_archives(self, directory, **kwargs):
+        """Stream insights archives of all running containers into a directory.
+
+        Archives are saved as `<directory>/<container name>.tar.gz` (`.tar` if decompressed).
+
+        Args:
+            directory: host directory; created if missing
+            kwargs: passed to `InsightsClient.collect_archive` (decompress, index, no_upload)
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        suffix = ".tar" if kwargs.get("decompress") else ".tar.gz"
+        return asyncio.run(
+            self.run(
+                "collect_archives",
+                lambda cont: cont.insights_client.collect_archive(
+                    directory.joinpath(f"{cont.name}{suffix}"), **kwargs
+                ),
+                mark_failed=False,
+            )
+        )
+
+    def stop(self):
+        """Stop all containers, including failed ones."""
+        return asyncio.run(self.run("stop", lambda cont: cont.stop(), include_failed=True))
+
+
+class OpenshiftFleet(RhelContainerFleet):
+    """Fleet of pods labelled with a run id, handled with bulk label queries.
+
+    Pods are created one `run` each (with `concurrency` in flight), but their phases are
+    resolved with a single `get pods -l <run label> -o json` per poll and all pods are
+    deleted with a single `delete pods -l <run label>`.
+
+    Args:
+        count: number of pods
+        concurrency: max pods handled at the same time
+        name_prefix: prefix for pod names; also the default run id
+        run_id: value of `rhel-containers/run` label of fleet pods
+        poll_interval: seconds between bulk status queries
+        kwargs: passed to AsyncRhelContainer (engine_name, release, env, config...)
+
+    Example:
+        fleet = OpenshiftFleet(count=200, engine_name="kubectl", env="ci")
+        fleet.start()  # one `get pods -l` per poll for all 200 pods
+        fleet.states()  # {"rhel-abcde-0": "Running", ...}
+        fleet.stop()  # one `delete pods -l`
+    """
+
+    def __init__(
+        self, count, concurrency=10, name_prefix=None, run_id=None, poll_interval=1, **kwargs
+    ):
+        kwargs.setdefault("engine_name", "kubectl")
+        super().__init__(count, concurrency=concurrency, name_prefix=name_prefix, **kwargs)
+        self.run_id = run_id or self.prefix
+        self.labels = {RUN_LABEL: self.run_id}
+        self.label = label_selector(self.labels)
+        self.poll_interval = poll_interval
+        if self.containers and not isinstance(self.containers[0].engine, AsyncOpenshiftEngine):
+            raise NotImplementedError("OpenshiftFleet needs an openshift engine.")
+        # fleet level calls; named after the run so spans and logs point at the fleet.
+        self.engine = AsyncOpenshiftEngine(
+            name=self.run_id, engine=self.containers[0].engine.engine if self.containers else "auto"
+        )
+
+    async def pod_states(self):
+        """Pod name -> phase (or terminal waiting reason) of fleet pods, in one call."""
+        return await self.engine.pod_states(self.label)
+
+    def states(self):
+        return asyncio.run(self.pod_states())
+
+    async def wait_running(self, timeout=60):
+        """Wait until every healthy pod runs, polling all of them with one call.
+
+        Pods in a terminal state or not running on timeout fail the `wait_running` phase.
+        """
+        containers = {cont.name: cont for cont in self.healthy}
+        result = FleetResult("wait_running")
+        started = time.monotonic()
+        pending = set(containers)
+        while pending:
+            states = await self.pod_states()
+            for name in sorted(pending):
+                state = states.get(name)
+                if state == "Running":
+                    result.results[name] = True
+                elif state in ("Failed", "Succeeded") or state in TERMINAL_POD_REASONS:
+                    result.errors[name] = RhelContainerException(
+                        msg=f"{name} failed to start: {state}"
+                    )
+                else:
+                    continue
+                result.durations[name] = time.monotonic() - started
+                pending.discard(name)
+            if not pending or time.monotonic() - started > timeout:
+                break
+            await asyncio.sleep(self.poll_interval)
+        for name in pending:
+            result.results[name] = False
+            result.errors[name] = RhelContainerException(msg=f"{name} not running after {timeout}s")
+            result.durations[name] = time.monotonic() - started
+        result.duration = time.monotonic() - started
+
+        self.failed.update(result.failed)
+        self.history.append(result)
+        logger.info(f"{result}")
+        return result
+
+    async def _start(self, timeout, **kwargs):
+        await self.run("start", lambda cont: cont.start(wait=False, labels=self.labels, **kwargs))
+        return await self.wait_running(timeout=timeout)
+
+    def start(self, timeout=60, **kwargs):
+        """Create all pods labelled with run id and wait for them with bulk status polls.
+
+        Returns:
+            FleetResult of `wait_running` phase; `start` phase is in `history`.
+        """
+        return asyncio.run(self._start(timeout, **kwargs))
+
+    async def _stop(self):
+        result = FleetResult("stop")
+        started = time.monotonic()
+        out = await self.engine.delete_label(self.label)
+        result.duration = time.monotonic() - started
+        for cont in self.containers:
+            # pods are gone with the label delete; only host side resources are left.
+            cont.release_resources()
+            result.results[cont.name] = out
+            result.durations[cont.name] = result.duration
+        self.history.append(result)
+        logger.info(f"{result}")
+        return result
+
+    def stop(self):
+        """Delete all fleet pods, including failed ones, with one label query."""
+        return asyncio.run(self._stop())
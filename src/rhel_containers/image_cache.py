@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import shlex
+
+logger = logging.getLogger(__name__)
+
+CACHE_REPOSITORY = "localhost/rhel-containers-cache"
+
+# config keys never hashed; rotating credentials must not invalidate the cache.
+SECRET_KEYS = ("username", "password", "token", "secret", "activation_key")
+
+# registration state and secrets kept out of committed layers. They are moved to
+# /dev/shm (tmpfs, not committed) while committing and restored afterwards.
+SECRET_PATHS = (
+    "/etc/pki/consumer",
+    "/etc/pki/entitlement",
+    "/var/lib/rhsm",
+    "/etc/insights-client/machine-id",
+    "/etc/insights-client/.registered",
+    "/etc/insights-client/.unregistered",
+    "/etc/insights-client/.lastupload",
+    "/var/lib/insights",
+    "/root/.bash_history",
+)
+STASH = "/dev/shm/.rhel-containers-secrets"
+
+
+def public_config(config):
+    """Copy of config without secret values."""
+    if isinstance(config, dict):
+        return {
+            str(key): public_config(value)
+            for key, value in config.items()
+            if not any(secret in str(key).lower() for secret in SECRET_KEYS)
+        }
+    return config
+
+
+def profile_name(profile, options=None):
+    """Name setup profile is recorded and cached under, e.g. `ansible(setup_ssh=False)`.
+
+    Args:
+        profile: setup profile
+        options: step builder kwargs differing from their defaults
+    """
+    if not options:
+        return profile
+    args = ",".join(f"{key}={value!r}" for key, value in sorted(options.items()))
+    return f"{profile}({args})"
+
+
+def base_profile(name):
+    """Setup profile of a name from `profile_name`."""
+    return name.partition("(")[0]
+
+
+def cache_key(base_image, release, env, profiles, config=None):
+    """Hash of everything a cached setup image depends on.
+
+    Args:
+        base_image: repository image (or its id) the container was started from
+        release: RHEL release
+        env: insights env
+        profiles: setup profiles applied in order, named by `profile_name`
+        config: RHEL_CONTAINERS config sections profiles depend on; secret keys are
+            left out
+    """
+    inputs = {
+        "base_image": base_image,
+        "release": str(release),
+        "env": env,
+        "profiles": list(profiles),
+        "config": public_config(config or {}),
+    }
+    data = json.dumps(inputs, sort_keys=True, default=str).encode()
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class ImageCache:
+    """Local images of containers committed right after a setup profile.
+
+    Images are tagged `<profiles>-<release>-<env>-<key>` in `repository`, where key
+    comes from `cache_key`; profile options are only part of the key. Secrets are left out of both key and committed layer,
+    so a container started from a cached image still needs registration.
+
+    Args:
+        engine: podman/docker engine (CLI or API)
+        repository: local repository of cached images
+
+    Example:
+        rc = RhelContainer(release=8.3, env="ci", image_cache=True)
+        rc.start(profile="insights-client")  # boots cached image if any
+        rc.setup("insights-client")  # installs/configures and commits on cache miss
+        rc.image_cache.list()
+        rc.image_cache.prune(release="8.3")
+    """
+
+    # paths moved out of the container while committing, and where they are moved to.
+    secret_paths = SECRET_PATHS
+    stash = STASH
+
+    def __init__(self, engine, repository=CACHE_REPOSITORY):
+        if not hasattr(engine, "commit"):
+            raise ValueError(f"Image cache is not supported by '{engine.engine}' engine.")
+        self._engine = engine
+        self.repository = repository
+
+    def image(self, base_image, release, env, profiles, config=None):
+        """Cached image name for inputs."""
+        base = self._engine.image_id(base_image) or base_image
+        key = cache_key(base, release, env, profiles, config=config)
+        names = "_".join(base_profile(profile) for profile in profiles)
+        return f"{self.repository}:{names}-{release}-{env}-{key}"
+
+    def exists(self, image):
+        return self._engine.image_id(image) is not None
+
+    def _stash_cmd(self):
+        paths = " ".join(shlex.quote(path) for path in self.secret_paths)
+        stash = shlex.quote(self.stash)
+        return (
+            f'rm -rf {stash}; for p in {paths}; do [ -e "$p" ] || continue; '
+            f'mkdir -p {stash}"$(dirname "$p")" && mv "$p" {stash}"$p" || exit 1; '
+            f'[ -d {stash}"$p" ] && mkdir "$p"; done; true'
+        )
+
+    def _restore_cmd(self):
+        stash = shlex.quote(self.stash)
+        return f"[ -d {stash} ] && cp -a {stash}/. / && rm -rf {stash}; true"
+
+    def commit(self, image):
+        """Commit container to cached image with secrets left out."""
+        logger.info(f"Committing {self._engine.name} to {image}")
+        stash = self._engine.exec(self._stash_cmd())
+        if stash.exit_status != 0:
+            logger.error(f"Fail to stash secrets of {self._engine.name}, not committing")
+            self._engine.exec(self._restore_cmd())
+            return stash
+        try:
+            out = self._engine.commit(image)
+        finally:
+            self._engine.exec(self._restore_cmd())
+        if out.exit_status != 0:
+            logger.error(f"Fail to commit {self._engine.name} >> {out.stderr}")
+        return out
+
+    def list(self, release=None, env=None, profile=None):
+        """Cached images, optionally filtered by release, env or profile.
+
+        Returns:
+            list of dicts with image, id, created, profiles, release, env and key
+        """
+        cached = []
+        for image, image_id, created in self._engine.images(self.repository):
+            tag = image.rsplit(":", 1)[-1]
+            try:
+                profiles, image_release, image_env, key = tag.rsplit("-", 3)
+            except ValueError:
+                continue
+            entry = {
+                "image": image,
+                "id": image_id,
+                "created": created,
+                "profiles": profiles.split("_"),
+                "release": image_release,
+                "env": image_env,
+                "key": key,
+            }
+            if release is not None and str(release) != image_release:
+                continue
+            if env is not None and env != image_env:
+                continue
+            if profile is not None and profile not in entry["profiles"]:
+                continue
+            cached.append(entry)
+        return cached
+
+    def prune(self, release=None, env=None, profile=None):
+        """Remove cached images; all of them unless filtered like `list`.
+
+        Returns:
+            list of removed image names
+        """
+        removed = []
+        for entry in self.list(release=release, env=env, profile=profile):
+            out = self._engine.rmi(entry["image"])
+            if out.exit_status == 0:
+                removed.append(entry["image"])
+            else:
+                logger.warning(f"Fail to remove {entry['image']} >> {out.stderr}")
+        return removed
@@ -1,6 +1,8 @@
 import logging
 
+from rhel_containers import tracing
 from rhel_containers.engine import ContCommandResult
+from rhel_containers.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -13,10 +15,11 @@ authmethod=CERT"""
 
 
 class InsightsClient:
-    def __init__(self, engine, config, env="qa"):
+    def __init__(self, engine, config, env="qa", facts=None):
         self._engine = engine
         self._config = config
         self.env = env
+        self._facts = facts
 
     def install(self, pkg="insights-client"):
         """Install insights-client packges
@@ -25,41 +28,51 @@ class InsightsClient:
             pkg: insights-client package with specific version.
         """
         logger.info(f"Installing {pkg}")
-        return self._engine.exec(f"yum install -y {pkg}")
+        return self._engine.exec(self._install_cmd(pkg))
+
+    def _install_cmd(self, pkg="insights-client"):
+        return f"yum install -y {pkg}"
 
     @property
     def status(self):
         out = self._engine.exec("insights-client --status")
         return out.stdout
 
-    def configure(self):
-        logger.info(f"Configuring insights-client for '{self.env}' env.")
+    def _configure_cmd(self):
+        """Build command writing insights-client config; `None` if env needs no config."""
         if self.env == "prod":
-            logger.info(f"Default setting selected for {self.env}")
-            return ContCommandResult(exit_status=0, stdout="No need of configuration.")
+            return None
         if self.env == "stage":
             conf = "[insights-client]"
             if self._config.proxy:
                 conf = f"{conf}\nproxy={self._config.proxy}"
         else:
             conf = INSIGHTS_CLIENT_CONF.format(base_url=self._config.base_url)
-        out = self._engine.add_file(self._config.conf_path, content=conf, overwrite=True)
+        # directory comes with the package; created anyway for images without it.
+        mkdir = f'mkdir -p "$(dirname {self._config.conf_path})"'
+        write = self._engine._add_file_command(self._config.conf_path, content=conf, overwrite=True)
+        return f"{mkdir} && {write}"
 
+    def _log_configure(self, out):
         if out.exit_status != 0:
             logger.error(f"Fail to configure insights-client for env '{self.env}'\n {out.stderr}")
         else:
             logger.info(f"Successfully configured insights-client for '{self.env}' env.")
-        return out
 
-    def register(self, disable_schedule=None, keep_archive=None, no_upload=None):
-        """Register insights-client.
+    def configure(self):
+        logger.info(f"Configuring insights-client for '{self.env}' env.")
+        cmd = self._configure_cmd()
+        if cmd is None:
+            logger.info(f"Default setting selected for {self.env}")
+            return ContCommandResult(exit_status=0, stdout="No need of configuration.")
+        out = self._engine.exec(cmd)
+        self._log_configure(out)
+        return out
 
-        Args:
-            disable_schedule: disable schedule
-            keep_archive: Keep archive while uploading
-            no_upload: don't upload data
-        """
-        logger.info("Registering insight client")
+    def _register_cmds(
+        self, disable_schedule=None, keep_archive=None, no_upload=None, install_deps=True
+    ):
+        """Build commands installing missing dependencies and registering insights-client."""
         cmd = "insights-client --register"
         if disable_schedule:
             cmd = f"{cmd} --disable-schedule"
@@ -68,21 +81,73 @@ class InsightsClient:
         if no_upload:
             cmd = f"{cmd} --no-upload"
 
+        cmds = []
+        if not install_deps:
+            return [cmd]
         # In rhel container sometime hostname pkg missing and insights-client need this package.
-        if "not installed" in self._engine.exec(f"rpm -q hostname").stdout:
-            self._engine.exec("yum install -y hostname")
-
         # If insights-client not installed then installed it first.
-        if "not installed" in self._engine.exec(f"rpm -q insights-client").stdout:
-            self.install()
+        # Probes are skipped when cached facts already know packages are there.
+        for pkg in ("hostname", "insights-client"):
+            if not (self._facts and self._facts.installed(pkg)):
+                cmds.append(f"rpm -q {pkg} || {self._install_cmd(pkg)}")
+        return cmds + [cmd]
 
-        out = self._engine.exec(cmd)
+    def _log_register(self, out):
         if out.exit_status != 0:
             logger.error(f"Fail to register insights-client for env '{self.env}'\n {out.stderr}")
         else:
             logger.info(f"Successfully registered insights client.\n {out.stdout}")
+
+    @traced("insights_client.register")
+    def register(self, disable_schedule=None, keep_archive=None, no_upload=None):
+        """Register insights-client.
+
+        Args:
+            disable_schedule: disable schedule
+            keep_archive: Keep archive while uploading
+            no_upload: don't upload data
+        """
+        logger.info("Registering insight client")
+        cmds = self._register_cmds(
+            disable_schedule=disable_schedule, keep_archive=keep_archive, no_upload=no_upload
+        )
+        out = self._engine.exec_many(cmds)[-1]
+        self._log_register(out)
         return out
 
+    def _collect_archive_cmd(self, no_upload=None):
+        """Script registering with `--keep-archive` and writing archive to stdout.
+
+        Client output goes to stderr; archive is removed from container once streamed.
+        """
+        cmds = self._register_cmds(keep_archive=True, no_upload=no_upload)
+        deps = " && ".join(cmds[:-1]) or "true"
+        return (
+            f'{{ {deps}; }} >&2 && out=$({cmds[-1]} 2>&1); rc=$?; echo "$out" >&2; '
+            "[ $rc -eq 0 ] || exit $rc; "
+            'f=$(echo "$out" | grep -o "[^ ]*\\.tar\\.gz" | tail -1); '
+            '[ -f "$f" ] || { echo "No archive found" >&2; exit 1; }; '
+            'cat "$f" && rm -f "$f"'
+        )
+
+    def collect_archive(self, dest, decompress=False, index=False, no_upload=None):
+        """Register with kept archive and stream archive straight to host.
+
+        Args:
+            dest: host path or binary file object
+            decompress: write plain tar instead of `.tar.gz`
+            index: list archive members while streaming (`ArchiveResult.members`)
+            no_upload: don't upload data
+        """
+        from rhel_containers.archive import stream_archive
+
+        logger.info(f"Collecting insights archive of {self._engine.name}")
+        script = self._collect_archive_cmd(no_upload=no_upload)
+        with tracing.span("engine.exec", self._engine.name, script) as span:
+            with self._engine.exec_pipe(script) as pipe:
+                out = stream_archive(pipe, dest, decompress=decompress, index=index)
+            return span.finish(out)
+
     def unregister(self):
         out = self._engine.exec("insights-client --unregister")
         if out.exit_status != 0:
@@ -0,0 +1,177 @@
+import logging
+import shlex
+
+logger = logging.getLogger(__name__)
+
+INSTALLED = "installed"
+ALREADY_INSTALLED = "already installed"
+REMOVED = "removed"
+NOT_INSTALLED = "not installed"
+FAILED = "failed"
+
+
+def _split(pkgs):
+    """Flatten package args; strings may hold several space separated packages."""
+    names = []
+    for pkg in pkgs:
+        names.extend(pkg.split() if isinstance(pkg, str) else pkg)
+    return names
+
+
+def _is_local(pkg):
+    """URLs and rpm paths can't be checked by name."""
+    return "/" in pkg or pkg.endswith(".rpm")
+
+
+class TransactionResult:
+    """Outcome of a package transaction.
+
+    Attributes:
+        outcomes: package -> one of "installed", "already installed", "removed",
+            "not installed" or "failed"
+        results: ContCommandResult of every command run by the transaction
+    """
+
+    def __init__(self, outcomes, results):
+        self.outcomes = outcomes
+        self.results = results
+
+    @property
+    def failed(self):
+        return [pkg for pkg, outcome in self.outcomes.items() if outcome == FAILED]
+
+    @property
+    def exit_status(self):
+        return 1 if self.failed else 0
+
+    @property
+    def stderr(self):
+        return "\n".join(out.stderr for out in self.results if out.stderr)
+
+    def __repr__(self):
+        return f"TransactionResult(exit_status={self.exit_status}, outcomes={self.outcomes})"
+
+
+class PackageTransaction:
+    """Queue package installs/removals and run them as one dnf/yum transaction.
+
+    Packages known to be installed (or absent, for removal) from container facts are
+    skipped. After the transaction a single `rpm -q --whatprovides` pass tells the
+    outcome of each package.
+
+    Args:
+        container: RhelContainer
+        skip_broken: let dnf/yum skip unavailable packages instead of failing all
+
+    Example:
+        with rc.transaction() as txn:
+            txn.install("python3", "git")
+            txn.remove("vim-minimal")
+        txn.result.outcomes  # {"python3": "installed", "git": "already installed", ...}
+    """
+
+    def __init__(self, container, skip_broken=False):
+        self._container = container
+        self.skip_broken = skip_broken
+        self.to_install = []
+        self.to_remove = []
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.flush()
+
+    def install(self, *pkgs):
+        """Queue packages to install."""
+        self.to_install.extend(p for p in _split(pkgs) if p not in self.to_install)
+        return self
+
+    def remove(self, *pkgs):
+        """Queue packages to remove."""
+        self.to_remove.extend(p for p in _split(pkgs) if p not in self.to_remove)
+        return self
+
+    def _plan(self):
+        """Split queued packages into packages to act on and skipped ones.
+
+        Only facts in memory are used; with a stale cache nothing is skipped.
+        """
+        facts = self._container.facts
+        install, remove, skipped = [], [], {}
+        for pkg in self.to_install:
+            if not _is_local(pkg) and facts.installed(pkg):
+                skipped[pkg] = ALREADY_INSTALLED
+            else:
+                install.append(pkg)
+        packages = facts.cached("packages")
+        for pkg in self.to_remove:
+            if packages is not None and pkg not in packages:
+                skipped[pkg] = NOT_INSTALLED
+            else:
+                remove.append(pkg)
+        return install, remove, skipped
+
+    def _transaction_cmds(self, install, remove):
+        pkg_mng = self._container.pkg_mng
+        option = " --skip-broken" if self.skip_broken else ""
+        cmds = []
+        if remove:
+            cmds.append(f"{pkg_mng} remove -y {' '.join(remove)}")
+        if install:
+            cmds.append(f"{pkg_mng} install -y{option} {' '.join(install)}")
+        return cmds
+
+    def commands(self, load=False):
+        """Commands of this transaction, to embed in a larger `exec_many` batch.
+
+        Args:
+            load: load stale facts to skip installed packages (costs one exec)
+        """
+        if load and self._container.facts.stale:
+            self._container.facts.load()
+        install, remove, _ = self._plan()
+        return self._transaction_cmds(install, remove)
+
+    def flush(self):
+        """Run queued transaction; returns TransactionResult."""
+        if self._container.facts.stale:
+            self._container.facts.load()
+        install, remove, outcomes, cmds = self._flush_plan()
+        results = self._container.exec_many(cmds) if cmds else []
+        return self._finish(install, remove, outcomes, cmds, results)
+
+    def _flush_plan(self):
+        """Packages to install/remove, outcomes of skipped ones and commands to run."""
+        install, remove, outcomes = self._plan()
+        cmds = self._transaction_cmds(install, remove)
+        checked = [pkg for pkg in install + remove if not _is_local(pkg)]
+        if checked:
+            quoted = " ".join(shlex.quote(pkg) for pkg in checked)
+            cmds.append(
+                f'for p in {quoted}; do rpm -q --whatprovides "$p" >/dev/null && echo "$p"; '
+                "done; true"
+            )
+        return install, remove, outcomes, cmds
+
+    def _finish(self, install, remove, outcomes, cmds, results):
+        """TransactionResult of results of `cmds`."""
+        checked = [pkg for pkg in install + remove if not _is_local(pkg)]
+        complete = len(results) == len(cmds)
+        present = set(results[-1].stdout.split()) if checked and complete else set()
+        transaction_ok = complete and all(out.exit_status == 0 for out in results)
+        for pkg in install:
+            if _is_local(pkg):
+                outcomes[pkg] = INSTALLED if transaction_ok else FAILED
+            else:
+                outcomes[pkg] = INSTALLED if pkg in present else FAILED
+        for pkg in remove:
+            outcomes[pkg] = FAILED if pkg in present or not complete else REMOVED
+
+        self.to_install, self.to_remove = [], []
+        self.result = TransactionResult(outcomes, results)
+        if self.result.failed:
+            logger.error(f"Package transaction failed for {self.result.failed}")
+        return self.result
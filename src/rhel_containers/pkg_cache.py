@@ -0,0 +1,141 @@
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = ".rhel-containers.lock"
+PIP_CACHE = "/root/.cache/pip"
+WHEELHOUSE = "/var/cache/pip-wheelhouse"
+
+# Installed in front of dnf/yum (/usr/local/bin comes first in PATH). Downloads into the
+# shared cache are serialized with an exclusive lock; installs from the cache only hold a
+# shared lock so containers install in parallel. Host side eviction takes the same lock.
+PKG_MNG_WRAPPER = """#!/bin/bash
+real=/usr/bin/$(basename "$0")
+lock={cache_dir}/{lock_file}
+command -v flock >/dev/null || exec "$real" "$@"
+case "$1" in
+  install|reinstall|upgrade|update|downgrade|groupinstall)
+    flock "$lock" "$real" --downloadonly "$@" || exit $?
+    exec flock -s "$lock" "$real" -C "$@";;
+  *)
+    exec flock "$lock" "$real" "$@";;
+esac"""
+
+
+class PackageCache:
+    """Host directories shared by containers as dnf/yum cache and pip cache.
+
+    Packages and repo metadata downloaded by one container are reused by every other
+    container of the same release. Configured under `package_cache` in conf.yaml.
+
+    Args:
+        path: host cache root; one sub-directory per release
+        release: RHEL release
+        max_size: max size of cache per release in MiB; oldest files are evicted
+        wheelhouse: optional host directory with wheels, used as pip `find-links`
+    """
+
+    def __init__(self, path, release, max_size=10240, wheelhouse=None):
+        self.root = Path(path).expanduser().joinpath(str(release))
+        self.release = str(release)
+        self.max_size = max_size
+        self.wheelhouse = Path(wheelhouse).expanduser() if wheelhouse else None
+        self.cont_cache_dir = "/var/cache/yum" if self.release.startswith("7") else "/var/cache/dnf"
+
+    @classmethod
+    def from_config(cls, config, release):
+        """PackageCache from `package_cache` config section; None if disabled."""
+        if not config or not config.get("enabled"):
+            return None
+        return cls(
+            path=config.get("path") or "~/.cache/rhel-containers",
+            release=release,
+            max_size=config.get("max_size") or 10240,
+            wheelhouse=config.get("wheelhouse"),
+        )
+
+    @property
+    def pkg_dir(self):
+        return self.root.joinpath("pkgs")
+
+    @property
+    def pip_dir(self):
+        return self.root.joinpath("pip")
+
+    @property
+    def lock_path(self):
+        return self.pkg_dir.joinpath(LOCK_FILE)
+
+    def volumes(self):
+        """Volumes as (host path, container path, read only) tuples; creates host dirs."""
+        self.pkg_dir.mkdir(parents=True, exist_ok=True)
+        self.pip_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_path.touch(exist_ok=True)
+        volumes = [
+            (str(self.pkg_dir), self.cont_cache_dir, False),
+            (str(self.pip_dir), PIP_CACHE, False),
+        ]
+        if self.wheelhouse:
+            volumes.append((str(self.wheelhouse), WHEELHOUSE, True))
+        return volumes
+
+    def setup_cmds(self):
+        """Commands run in container after start to make dnf/yum/pip use the cache."""
+        wrapper = PKG_MNG_WRAPPER.format(cache_dir=self.cont_cache_dir, lock_file=LOCK_FILE)
+        cmds = [
+            # keep downloaded packages in the cache instead of deleting them after install.
+            "for f in /etc/dnf/dnf.conf /etc/yum.conf; do [ -f $f ] && "
+            "sed -i -e '/^keepcache=/d' -e 's/^\\[main\\]$/[main]\\nkeepcache=1/' $f; done; true",
+            f"cat >/usr/local/bin/dnf <<'EOF'\n{wrapper}\nEOF",
+            "chmod 755 /usr/local/bin/dnf && ln -sf dnf /usr/local/bin/yum",
+        ]
+        if self.wheelhouse:
+            cmds.append(f"printf '[global]\\nfind-links = {WHEELHOUSE}\\n' >/etc/pip.conf")
+        return cmds
+
+    def evict(self):
+        """Remove least recently used files until cache fits `max_size`.
+
+        Skipped if any container holds the cache lock; returns number of removed files.
+        """
+        # POSIX only; imported here so the package still imports on Windows.
+        import fcntl
+
+        if not self.pkg_dir.exists():
+            return 0
+        with self.lock_path.open("a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.debug(f"Package cache {self.root} in use, eviction skipped")
+                return 0
+            try:
+                return self._evict()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _evict(self):
+        files = [
+            (f.stat(), f)
+            for f in self.root.rglob("*")
+            if f.is_file() and not f.is_symlink() and f.name != LOCK_FILE
+        ]
+        total = sum(stat.st_size for stat, _ in files)
+        limit = self.max_size * 1024 * 1024
+        removed = 0
+        # downloaded packages go first, repo metadata only if still over limit.
+        files.sort(key=lambda item: (item[1].suffix not in (".rpm", ".whl"), item[0].st_atime))
+        for stat, path in files:
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= stat.st_size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} files from package cache {self.root}")
+        return removed
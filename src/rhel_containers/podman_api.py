@@ -0,0 +1,821 @@
+# Podman/Docker engine talking to the REST API over the local unix socket.
+import datetime
+import http.client
+import io
+import json
+import logging
+import os
+import shlex
+import shutil
+import socket
+import struct
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+from rhel_containers import tracing
+from rhel_containers.deadline import bounded
+from rhel_containers.deadline import deadline
+from rhel_containers.deadline import TimeoutResult
+from rhel_containers.engine import BaseEngine
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import DEFAULT_TAIL
+from rhel_containers.engine import TERMINAL_EVENTS
+from rhel_containers.engine import Watchdog
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.stream import CHUNK_SIZE
+from rhel_containers.stream import ExecPipe
+from rhel_containers.stream import ExecStream
+from rhel_containers.stream import STDERR
+from rhel_containers.stream import STDOUT
+from rhel_containers.tracing import redact
+from rhel_containers.transfer import add_to_tar
+from rhel_containers.transfer import hash_script
+from rhel_containers.transfer import parse_hashes
+from rhel_containers.transfer import SKIP
+from rhel_containers.transfer import Source
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "v1.41"
+# podman and docker CLI use 125 for failures of engine itself.
+ENGINE_ERROR = 125
+# archives bigger than this are spooled to disk before upload.
+SPOOL_SIZE = 8 * 1024 * 1024
+# idle keep-alive connections kept per engine.
+POOL_SIZE = 4
+# sockets found by `default_socket`.
+_SOCKETS = {}
+
+
+def default_socket(engine="podman"):
+    """Guess API socket path from environment and well-known locations.
+
+    Sockets found are remembered per process and environment; a missing one is looked
+    up again next time since the service may be started meanwhile.
+    """
+    for var in ("CONTAINER_HOST", "DOCKER_HOST"):
+        value = os.environ.get(var, "")
+        if value.startswith("unix://"):
+            return value[len("unix://") :]
+
+    key = (engine, os.environ.get("XDG_RUNTIME_DIR"))
+    if key in _SOCKETS:
+        return _SOCKETS[key]
+    candidates = []
+    if engine.startswith("podman"):
+        if os.environ.get("XDG_RUNTIME_DIR"):
+            candidates.append(Path(os.environ["XDG_RUNTIME_DIR"], "podman", "podman.sock"))
+        candidates.append(Path("/run/podman/podman.sock"))
+    candidates.append(Path("/var/run/docker.sock"))
+    for path in candidates:
+        if path.exists():
+            _SOCKETS[key] = str(path)
+            return str(path)
+    return str(candidates[0])
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over unix socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+    def set_timeout(self, timeout):
+        """Socket timeout of following requests, also on an open connection."""
+        self.timeout = timeout
+        if self.sock is not None:
+            self.sock.settimeout(timeout)
+
+
+def _drop(conn):
+    """Close connection of a stream; reader blocked on it wakes up, unlike with close alone."""
+    if conn is None:
+        return
+    if conn.sock is not None:
+        try:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    conn.close()
+
+
+def demux(data):
+    """Split multiplexed exec/attach stream into stdout and stderr bytes."""
+    stdout, stderr = bytearray(), bytearray()
+    offset = 0
+    while offset + 8 <= len(data):
+        stream, size = struct.unpack(">BxxxL", data[offset : offset + 8])
+        chunk = data[offset + 8 : offset + 8 + size]
+        (stderr if stream == 2 else stdout).extend(chunk)
+        offset += 8 + size
+    return bytes(stdout), bytes(stderr)
+
+
+def _check_member(member):
+    """Raise TarError for archive member which would land outside extraction directory."""
+    names = [member.name]
+    if member.issym() or member.islnk():
+        names.append(member.linkname)
+    for name in names:
+        if os.path.isabs(name) or ".." in Path(name).parts:
+            raise tarfile.TarError(f"Refusing to extract {member.name}: outside of destination")
+
+
+def extract_all(tar, dest):
+    """Extract archive from container into host directory `dest`, member by member.
+
+    Members with absolute paths or `..` components (or links to such paths) are refused
+    with `tarfile.TarError`; the `data` filter is used where tarfile has it.
+    """
+    if hasattr(tarfile, "data_filter"):
+        tar.extractall(dest, filter="data")
+        return
+    for member in tar:
+        _check_member(member)
+        tar.extract(member, dest)
+
+
+class APIExecStream(ExecStream):
+    """ExecStream reading the multiplexed exec-start response as it arrives.
+
+    Args:
+        engine: PodmanAPIEngine
+        command: command argv run in container
+        kwargs: passed to ExecStream
+    """
+
+    def __init__(self, engine, command, **kwargs):
+        super().__init__(command, **kwargs)
+        self._engine = engine
+        self._conn = None
+        self._exec_id = None
+
+    def start(self):
+        path = f"/containers/{self._engine.name}/exec"
+        status, data = self._engine._request(
+            "POST", path, body={"AttachStdout": True, "AttachStderr": True, "Cmd": self.command}
+        )
+        if status != 201:
+            error = self._engine._result("POST", path, status, data)
+            self.collector.feed(STDERR, error.stderr.encode())
+            self.collector.feed(STDERR, None)
+            return self
+        self._exec_id = json.loads(data)["Id"]
+        # dedicated connection; the stream occupies it until exec finished.
+        self._conn = UnixHTTPConnection(
+            self._engine.socket_path, timeout=bounded(self._engine.timeout)
+        )
+        self._watch()
+        self._readers = 2
+        threading.Thread(target=self._read_response, daemon=True).start()
+        return self
+
+    def _read_response(self):
+        try:
+            self._conn.request(
+                "POST",
+                f"/{API_VERSION}/exec/{self._exec_id}/start",
+                body=json.dumps({"Detach": False, "Tty": False}),
+                headers={"Content-Type": "application/json"},
+            )
+            response = self._conn.getresponse()
+            while response.status == 200:
+                header = response.read(8)
+                if len(header) < 8:
+                    break
+                stream, size = struct.unpack(">BxxxL", header)
+                while size > 0:
+                    chunk = response.read(min(size, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    self._queue.put((STDERR if stream == 2 else STDOUT, chunk))
+                    size -= len(chunk)
+        except (OSError, http.client.HTTPException) as exc:
+            logger.warning(f"Exec stream of {self._engine.name} broken: {exc}")
+        finally:
+            self._queue.put((STDOUT, None))
+            self._queue.put((STDERR, None))
+
+    def _exit_status(self):
+        if self._exec_id is None:
+            return ENGINE_ERROR
+        status, data = self._engine._request("GET", f"/exec/{self._exec_id}/json")
+        return json.loads(data).get("ExitCode") if status == 200 else ENGINE_ERROR
+
+    def _kill(self):
+        # API has no way to kill an exec; dropping connection stops the output at least.
+        _drop(self._conn)
+
+
+class APIExecPipe(ExecPipe):
+    """ExecPipe demultiplexing the exec-start response; stdout goes through an os pipe.
+
+    Args:
+        engine: PodmanAPIEngine
+        command: command argv run in container
+        timeout: seconds after which output stops being read; the command keeps running
+            in container
+    """
+
+    def __init__(self, engine, command, timeout=None):
+        super().__init__(command, timeout=timeout)
+        self._engine = engine
+        self._conn = None
+        self._exec_id = None
+
+    def start(self):
+        path = f"/containers/{self._engine.name}/exec"
+        body = {"AttachStdout": True, "AttachStderr": True, "Cmd": self.command}
+        created = self._engine._call("POST", path, body=body, retry=True)
+        if created.exit_status != 0:
+            self.stdout = io.BytesIO()
+            self.result = created
+            return self
+        self._exec_id = json.loads(created.stdout)["Id"]
+        read_fd, write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, "rb")
+        # dedicated connection; the stream occupies it until exec finished.
+        self._conn = UnixHTTPConnection(
+            self._engine.socket_path, timeout=bounded(self._engine.timeout)
+        )
+        self._read_aside(self._read_response, os.fdopen(write_fd, "wb"))
+        self._watchdog = Watchdog(self.timeout, self.kill)
+        return self
+
+    def _read_response(self, sink):
+        try:
+            self._conn.request(
+                "POST",
+                f"/{API_VERSION}/exec/{self._exec_id}/start",
+                body=json.dumps({"Detach": False, "Tty": False}),
+                headers={"Content-Type": "application/json"},
+            )
+            response = self._conn.getresponse()
+            while response.status == 200:
+                header = response.read(8)
+                if len(header) < 8:
+                    break
+                stream, size = struct.unpack(">BxxxL", header)
+                while size > 0:
+                    chunk = response.read(min(size, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    if stream == 2:
+                        self._stderr.append(chunk)
+                    else:
+                        sink.write(chunk)
+                    size -= len(chunk)
+        except (OSError, http.client.HTTPException) as exc:
+            logger.warning(f"Exec pipe of {self._engine.name} broken: {exc}")
+        finally:
+            try:
+                sink.close()
+            except OSError:
+                pass
+
+    def _exit_status(self):
+        self._reader.join()
+        status, data = self._engine._request("GET", f"/exec/{self._exec_id}/json")
+        return json.loads(data).get("ExitCode") if status == 200 else ENGINE_ERROR
+
+    def kill(self):
+        # API has no way to kill an exec; dropping connection stops the output at least.
+        _drop(self._conn)
+
+
+class PodmanAPIEngine(BaseEngine):
+    """Podman/Docker engine wrapper using the Docker compatible REST API.
+
+    Calls go over keep-alive connections to the unix socket (up to `POOL_SIZE` idle
+    ones are kept), so no CLI process gets spawned and a long exec doesn't hold up
+    other calls. `exec` uses exec-create/exec-start endpoints and `cp`/`put_file`/
+    `get_file` the archive endpoints.
+
+    Requests are bounded by `timeout` and current `deadline`; calls running into it
+    return a `TimeoutResult`, but an exec keeps running in container since the API
+    can't kill it. Engine errors are retried per `retry_policy` only for requests
+    safe to repeat (exec creation, stop, removal...), never once a command started.
+    Shell sessions are not supported.
+
+    Args:
+        name: container name
+        engine: "podman-api" or "docker-api"; only used to guess socket path
+        socket_path: API unix socket; guessed from environment if not provided
+        timeout: socket timeout in seconds
+    """
+
+    def __init__(self, name=None, engine="podman-api", socket_path=None, timeout=None, **kwargs):
+        self.engine = engine
+        self.socket_path = socket_path or default_socket(engine)
+        self.timeout = timeout
+        self.name = name or f"rhel-{datetime.datetime.now().strftime('%y%m%d-%H%M%S')}"
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Idle keep-alive connection, or a new one."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return UnixHTTPConnection(self.socket_path)
+
+    def _release(self, conn):
+        """Keep connection for following calls, unless enough are idle already."""
+        with self._lock:
+            if len(self._idle) < POOL_SIZE:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, method, path, body=None, params=None, headers=None):
+        """Send API request; returns status code and body bytes.
+
+        Raises:
+            socket.timeout: no answer within `timeout` or current deadline
+            OSError: API socket unavailable
+        """
+        timeout = bounded(self.timeout)
+        if timeout is not None and timeout <= 0:
+            raise socket.timeout("Deadline exceeded")
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers.setdefault("Content-Type", "application/json")
+
+        conn = self._connection()
+        for attempt in range(2):
+            conn.set_timeout(timeout)
+            if hasattr(body, "seek"):
+                body.seek(0)
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # keep-alive connection dropped by server; closed one reconnects once.
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except BaseException:
+                # e.g. half read response on timeout; connection can't be reused.
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            self._release(conn)
+            return response.status, data
+
+    def _result(self, method, path, status, data, ok=(200, 201, 204, 304)):
+        """ContCommandResult of plain API call."""
+        command = f"{method} {path}"
+        if status in ok:
+            return ContCommandResult(exit_status=0, stdout=data.decode().strip(), command=command)
+        try:
+            message = json.loads(data).get("message", "")
+        except ValueError:
+            message = data.decode(errors="replace").strip()
+        logger.warning(f"Error: {command} >> {status} >> {message}")
+        return ContCommandResult(exit_status=ENGINE_ERROR, stderr=message, command=command)
+
+    @staticmethod
+    def _failed(command, exc):
+        """ContCommandResult of API call which got no answer."""
+        if isinstance(exc, socket.timeout):
+            logger.error(f"Timed out: {redact(command)}")
+            return TimeoutResult(command=command)
+        logger.warning(f"Error: {redact(command)} >> {exc}")
+        return ContCommandResult(
+            exit_status=ENGINE_ERROR, stderr=f"API request failed: {exc}", command=command
+        )
+
+    def _call(self, method, path, body=None, params=None, headers=None, retry=False):
+        """ContCommandResult of API call.
+
+        Args:
+            retry: repeat on engine errors per `retry_policy`; only for calls safe to repeat
+        """
+
+        def _once():
+            try:
+                status, data = self._request(
+                    method, path, body=body, params=params, headers=headers
+                )
+            except OSError as exc:
+                return self._failed(f"{method} {path}", exc)
+            return self._result(method, path, status, data)
+
+        return self._retrying(_once) if retry else _once()
+
+    def _exec_command(self, cmd=None, interactive=False):
+        if interactive:
+            raise NotImplementedError("Shell sessions are not supported by API engines.")
+        return ["bash", "-c", cmd]
+
+    def open_session(self):
+        raise NotImplementedError("Shell sessions are not supported by API engines.")
+
+    def _exec(self, command):
+        """Run command in container with exec-create/exec-start."""
+        with tracing.span("engine.exec", self.name, command) as span:
+            return span.finish(self._exec_api(command))
+
+    def _exec_api(self, command):
+        path = f"/containers/{self.name}/exec"
+        body = {"AttachStdout": True, "AttachStderr": True, "Cmd": command}
+        created = self._call("POST", path, body=body, retry=True)
+        if created.exit_status != 0:
+            return created
+        exec_id = json.loads(created.stdout)["Id"]
+
+        try:
+            status, data = self._request(
+                "POST", f"/exec/{exec_id}/start", body={"Detach": False, "Tty": False}
+            )
+            if status != 200:
+                return self._result("POST", f"/exec/{exec_id}/start", status, data)
+            stdout, stderr = demux(data)
+            status, data = self._request("GET", f"/exec/{exec_id}/json")
+        except OSError as exc:
+            return self._failed(" ".join(command), exc)
+        exit_code = json.loads(data).get("ExitCode") if status == 200 else ENGINE_ERROR
+        out = ContCommandResult(
+            exit_status=exit_code,
+            stdout=stdout.decode().strip(),
+            stderr=stderr.decode().strip(),
+            command=" ".join(command),
+        )
+        if out.exit_status != 0 and out.stderr:
+            logger.warning(f"Error: {redact(out.command)} >> {out.stdout} >> {out.stderr}")
+        return out
+
+    def exec_stream(self, cmd, callback=None, sink=None, tail=DEFAULT_TAIL, timeout=None):
+        """Execute command handing its output over while it runs; see `ExecStream`.
+
+        Args:
+            cmd: command string
+            callback: called with (stream, line) for every line
+            sink: file-like object every line gets written to
+            tail: lines of each stream kept in final result; None keeps everything
+            timeout: seconds after which output stops being read; the command keeps
+                running in container
+        """
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            timeout = bounded(self.timeout)
+        stream = APIExecStream(
+            self,
+            self._exec_command(cmd),
+            callback=callback,
+            sink=sink,
+            tail=tail,
+            timeout=timeout,
+        )
+        return stream.start()
+
+    def exec_pipe(self, cmd, timeout=None):
+        """Start command whose raw stdout is read while it runs; see `ExecPipe`.
+
+        Args:
+            cmd: command string
+            timeout: seconds after which output stops being read; the command keeps
+                running in container
+        """
+        logger.info(f"Executing '{redact(cmd)}'")
+        self._changing(cmd)
+        with deadline(timeout):
+            timeout = bounded(self.timeout)
+        return APIExecPipe(self, self._exec_command(cmd), timeout=timeout).start()
+
+    def _pull(self, image):
+        repo, _, tag = image.rpartition(":")
+        if not repo or "/" in tag:
+            repo, tag = image, "latest"
+        logger.info(f"Pulling {image}")
+        return self._call(
+            "POST", "/images/create", params={"fromImage": repo, "tag": tag}, retry=True
+        )
+
+    def run(self, image, hostname=None, envs=None, volumes=None, resources=None, *args, **kwargs):
+        """run container.
+        Args:
+            image: Image of rhel container
+            hostname: Set container hostname
+            env: List of environment variables to set in container
+            volumes: list of (host path, container path, read only) to mount
+            resources: `ResourceLimits` of container
+        """
+        binds = [
+            f"{host_path}:{cont_path}:{'ro,' if read_only else ''}z"
+            for host_path, cont_path, read_only in volumes or []
+        ]
+        spec = {
+            "Image": image,
+            "Env": envs or [],
+            "HostConfig": {"AutoRemove": True, "Binds": binds},
+        }
+        if resources:
+            spec["HostConfig"].update(resources.host_config())
+        if hostname:
+            spec["Hostname"] = hostname
+        params = {"name": self.name}
+
+        self.started_at = time.time()
+        self.generation += 1
+        try:
+            status, data = self._request("POST", "/containers/create", body=spec, params=params)
+            if status == 404:
+                pulled = self._pull(image)
+                if pulled.exit_status != 0:
+                    return pulled
+                status, data = self._request("POST", "/containers/create", body=spec, params=params)
+        except OSError as exc:
+            return self._failed("POST /containers/create", exc)
+        created = self._result("POST", "/containers/create", status, data)
+        if created.exit_status != 0:
+            return created
+
+        out = self._call("POST", f"/containers/{self.name}/start")
+        if out.exit_status == 0:
+            out.stdout = json.loads(created.stdout).get("Id", "")
+        return out
+
+    def kill(self):
+        """Kill running container."""
+        return self._call("POST", f"/containers/{self.name}/kill", retry=True)
+
+    def rm(self):
+        """Remove container."""
+        return self._call("DELETE", f"/containers/{self.name}", retry=True)
+
+    def stop(self):
+        """Stop container."""
+        return self._call("POST", f"/containers/{self.name}/stop", retry=True)
+
+    def commit(self, image):
+        """Commit container to image.
+
+        Args:
+            image: image name with tag
+        """
+        repo, _, tag = image.rpartition(":")
+        if not repo or "/" in tag:
+            repo, tag = image, "latest"
+        return self._call(
+            "POST", "/commit", params={"container": self.name, "repo": repo, "tag": tag}
+        )
+
+    def _list_images(self, reference):
+        """Local images matching reference; empty if there are none or API failed."""
+        params = {"filters": json.dumps({"reference": [reference]})}
+        out = self._call("GET", "/images/json", params=params)
+        return json.loads(out.stdout) if out.exit_status == 0 and out.stdout else []
+
+    def image_id(self, image):
+        """Return id of local image or None if image not present."""
+        # listing answers 200 for unknown images, so a miss isn't logged as an error.
+        found = self._list_images(image)
+        return found[0]["Id"] if found else None
+
+    def images(self, repository):
+        """List local images of repository as (image, id, created) tuples."""
+        return [
+            (name, image["Id"], str(image.get("Created", "")))
+            for image in self._list_images(repository)
+            for name in image.get("RepoTags") or []
+            if name.startswith(f"{repository}:")
+        ]
+
+    def rmi(self, image):
+        """Remove local image."""
+        return self._call("DELETE", f"/images/{urllib.parse.quote(image, safe='')}", retry=True)
+
+    def _put_tar(self, path, add):
+        """Upload tar built by `add(tarfile)` and extract it at `path` in container.
+
+        Tar is spooled to disk beyond `SPOOL_SIZE`, so large files aren't held in memory.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            with tarfile.open(fileobj=spool, mode="w") as tar:
+                add(tar)
+            headers = {"Content-Type": "application/x-tar", "Content-Length": str(spool.tell())}
+            return self._call(
+                "PUT",
+                f"/containers/{self.name}/archive",
+                body=spool,
+                params={"path": path},
+                headers=headers,
+                retry=True,
+            )
+
+    def put_file(
+        self, cont_path, data=None, host_path=None, mode=None, checksum=True, append=False
+    ):
+        """Write file in container through the archive endpoint.
+
+        See `BaseEngine.put_file`; parent directories are created.
+        """
+        source = Source(data=data, host_path=host_path)
+        quoted = shlex.quote(cont_path)
+        if checksum and not append:
+            current = self._exec(
+                self._exec_command(f"[ -f {quoted} ] && sha256sum <{quoted} | cut -c1-64; true")
+            )
+            if current.stdout and current.stdout == source.sha256():
+                return ContCommandResult(exit_status=0, stdout=SKIP, command=f"PUT {cont_path}")
+        if append:
+            existing = io.BytesIO()
+            if self._exec(self._exec_command(f"[ -f {quoted} ]")).exit_status == 0:
+                out = self.get_file(cont_path, existing)
+                if out.exit_status != 0:
+                    return out
+            fp = source.open()
+            try:
+                source = Source(data=existing.getvalue() + fp.read())
+            finally:
+                if host_path is not None:
+                    fp.close()
+
+        logger.info(f"Putting file {cont_path}")
+        self.generation += 1
+        return self._put_tar("/", lambda tar: add_to_tar(tar, cont_path, source, mode=mode))
+
+    def put_files(self, files, mode=None, checksum=True):
+        """Write many files in container with one archive upload; see `BaseEngine.put_files`."""
+        sources = {
+            path: Source(host_path=content) if isinstance(content, Path) else Source(data=content)
+            for path, content in files.items()
+        }
+        if checksum and sources:
+            hashes = parse_hashes(self._exec(self._exec_command(hash_script(list(sources)))).stdout)
+            sources = {
+                path: source
+                for path, source in sources.items()
+                if hashes.get(path) != source.sha256()
+            }
+        logger.info(f"Putting {len(sources)} of {len(files)} files")
+        if not sources:
+            return ContCommandResult(exit_status=0, stdout="", command="put_files")
+
+        def _add(tar):
+            for path, source in sources.items():
+                add_to_tar(tar, path, source, mode=mode)
+
+        self.generation += 1
+        out = self._put_tar("/", _add)
+        if out.exit_status == 0:
+            out.stdout = "\n".join(sources)
+        return out
+
+    def _get_archive(self, cont_path, extract):
+        """Stream tar of `cont_path` from container into `extract(tarfile)`."""
+        path = f"/containers/{self.name}/archive"
+        params = urllib.parse.urlencode({"path": cont_path})
+        # dedicated connection; tar is read while it arrives instead of buffered.
+        conn = UnixHTTPConnection(self.socket_path, timeout=bounded(self.timeout))
+        try:
+            conn.request("GET", f"/{API_VERSION}{path}?{params}")
+            response = conn.getresponse()
+            if response.status != 200:
+                return self._result("GET", path, response.status, response.read())
+            with tarfile.open(fileobj=response, mode="r|") as tar:
+                return extract(tar) or ContCommandResult(exit_status=0, command=f"GET {path}")
+        except socket.timeout as exc:
+            return self._failed(f"GET {path}", exc)
+        finally:
+            conn.close()
+
+    def get_file(self, cont_path, dest):
+        """Copy file from container; see `BaseEngine.get_file`."""
+        logger.info(f"Getting file {cont_path}")
+
+        def _extract(tar):
+            member = tar.next()
+            src = tar.extractfile(member) if member is not None else None
+            if src is None:
+                return ContCommandResult(
+                    exit_status=ENGINE_ERROR,
+                    stderr=f"{cont_path} is not a regular file",
+                    command=f"GET {cont_path}",
+                )
+            if isinstance(dest, (str, Path)):
+                with open(dest, "wb") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            else:
+                shutil.copyfileobj(src, dest, CHUNK_SIZE)
+
+        return self._get_archive(cont_path, _extract)
+
+    def cp(self, source, dest):
+        """Copy file from sorce to destination.
+
+        Container side is prefixed with `<container name>:` like `podman cp`.
+
+        Args:
+            source: sorce path
+            dest: destination path
+        """
+        prefix = f"{self.name}:"
+        if dest.startswith(prefix):
+            cont_path = Path(dest[len(prefix) :])
+            self.generation += 1
+            return self._put_tar(
+                str(cont_path.parent), lambda tar: tar.add(source, arcname=cont_path.name)
+            )
+
+        cont_path = source[len(prefix) :]
+        if Path(dest).is_dir():
+
+            def _extract(tar):
+                try:
+                    extract_all(tar, dest)
+                except tarfile.TarError as exc:
+                    logger.error(f"Fail to copy {cont_path} from {self.name}: {exc}")
+                    return ContCommandResult(
+                        exit_status=ENGINE_ERROR, stderr=str(exc), command=f"GET {cont_path}"
+                    )
+
+            return self._get_archive(cont_path, _extract)
+        return self.get_file(cont_path, dest)
+
+    def _parse_status(self, out):
+        if out.exit_status != 0:
+            return f"{self.name} unavailable."
+        return json.loads(out.stdout)["State"]["Status"].title()
+
+    @property
+    def status(self):
+        """Return status of container."""
+        return self._parse_status(self._call("GET", f"/containers/{self.name}/json"))
+
+    def wait_running(self, timeout=60):
+        """Wait for container up and running reading the `/events` stream.
+
+        Args:
+            timeout: seconds to wait
+
+        Returns:
+            True if running, False on timeout.
+
+        Raises:
+            RhelContainerException: container reached a terminal state.
+        """
+        timeout = bounded(timeout)
+        if self.started_at is None:
+            return self._poll_running(timeout)
+
+        params = {
+            "since": str(int(self.started_at) - 1),
+            "filters": json.dumps({"container": [self.name]}),
+        }
+        end = time.monotonic() + timeout
+        # dedicated connection; event stream occupies it until closed.
+        conn = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        try:
+            conn.request("GET", f"/{API_VERSION}/events?{urllib.parse.urlencode(params)}")
+            response = conn.getresponse()
+            while response.status == 200:
+                conn.sock.settimeout(max(end - time.monotonic(), 0.01))
+                line = response.readline()
+                if not line:
+                    break
+                event = json.loads(line)
+                action = event.get("status") or event.get("Action", "")
+                if action == "start":
+                    return True
+                if action in TERMINAL_EVENTS:
+                    raise RhelContainerException(
+                        msg=f"{self.name} failed to start: {TERMINAL_EVENTS[action]}",
+                        stdout="",
+                        stderr="",
+                        command="GET /events",
+                    )
+        except socket.timeout:
+            return False
+        except (OSError, http.client.HTTPException) as exc:
+            logger.warning(f"No event stream for {self.name}, polling its status: {exc}")
+        finally:
+            conn.close()
+        return self._poll_running(max(end - time.monotonic(), 0))
+
+    def close(self):
+        """Close idle API connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,295 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from rhel_containers import RhelContainer
+from rhel_containers.exception import RhelContainerException
+
+logger = logging.getLogger(__name__)
+
+# Commands bringing a returned container back to the state right after `start()`.
+# Installed packages and configuration stay, only registrations are dropped.
+RESET_CMDS = {
+    None: [],
+    "subscribe": ["subscription-manager clean"],
+    "insights-client": ["insights-client --unregister", "subscription-manager clean"],
+}
+
+# Put in ready queue when pool gives up provisioning, waking every waiting `acquire`.
+_FAILED = object()
+
+
+class ContainerPool:
+    """Keep `size` containers started and set up with `profile`, ready to be leased.
+
+    Provisioning happens on background workers; leased containers are replaced right
+    away. Returned containers are reset with `RESET_CMDS` and set up again (or stopped
+    if `recycle`), which skips container start and package installation. Containers
+    coming back to an already full pool are stopped.
+
+    Failed provisioning is retried with exponential backoff; after `max_failures`
+    failures in a row the pool gives up, `error` is set and `acquire` raises.
+
+    Args:
+        size: number of ready containers to keep
+        profile: setup profile passed to `RhelContainer.setup` (`None`, "subscribe",
+            "insights-client")
+        recycle: stop returned containers instead of resetting them
+        workers: max containers provisioned/reset at the same time
+        max_failures: provisioning failures in a row before giving up
+        retry_delay: seconds before first provisioning retry, doubled on every failure
+        kwargs: passed to RhelContainer (engine_name, release, env, config...)
+
+    Example:
+        pool = ContainerPool(size=5, profile="insights-client", release=8.3, env="ci")
+        with pool.lease() as rc:
+            rc.exec("insights-client --status")
+        pool.close()
+    """
+
+    def __init__(
+        self,
+        size=2,
+        profile=None,
+        recycle=False,
+        workers=2,
+        max_failures=3,
+        retry_delay=5,
+        **kwargs,
+    ):
+        self.size = size
+        self.profile = profile
+        self.recycle = recycle
+        self.max_failures = max_failures
+        self.retry_delay = retry_delay
+        self.container_kwargs = kwargs
+        self.leased = set()
+        self.failures = 0
+        self.error = None
+        self._ready = queue.Queue()
+        self._pending = 0
+        self._closed = False
+        self._closing = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self.refill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"ContainerPool(profile={self.profile!r}, ready={self.ready}, "
+            f"pending={self._pending}, leased={len(self.leased)})"
+        )
+
+    @property
+    def ready(self):
+        """Number of containers ready to be leased."""
+        return 0 if self.error is not None else self._ready.qsize()
+
+    def _setup(self, cont):
+        """Run setup profile; return True on success."""
+        if self.profile is None:
+            return True
+        out = cont.setup(self.profile)
+        return out is not None and out.exit_status == 0
+
+    def _discard(self, cont):
+        try:
+            cont.stop()
+        except Exception as exc:
+            logger.warning(f"Fail to stop {cont.name}: {exc}")
+
+    def _offer(self, cont):
+        """Put container back in ready queue unless pool is full, closed or failed."""
+        with self._lock:
+            keep = not self._closed and self.error is None and self._ready.qsize() < self.size
+            if keep:
+                self._ready.put(cont)
+        if not keep:
+            self._discard(cont)
+
+    def _provision(self):
+        cont = None
+        error = None
+        try:
+            cont = RhelContainer(**self.container_kwargs)
+            # boots from image cache when enabled with `image_cache=True`.
+            out = cont.start(profile=self.profile)
+            if out.exit_status != 0 or cont.status != "Running" or not self._setup(cont):
+                raise RhelContainerException(f"Fail to provision {cont.name} for pool")
+            logger.info(f"{cont.name} ready in pool")
+            self._offer(cont)
+        except Exception as exc:
+            logger.error(f"Pool provisioning failed: {exc}")
+            error = exc
+            if cont is not None:
+                self._discard(cont)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.failures = self.failures + 1 if error else 0
+                failures = self.failures
+        if error is None:
+            return
+        if failures >= self.max_failures:
+            self._give_up(error)
+        elif not self._closing.wait(self.retry_delay * 2 ** (failures - 1)):
+            self.refill()
+
+    def _give_up(self, error):
+        """Stop provisioning and fail waiting and future `acquire` calls."""
+        with self._lock:
+            if self._closed or self.error is not None:
+                return
+            self.error = error
+        logger.error(f"Pool gave up after {self.failures} provisioning failures in a row")
+        self._ready.put(_FAILED)
+
+    def _reset(self, cont):
+        try:
+            results = cont.exec_many(RESET_CMDS.get(self.profile, []))
+            if all(out.exit_status == 0 for out in results) and self._setup(cont):
+                logger.info(f"{cont.name} reset and back in pool")
+                self._offer(cont)
+            else:
+                logger.warning(f"Fail to reset {cont.name}, recycling it")
+                self._discard(cont)
+        except Exception as exc:
+            logger.error(f"Fail to reset {cont.name}, recycling it: {exc}")
+            self._discard(cont)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def refill(self):
+        """Schedule provisioning of missing containers in background."""
+        with self._lock:
+            if self._closed or self.error is not None:
+                return
+            missing = max(self.size - self._ready.qsize() - self._pending, 0)
+            self._pending += missing
+        for _ in range(missing):
+            self._executor.submit(self._provision)
+
+    def acquire(self, timeout=None):
+        """Take a ready container out of pool.
+
+        Args:
+            timeout: seconds to wait for a ready container; wait forever if None
+
+        Raises:
+            RhelContainerException: no container ready within timeout, or pool gave up
+                provisioning
+        """
+        self.refill()
+        try:
+            cont = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            raise RhelContainerException(f"No container ready in pool within {timeout}s")
+        if cont is _FAILED:
+            self._ready.put(cont)
+            raise RhelContainerException(f"Pool gave up provisioning: {self.error}")
+        self.leased.add(cont.name)
+        self.refill()
+        return cont
+
+    def release(self, cont, recycle=None):
+        """Give container back to pool.
+
+        Args:
+            cont: leased container
+            recycle: stop container instead of resetting it; defaults to pool setting
+        """
+        self.leased.discard(cont.name)
+        recycle = self.recycle if recycle is None else recycle
+        with self._lock:
+            closed = self._closed
+            if not (closed or recycle):
+                self._pending += 1
+        if closed:
+            self._discard(cont)
+        elif recycle:
+            self._executor.submit(self._discard, cont)
+        else:
+            self._executor.submit(self._reset, cont)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Lease a container; it is recycled if the block raises, reset otherwise."""
+        cont = self.acquire(timeout=timeout)
+        try:
+            yield cont
+        except Exception:
+            self.release(cont, recycle=True)
+            raise
+        else:
+            self.release(cont)
+
+    def close(self):
+        """Stop background workers and all ready containers."""
+        with self._lock:
+            self._closed = True
+        self._closing.set()
+        self._executor.shutdown(wait=True)
+        while not self._ready.empty():
+            cont = self._ready.get()
+            if cont is not _FAILED:
+                self._discard(cont)
+
+
+class PoolManager:
+    """Container pools per (release, env, setup profile).
+
+    Args:
+        size: number of ready containers to keep in each pool
+        kwargs: passed to every ContainerPool (engine_name, recycle, workers, config...)
+
+    Example:
+        pools = PoolManager(size=3, engine_name="podman")
+        with pools.lease(release=8.3, env="ci", profile="insights-client") as rc:
+            rc.exec("insights-client --status")
+        pools.close()
+    """
+
+    def __init__(self, size=2, **kwargs):
+        self.size = size
+        self.pool_kwargs = kwargs
+        self.pools = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pool(self, release=8.3, env="qa", profile=None):
+        """Get (or create) pool for release, env and setup profile.
+
+        A pool which gave up provisioning is closed and replaced.
+        """
+        key = (str(release), env, profile)
+        with self._lock:
+            if key in self.pools and self.pools[key].error is not None:
+                self.pools.pop(key).close()
+            if key not in self.pools:
+                self.pools[key] = ContainerPool(
+                    size=self.size, profile=profile, release=release, env=env, **self.pool_kwargs
+                )
+            return self.pools[key]
+
+    def lease(self, release=8.3, env="qa", profile=None, timeout=None):
+        """Lease container from matching pool; see `ContainerPool.lease`."""
+        return self.pool(release=release, env=env, profile=profile).lease(timeout=timeout)
+
+    def close(self):
+        """Close all pools."""
+        for pool in self.pools.values():
+            pool.close()
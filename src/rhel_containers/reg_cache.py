@@ -0,0 +1,257 @@
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shlex
+import shutil
+import time
+from pathlib import Path
+
+from rhel_containers.engine import ContCommandResult
+
+logger = logging.getLogger(__name__)
+
+# consumer identity, entitlement certificates and rhsm config of a registered system.
+RHSM_PATHS = ("/etc/pki/consumer", "/etc/pki/entitlement", "/etc/rhsm/rhsm.conf")
+META_FILE = "meta.json"
+# random per-host key identity keys are derived with; never leaves the cache root.
+SECRET_FILE = ".secret"
+RESTORED = "Registration restored from cache"
+
+
+def identity_key(env, config, secret):
+    """HMAC of env and subscription settings one registration stands for.
+
+    Keyed with the cache's host secret, so the password can't be brute-forced from the
+    entry name; it is never written to the cache.
+    """
+    inputs = {
+        "env": env,
+        "serverurl": config.get("serverurl"),
+        "baseurl": config.get("baseurl"),
+        "username": config.get("username"),
+        "password": config.get("password"),
+        "auto_attach": config.get("auto_attach"),
+    }
+    data = json.dumps(inputs, sort_keys=True, default=str).encode()
+    return hmac.new(secret, data, hashlib.sha256).hexdigest()[:32]
+
+
+def parse_not_after(text):
+    """Earliest epoch of `notAfter=...` lines printed by `openssl x509 -enddate`, or None."""
+    dates = []
+    for line in text.splitlines():
+        _, sep, value = line.partition("notAfter=")
+        if not sep:
+            continue
+        try:
+            date = datetime.datetime.strptime(value.strip(), "%b %d %H:%M:%S %Y %Z")
+        except ValueError:
+            continue
+        dates.append(date.replace(tzinfo=datetime.timezone.utc).timestamp())
+    return min(dates) if dates else None
+
+
+class RegistrationCache:
+    """Host copies of rhsm certificates, reused instead of registering every container.
+
+    The first container of an identity (env + subscription settings, see `identity_key`)
+    registers; its consumer and entitlement certificates and rhsm.conf are exported to
+    `<path>/<key>`. Following containers get them with one `put_files` tar stream and
+    come up already entitled. Injecting a valid registration takes no lock; only the
+    check for one and the registration falling back on a miss hold a per-identity lock,
+    so concurrent containers of a new identity wait for the first one to register.
+    Configured under `registration_cache` in conf.yaml.
+
+    Args:
+        path: host cache root
+        max_age: seconds an exported registration is reused
+        min_validity: seconds certificates must still be valid for to be injected
+        paths: container files/directories exported
+    """
+
+    def __init__(self, path, max_age=86400, min_validity=3600, paths=RHSM_PATHS):
+        self.root = Path(path).expanduser()
+        self.max_age = max_age
+        self.min_validity = min_validity
+        self.paths = tuple(paths)
+
+    @classmethod
+    def from_config(cls, config):
+        """RegistrationCache from `registration_cache` config section; None if disabled."""
+        if not config or not config.get("enabled"):
+            return None
+        return cls(
+            path=config.get("path") or "~/.cache/rhel-containers/registrations",
+            max_age=config.get("max_age") or 86400,
+            min_validity=config.get("min_validity") or 3600,
+            paths=config.get("paths") or RHSM_PATHS,
+        )
+
+    def secret(self):
+        """Host secret of identity keys; created (readable by owner only) on first use."""
+        self.root.mkdir(mode=0o700, parents=True, exist_ok=True)
+        path = self.root.joinpath(SECRET_FILE)
+        if not path.exists():
+            # written aside and linked in place, so concurrent readers never see it partial.
+            tmp = self.root.joinpath(f"{SECRET_FILE}.{os.getpid()}.tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(os.urandom(32))
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+            finally:
+                tmp.unlink()
+        return path.read_bytes()
+
+    def key(self, env, config):
+        """Identity key of env and subscription settings, see `identity_key`."""
+        return identity_key(env, config, self.secret())
+
+    def _entry_dir(self, key):
+        return self.root.joinpath(key)
+
+    def meta(self, key):
+        """Metadata of exported registration or None."""
+        try:
+            return json.loads(self._entry_dir(key).joinpath(META_FILE).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self, key, now=None):
+        """Whether registration of key is exported, young enough and not about to expire."""
+        meta = self.meta(key)
+        if meta is None:
+            return False
+        now = now or time.time()
+        if now - meta["created"] > self.max_age:
+            logger.info(f"Cached registration {key} is older than {self.max_age}s")
+            return False
+        not_after = meta.get("not_after")
+        if not_after is not None and not_after - now < self.min_validity:
+            logger.info(f"Certificates of cached registration {key} expire soon")
+            return False
+        return True
+
+    def invalidate(self, key):
+        """Drop exported registration, e.g. after it got rejected."""
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _lock(self, key):
+        # POSIX only; imported here so the package still imports on Windows.
+        import fcntl
+
+        self.root.mkdir(mode=0o700, parents=True, exist_ok=True)
+        lock = self.root.joinpath(f"{key}.lock").open("a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    @staticmethod
+    def _unlock(lock):
+        import fcntl
+
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+    def _list_cmd(self):
+        paths = " ".join(shlex.quote(path) for path in self.paths)
+        return f"find {paths} -type f 2>/dev/null"
+
+    @staticmethod
+    def _enddate_cmd(files):
+        certs = [f for f in files if f.endswith(".pem") and not f.endswith("key.pem")]
+        if not certs:
+            return "true"
+        return "; ".join(
+            f"openssl x509 -noout -enddate -in {shlex.quote(cert)} 2>/dev/null" for cert in certs
+        )
+
+    def export(self, engine, key):
+        """Copy registration files of container to cache; returns True on success."""
+        files = [line for line in engine.exec(self._list_cmd()).stdout.splitlines() if line]
+        if not files:
+            logger.warning(f"No registration files found in {engine.name}")
+            return False
+        tmp = self.root.joinpath(f".{key}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        stored = {}
+        for index, cont_path in enumerate(files):
+            host_path = tmp.joinpath(f"{index}-{Path(cont_path).name}")
+            host_path.parent.mkdir(parents=True, exist_ok=True)
+            if engine.get_file(cont_path, host_path).exit_status != 0:
+                shutil.rmtree(tmp, ignore_errors=True)
+                return False
+            host_path.chmod(0o600 if cont_path.endswith("key.pem") else 0o644)
+            stored[cont_path] = host_path.name
+        meta = {
+            "created": time.time(),
+            "not_after": parse_not_after(engine.exec(self._enddate_cmd(files)).stdout),
+            "source": engine.name,
+            "files": stored,
+        }
+        tmp.joinpath(META_FILE).write_text(json.dumps(meta, indent=2))
+        # swapped in with renames; injections reading the old entry fail over to the lock.
+        old = self.root.joinpath(f".{key}.old")
+        shutil.rmtree(old, ignore_errors=True)
+        if self._entry_dir(key).exists():
+            self._entry_dir(key).rename(old)
+        tmp.rename(self._entry_dir(key))
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Exported registration of {engine.name} as {key}")
+        return True
+
+    def inject(self, engine, key):
+        """Write cached registration files into container with one tar stream."""
+        meta = self.meta(key)
+        entry = self._entry_dir(key)
+        files = {cont_path: entry.joinpath(name) for cont_path, name in meta["files"].items()}
+        out = engine.put_files(files, checksum=False)
+        if out.exit_status == 0:
+            logger.info(f"Injected cached registration {key} into {engine.name}")
+            return ContCommandResult(exit_status=0, stdout=RESTORED, command=out.command)
+        return out
+
+    def register(self, key, engine, register):
+        """Inject valid cached registration, or run `register()` and export its result.
+
+        Args:
+            key: identity key
+            engine: engine of container to register
+            register: callable registering container over the network
+
+        Returns:
+            ContCommandResult; stdout is `RESTORED` if certificates were injected.
+        """
+        out = self._inject_valid(engine, key)
+        if out is not None and out.exit_status == 0:
+            return out
+        lock = self._lock(key)
+        try:
+            # another container may have exported it while this one waited for the lock;
+            # after a failed injection, register anyway.
+            if out is not None or not self.is_valid(key):
+                out = register()
+                if out.exit_status == 0:
+                    self.export(engine, key)
+                return out
+        finally:
+            self._unlock(lock)
+        out = self._inject_valid(engine, key)
+        return out if out is not None and out.exit_status == 0 else register()
+
+    def _inject_valid(self, engine, key):
+        """Result of injecting cached registration; None if there is no valid one."""
+        if not self.is_valid(key):
+            return None
+        try:
+            out = self.inject(engine, key)
+        except (OSError, KeyError, TypeError) as exc:
+            # entry replaced by a concurrent export while it was read.
+            out = ContCommandResult(exit_status=1, stderr=str(exc), command="inject")
+        if out.exit_status != 0:
+            logger.warning(f"Fail to inject cached registration: {out.stderr}")
+        return out
@@ -0,0 +1,406 @@
+# Record engine commands of a real session and replay them without any container.
+#
+# Recordings are JSON lines: a header with the engine used, then one entry per engine call.
+# Commands are normalized (container name, random ids, secrets) so a recording replays for
+# any container name and replay only has to compare strings. Streamed output is recorded
+# whole and handed over again from memory on replay.
+import base64
+import gzip
+import io
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import DEFAULT_TAIL
+from rhel_containers.engine import OpenshiftEngine
+from rhel_containers.engine import PodmanEngine
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.stream import ExecPipe
+from rhel_containers.stream import ExecStream
+from rhel_containers.stream import STDERR
+from rhel_containers.stream import STDOUT
+from rhel_containers.tracing import redact
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+NAME = "<<name>>"
+# uuid4 hex of batch markers and heredoc delimiters; differs on every run.
+ID_RE = re.compile(r"[0-9a-f]{32}")
+PLACEHOLDER_RE = re.compile(r"<<id(\d+)>>")
+WAIT_RUNNING = "wait_running"
+
+
+class ReplayDivergence(RhelContainerException):
+    """Command asked for in replay is not the next one of the recording."""
+
+
+def _open(path, mode):
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, f"{mode}t")
+    return path.open(mode)
+
+
+class Normalizer:
+    """Replace container name and random ids of one command (and its output) by placeholders."""
+
+    def __init__(self, name):
+        self.name = name
+        self.ids = []
+
+    def _placeholder(self, match):
+        if match.group(0) not in self.ids:
+            self.ids.append(match.group(0))
+        return f"<<id{self.ids.index(match.group(0))}>>"
+
+    def normalize(self, text):
+        if not text:
+            return text
+        text = ID_RE.sub(self._placeholder, text)
+        if self.name:
+            text = text.replace(self.name, NAME)
+        return redact(text)
+
+    def restore(self, text):
+        if not text:
+            return text
+        text = PLACEHOLDER_RE.sub(lambda match: self.ids[int(match.group(1))], text)
+        return text.replace(NAME, self.name)
+
+
+def _command_text(command):
+    return command if isinstance(command, str) else " ".join(command)
+
+
+class ReplayedExecStream(ExecStream):
+    """ExecStream handing over recorded output lines instead of running a command.
+
+    Args:
+        command: engine command
+        lines: recorded (stream, line) tuples, in recorded order
+        replayed: recorded ContCommandResult; its exit status is the stream's
+        kwargs: passed to ExecStream (callback, sink, tail)
+    """
+
+    def __init__(self, command, lines, replayed, **kwargs):
+        super().__init__(command, **kwargs)
+        self._lines = lines
+        self._replayed = replayed
+
+    def start(self):
+        self._readers = 2
+        threading.Thread(target=self._hand_over, daemon=True).start()
+        return self
+
+    def _hand_over(self):
+        for name, line in self._lines:
+            self._queue.put((name, line.encode()))
+        for name in (STDOUT, STDERR):
+            self._queue.put((name, None))
+
+    def _exit_status(self):
+        return self._replayed.exit_status
+
+    def __iter__(self):
+        yield from super().__iter__()
+        self.result.timed_out = self._replayed.timed_out
+
+
+class ReplayedExecPipe(ExecPipe):
+    """ExecPipe reading recorded stdout from memory; `wait` returns recorded result."""
+
+    def __init__(self, command, data, replayed):
+        super().__init__(command)
+        self.stdout = io.BytesIO(data)
+        self._replayed = replayed
+
+    def start(self):
+        return self
+
+    def kill(self):
+        pass
+
+    def wait(self):
+        if self.result is None:
+            self.stdout.close()
+            self.result = self._replayed
+        return self.result
+
+
+class RecordingMixin:
+    """Engine writing every engine call and its result to a recording file.
+
+    Args:
+        record: recording file path; `.gz` suffix compresses it
+    """
+
+    # setup steps run one by one so calls come in the same order on replay.
+    sequential = True
+
+    def __init__(self, name=None, engine="auto", record=None, *args, **kwargs):
+        super().__init__(name=name, engine=engine, *args, **kwargs)
+        self.record_path = Path(record)
+        self._record_lock = threading.Lock()
+        kind = "openshift" if isinstance(self, OpenshiftEngine) else "podman"
+        header = {"version": FORMAT_VERSION, "engine": self.engine, "kind": kind}
+        with _open(self.record_path, "w") as fp:
+            fp.write(json.dumps(header) + "\n")
+
+    def _record(self, key, normalizer, out=None, **extra):
+        entry = {"cmd": key}
+        if out is not None:
+            entry.update(
+                exit=out.exit_status,
+                out=normalizer.normalize(out.stdout),
+                err=normalizer.normalize(out.stderr),
+            )
+            if out.timed_out:
+                entry.update(timed_out=True)
+        entry.update(extra)
+        with self._record_lock:
+            with _open(self.record_path, "a") as fp:
+                fp.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def _exec(self, command):
+        out = super()._exec(command)
+        normalizer = Normalizer(self.name)
+        self._record(normalizer.normalize(_command_text(command)), normalizer, out)
+        return out
+
+    def wait_running(self, timeout=60):
+        normalizer = Normalizer(self.name)
+        try:
+            running = super().wait_running(timeout=timeout)
+        except RhelContainerException as exc:
+            self._record(WAIT_RUNNING, normalizer, error=normalizer.normalize(exc.msg))
+            raise
+        self._record(WAIT_RUNNING, normalizer, running=running)
+        return running
+
+    def put_file(self, cont_path, *args, **kwargs):
+        out = super().put_file(cont_path, *args, **kwargs)
+        normalizer = Normalizer(self.name)
+        self._record(f"put_file {cont_path}", normalizer, out)
+        return out
+
+    def put_files(self, files, *args, **kwargs):
+        out = super().put_files(files, *args, **kwargs)
+        normalizer = Normalizer(self.name)
+        self._record(f"put_files {' '.join(sorted(files))}", normalizer, out)
+        return out
+
+    def get_file(self, cont_path, dest):
+        if isinstance(dest, (str, Path)):
+            out = super().get_file(cont_path, dest)
+            data = Path(dest).read_bytes() if out.exit_status == 0 else b""
+        else:
+            buffer = io.BytesIO()
+            out = super().get_file(cont_path, buffer)
+            data = buffer.getvalue() if out.exit_status == 0 else b""
+            dest.write(data)
+        normalizer = Normalizer(self.name)
+        self._record(f"get_file {cont_path}", normalizer, out, data=base64.b64encode(data).decode())
+        return out
+
+    def open_session(self):
+        raise RhelContainerException(msg="Shell sessions are not supported while recording.")
+
+    def exec_stream(self, cmd, callback=None, sink=None, tail=DEFAULT_TAIL, timeout=None):
+        """Run stream to its end while recording it; returned stream replays its lines.
+
+        `callback` and `sink` get lines while the command runs.
+        """
+        lines = []
+
+        def record_line(name, line):
+            lines.append((name, line))
+            if callback is not None:
+                callback(name, line)
+
+        stream = super().exec_stream(cmd, callback=record_line, sink=sink, tail=0, timeout=timeout)
+        out = stream.wait()
+        normalizer = Normalizer(self.name)
+        recorded = [[name, normalizer.normalize(line)] for name, line in lines]
+        self._record(f"exec_stream {normalizer.normalize(cmd)}", normalizer, out, lines=recorded)
+        return ReplayedExecStream(stream.command, lines, out, tail=tail).start()
+
+    def exec_pipe(self, cmd, timeout=None):
+        """Read whole stdout while recording it; returned pipe reads it from memory."""
+        with super().exec_pipe(cmd, timeout=timeout) as pipe:
+            data = pipe.stdout.read()
+            out = pipe.wait()
+        normalizer = Normalizer(self.name)
+        key = f"exec_pipe {normalizer.normalize(cmd)}"
+        self._record(key, normalizer, out, data=base64.b64encode(data).decode())
+        return ReplayedExecPipe(pipe.command, data, out)
+
+
+class RecordingPodmanEngine(RecordingMixin, PodmanEngine):
+    """PodmanEngine recording engine calls."""
+
+
+class RecordingOpenshiftEngine(RecordingMixin, OpenshiftEngine):
+    """OpenshiftEngine recording engine calls."""
+
+
+RECORDING_CLASSES = {
+    PodmanEngine: RecordingPodmanEngine,
+    OpenshiftEngine: RecordingOpenshiftEngine,
+}
+
+
+def recording_class(engine_class):
+    """Recording flavour of engine class."""
+    try:
+        return RECORDING_CLASSES[engine_class]
+    except KeyError:
+        raise RhelContainerException(msg=f"Recording is not supported by {engine_class.__name__}.")
+
+
+class ReplayMixin:
+    """Engine serving results of a recording instead of running anything.
+
+    Calls must come in recorded order; any other command raises `ReplayDivergence`.
+
+    Args:
+        name: container name
+        recording: recording file path
+        engine: engine binary recording was made with
+        entries: already loaded recording entries
+    """
+
+    sequential = True
+
+    def __init__(self, name=None, recording=None, engine=None, entries=None, *args, **kwargs):
+        self.name = name or "rhel-replay"
+        self.engine = engine
+        self.recording = recording
+        self._entries = entries if entries is not None else load_recording(recording)[1]
+        self._position = 0
+        self._replay_lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        """Recorded calls not replayed yet."""
+        return len(self._entries) - self._position
+
+    def _next(self, key, normalizer):
+        with self._replay_lock:
+            if self._position >= len(self._entries):
+                raise ReplayDivergence(
+                    msg=f"Recording {self.recording} exhausted", command=normalizer.restore(key)
+                )
+            entry = self._entries[self._position]
+            if entry["cmd"] != key:
+                raise ReplayDivergence(
+                    msg=(
+                        f"Call {self._position} diverges from recording {self.recording};"
+                        f" recorded '{entry['cmd']}'"
+                    ),
+                    command=normalizer.restore(key),
+                )
+            self._position += 1
+            return entry
+
+    def _replay(self, key, normalizer, entry=None):
+        entry = entry or self._next(key, normalizer)
+        out = ContCommandResult(
+            exit_status=entry["exit"],
+            stdout=normalizer.restore(entry["out"]),
+            stderr=normalizer.restore(entry["err"]),
+            command=normalizer.restore(key),
+        )
+        out.timed_out = entry.get("timed_out", False)
+        return out
+
+    def _exec(self, command):
+        normalizer = Normalizer(self.name)
+        return self._replay(normalizer.normalize(_command_text(command)), normalizer)
+
+    def wait_running(self, timeout=60):
+        normalizer = Normalizer(self.name)
+        entry = self._next(WAIT_RUNNING, normalizer)
+        if "error" in entry:
+            raise RhelContainerException(msg=normalizer.restore(entry["error"]))
+        return entry["running"]
+
+    def put_file(self, cont_path, *args, **kwargs):
+        return self._replay(f"put_file {cont_path}", Normalizer(self.name))
+
+    def put_files(self, files, *args, **kwargs):
+        return self._replay(f"put_files {' '.join(sorted(files))}", Normalizer(self.name))
+
+    def get_file(self, cont_path, dest):
+        normalizer = Normalizer(self.name)
+        key = f"get_file {cont_path}"
+        entry = self._next(key, normalizer)
+        out = self._replay(key, normalizer, entry=entry)
+        data = base64.b64decode(entry.get("data", ""))
+        if out.exit_status == 0:
+            if isinstance(dest, (str, Path)):
+                Path(dest).write_bytes(data)
+            else:
+                dest.write(data)
+        return out
+
+    def open_session(self):
+        raise RhelContainerException(msg="Shell sessions are not supported by replay engine.")
+
+    def exec_stream(self, cmd, callback=None, sink=None, tail=DEFAULT_TAIL, timeout=None):
+        normalizer = Normalizer(self.name)
+        key = f"exec_stream {normalizer.normalize(cmd)}"
+        entry = self._next(key, normalizer)
+        lines = [(name, normalizer.restore(line)) for name, line in entry["lines"]]
+        self._changing(cmd)
+        stream = ReplayedExecStream(
+            self._exec_command(cmd),
+            lines,
+            self._replay(key, normalizer, entry=entry),
+            callback=callback,
+            sink=sink,
+            tail=tail,
+        )
+        return stream.start()
+
+    def exec_pipe(self, cmd, timeout=None):
+        normalizer = Normalizer(self.name)
+        key = f"exec_pipe {normalizer.normalize(cmd)}"
+        entry = self._next(key, normalizer)
+        self._changing(cmd)
+        data = base64.b64decode(entry.get("data", ""))
+        return ReplayedExecPipe(
+            self._exec_command(cmd), data, self._replay(key, normalizer, entry=entry)
+        )
+
+
+class ReplayPodmanEngine(ReplayMixin, PodmanEngine):
+    """PodmanEngine replaying a recording."""
+
+
+class ReplayOpenshiftEngine(ReplayMixin, OpenshiftEngine):
+    """OpenshiftEngine replaying a recording."""
+
+
+REPLAY_CLASSES = {"podman": ReplayPodmanEngine, "openshift": ReplayOpenshiftEngine}
+
+
+def load_recording(path):
+    """Header and entries of recording file."""
+    with _open(path, "r") as fp:
+        lines = [json.loads(line) for line in fp if line.strip()]
+    if not lines or lines[0].get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a recording of format {FORMAT_VERSION}.")
+    return lines[0], lines[1:]
+
+
+def replay_engine(recording, name=None):
+    """Replay engine of the kind recording was made with."""
+    if recording is None:
+        raise ValueError("Replay engine needs a `recording` file.")
+    header, entries = load_recording(recording)
+    engine_class = REPLAY_CLASSES[header["kind"]]
+    return engine_class(name=name, recording=recording, engine=header["engine"], entries=entries)
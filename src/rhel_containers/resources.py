@@ -0,0 +1,128 @@
+# Per container resource limits (`resources` in conf.yaml) as podman/docker run options,
+# podman API host config and Kubernetes container resources.
+import re
+
+MEMORY_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmgt]?)(?:ib?|b)?$", re.IGNORECASE)
+MEMORY_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+LIMIT_KEYS = ("cpus", "memory", "pids_limit")
+
+
+def parse_memory(value):
+    """Bytes of a memory size like `512m`, `2g`, `1Gi` or a plain number; None if empty.
+
+    Units are binary, as podman's `--memory`.
+
+    Raises:
+        ValueError: not a memory size.
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = MEMORY_RE.match(str(value).strip())
+    if not match:
+        raise ValueError(f"Invalid memory size '{value}'.")
+    number, unit = match.groups()
+    return int(float(number) * MEMORY_UNITS[unit.lower()])
+
+
+def k8s_quantity(size):
+    """Kubernetes quantity of bytes, in the largest binary unit dividing it."""
+    for suffix, unit in (("Ti", 1024**4), ("Gi", 1024**3), ("Mi", 1024**2), ("Ki", 1024)):
+        if size % unit == 0:
+            return f"{size // unit}{suffix}"
+    return str(size)
+
+
+def _merge(base, override):
+    """New dict of base deep merged with override; None values don't override.
+
+    Inputs (frozen config boxes) are not modified.
+    """
+    merged = dict(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        elif value is not None:
+            merged[key] = value
+    return merged
+
+
+class ResourceLimits:
+    """CPU, memory and pid limits of one container.
+
+    Args:
+        cpus: number of cpus, may be fractional
+        memory: memory limit in bytes or as size like `2g`
+        pids_limit: max processes in container; podman/docker only, Kubernetes sets it
+            per node
+        openshift: Kubernetes container `resources` merged over the ones derived from
+            cpus/memory, e.g. `{"requests": {"cpu": "500m"}}`
+    """
+
+    def __init__(self, cpus=None, memory=None, pids_limit=None, openshift=None):
+        self.cpus = float(cpus) if cpus not in (None, "") else None
+        self.memory = parse_memory(memory)
+        self.pids_limit = int(pids_limit) if pids_limit not in (None, "") else None
+        self.openshift = openshift or {}
+
+    @classmethod
+    def from_config(cls, config, profile=None, overrides=None):
+        """Limits of `resources` config section; None if nothing is limited.
+
+        Args:
+            config: `resources` config section
+            profile: setup profile (or list of them) whose `profiles` entries override
+                the defaults, later ones winning
+            overrides: dict of limits given for one container, winning over config
+        """
+        settings = {key: value for key, value in (config or {}).items() if key != "profiles"}
+        profiles = [profile] if isinstance(profile, str) else list(profile or [])
+        for name in profiles:
+            settings = _merge(settings, ((config or {}).get("profiles") or {}).get(name))
+        settings = _merge(settings, overrides)
+        limits = cls(
+            **{key: settings.get(key) for key in LIMIT_KEYS}, openshift=settings.get("openshift")
+        )
+        return limits if limits else None
+
+    def __bool__(self):
+        return any(getattr(self, key) is not None for key in LIMIT_KEYS) or bool(self.openshift)
+
+    def podman_args(self):
+        """Options of `podman run`/`docker run`."""
+        args = []
+        if self.cpus is not None:
+            args.extend(["--cpus", f"{self.cpus:g}"])
+        if self.memory is not None:
+            args.extend(["--memory", str(self.memory)])
+        if self.pids_limit is not None:
+            args.extend(["--pids-limit", str(self.pids_limit)])
+        return args
+
+    def host_config(self):
+        """`HostConfig` entries of podman/docker API container create."""
+        config = {}
+        if self.cpus is not None:
+            config["NanoCpus"] = int(self.cpus * 1e9)
+        if self.memory is not None:
+            config["Memory"] = self.memory
+        if self.pids_limit is not None:
+            config["PidsLimit"] = self.pids_limit
+        return config
+
+    def k8s_resources(self):
+        """Kubernetes container `resources`; requests default to limits."""
+        limits = {}
+        if self.cpus is not None:
+            cpus = self.cpus
+            limits["cpu"] = str(int(cpus)) if cpus == int(cpus) else f"{int(cpus * 1000)}m"
+        if self.memory is not None:
+            limits["memory"] = k8s_quantity(self.memory)
+        return _merge({"limits": limits} if limits else {}, self.openshift)
+
+    def __repr__(self):
+        return (
+            f"ResourceLimits(cpus={self.cpus}, memory={self.memory}, "
+            f"pids_limit={self.pids_limit})"
+        )
@@ -0,0 +1,216 @@
+import logging
+import queue
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import kill_process_group
+from rhel_containers.engine import pump
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.tracing import redact
+
+logger = logging.getLogger(__name__)
+
+
+def frame_commands(cmds, marker, stop_on_failure=False):
+    """Shell script running commands in order with framed stdout/stderr.
+
+    After each command a `<marker> <index> <exit status>` line is written to
+    stdout and a `<marker> <index>` line to stderr; `<marker> end` closes the
+    batch on both streams.
+
+    Args:
+        cmds: list of command strings
+        marker: unique sentinel string
+        stop_on_failure: skip remaining commands after first non-zero exit status
+    """
+    # single-pass loop so `break` can skip the rest without exiting the shell.
+    script = ["for __rc_once in 1; do"]
+    for index, cmd in enumerate(cmds):
+        script.extend(
+            [
+                f"bash -c {shlex.quote(cmd)} </dev/null",
+                "__rc=$?",
+                f"printf '\\n%s %d %d\\n' {marker} {index} $__rc",
+                f"printf '\\n%s %d\\n' {marker} {index} >&2",
+            ]
+        )
+        if stop_on_failure:
+            script.append('[ "$__rc" -eq 0 ] || break')
+    script.extend(
+        ["done", f"printf '\\n%s end\\n' {marker}", f"printf '\\n%s end\\n' {marker} >&2"]
+    )
+    return "\n".join(script) + "\n"
+
+
+def read_frames(lines, marker):
+    """Split framed output lines into `(output, exit_status)` per command.
+
+    Returns:
+        tuple of frames list and flag telling whether end marker was seen.
+    """
+    frames, chunk = [], []
+    for line in lines:
+        if line.startswith(marker):
+            fields = line[len(marker) :].split()
+            if fields[0] == "end":
+                return frames, True
+            frames.append(("".join(chunk).strip(), int(fields[1]) if len(fields) > 1 else None))
+            chunk = []
+        else:
+            chunk.append(line)
+    return frames, False
+
+
+def frames_to_results(cmds, stdout_frames, stderr_frames):
+    """Build ContCommandResult for each executed command."""
+    results = []
+    for cmd, (stdout, exit_status), (stderr, _) in zip(cmds, stdout_frames, stderr_frames):
+        if exit_status != 0 and stderr:
+            logger.warning(f"Error: {redact(cmd)} >> {stdout} >> {stderr}")
+        results.append(
+            ContCommandResult(exit_status=exit_status, stdout=stdout, stderr=stderr, command=cmd)
+        )
+    return results
+
+
+class ShellSession:
+    """Long-lived interactive shell running inside a container.
+
+    Commands are written to the shell stdin and their output is framed with
+    sentinel markers on both stdout and stderr, so a single engine exec session
+    serves any number of commands. Every command still runs in its own
+    `bash -c` child (with stdin from /dev/null), so `cd`, `exit` or syntax
+    errors can't leak into the session.
+
+    A batch running past its timeout (or the current `deadline`) gets the shell killed
+    and respawned; commands it didn't finish are reported as one `TimeoutResult`.
+
+    Args:
+        command: engine command spawning an interactive shell in the container
+        timeout: default seconds every batch may take; None for no limit
+    """
+
+    def __init__(self, command, timeout=None):
+        self.command = command
+        self.timeout = timeout
+        self._proc = None
+        self._stdout = None
+        self._stderr = None
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._count = 0
+        self._expired = False
+
+    @property
+    def alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        """Spawn shell process."""
+        logger.info(f"Opening shell session: {' '.join(self.command)}")
+        # own process group so an expired batch kills engine client and all it spawned.
+        self._proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        # fresh queues; pump threads of a killed shell only feed the old ones.
+        self._stdout, self._stderr = queue.Queue(), queue.Queue()
+        self._expired = False
+        for pipe, lines in [(self._proc.stdout, self._stdout), (self._proc.stderr, self._stderr)]:
+            threading.Thread(target=pump, args=(pipe, lines), daemon=True).start()
+        return self
+
+    def _lines(self, lines, end=None):
+        """Iterate decoded lines of one stream until `end` (monotonic seconds).
+
+        Stops early once `end` passed; fails if shell went away on its own.
+        """
+        while True:
+            try:
+                line = lines.get(timeout=None if end is None else max(end - time.monotonic(), 0))
+            except queue.Empty:
+                self._expired = True
+                return
+            if line is None:
+                if self._expired:
+                    return
+                raise RhelContainerException(
+                    msg="Shell session terminated", command=" ".join(self.command)
+                )
+            yield line.decode(errors="replace")
+
+    def _reset(self, timeout):
+        """Kill shell stuck past its timeout and spawn a new one."""
+        logger.error(f"Shell session timed out after {timeout:.1f}s, restarting it")
+        kill_process_group(self._proc)
+        self._proc.wait()
+        self.start()
+
+    def run_many(self, cmds, stop_on_failure=False, timeout=None):
+        """Execute list of commands in session with a single write.
+
+        Args:
+            cmds: list of command strings
+            stop_on_failure: skip remaining commands after first failure
+            timeout: seconds for the whole batch (default `timeout` of session), bounded
+                by current deadline
+
+        Returns:
+            list of ContCommandResult, one per executed command; on timeout a
+            `TimeoutResult` follows the commands which finished.
+        """
+        from rhel_containers.deadline import bounded
+        from rhel_containers.deadline import TimeoutResult
+
+        if not self.alive:
+            raise RhelContainerException(
+                msg="Shell session is not running", command=" ".join(self.command)
+            )
+        timeout = bounded(self.timeout if timeout is None else timeout)
+        with self._lock:
+            end = None if timeout is None else time.monotonic() + timeout
+            self._count += 1
+            marker = f"__RHEL_CONT_{self._token}_{self._count}__"
+            script = frame_commands(cmds, marker, stop_on_failure=stop_on_failure)
+            self._proc.stdin.write(script.encode())
+            self._proc.stdin.flush()
+            stdout_frames, complete = read_frames(self._lines(self._stdout, end), marker)
+            if not complete:
+                # kill first: stderr then ends instead of waiting for a hung command.
+                kill_process_group(self._proc)
+            stderr_frames, _ = read_frames(self._lines(self._stderr), marker)
+            results = frames_to_results(cmds, stdout_frames, stderr_frames)
+            if not complete:
+                self._reset(timeout)
+                results.append(TimeoutResult(command=" ".join(self.command), timeout=timeout))
+        return results
+
+    def run(self, cmd, timeout=None):
+        """Execute command in session.
+
+        Args:
+            cmd: command string
+            timeout: seconds command may take
+        """
+        return self.run_many([cmd], timeout=timeout)[0]
+
+    def close(self):
+        """Terminate shell process."""
+        if self._proc is None:
+            return
+        if self.alive:
+            try:
+                self._proc.stdin.write(b"exit\n")
+                self._proc.stdin.close()
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+                self._proc.wait()
+        self._proc = None
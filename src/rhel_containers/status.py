@@ -0,0 +1,163 @@
+# State of many podman/docker containers from a single `ps -a --format json`, cached for a
+# short time so polling loops and fleet health checks don't spawn one `inspect` per container.
+import json
+import logging
+import re
+import threading
+import time
+
+from rhel_containers.engine import PodmanEngine
+
+logger = logging.getLogger(__name__)
+
+# seconds a `ps` snapshot is served before the next status asks the engine again.
+DEFAULT_TTL = 1.0
+HEALTH_RE = re.compile(r"\((healthy|unhealthy|health: starting)\)")
+EXITED_RE = re.compile(r"Exited \((-?\d+)\)")
+
+
+class ContainerState:
+    """State of one container as listed by `ps`.
+
+    Attributes:
+        name: container name
+        status: state like `Running`, `Exited`, `Created` (same form as `engine.status`)
+        exit_code: exit code if container exited, else None
+        started_at: epoch seconds container started at, if known
+        health: `healthy`, `unhealthy`, `starting` or None without health check
+        labels: dict of container labels
+    """
+
+    __slots__ = ("name", "status", "exit_code", "started_at", "health", "labels")
+
+    def __init__(self, name, status, exit_code=None, started_at=None, health=None, labels=None):
+        self.name = name
+        self.status = status
+        self.exit_code = exit_code
+        self.started_at = started_at
+        self.health = health
+        self.labels = labels or {}
+
+    @property
+    def running(self):
+        return self.status == "Running"
+
+    @classmethod
+    def from_ps(cls, entry):
+        """State of a `ps --format json` entry; podman and docker flavours."""
+        names = entry.get("Names") or []
+        # podman lists names, docker joins them with commas.
+        name = names[0] if isinstance(names, list) else names.split(",")[0]
+        status_text = entry.get("Status") or ""
+        health = HEALTH_RE.search(status_text)
+        health = health.group(1).replace("health: ", "") if health else None
+        state = (entry.get("State") or "").title()
+        exit_code = entry.get("ExitCode")
+        if exit_code is None:
+            exited = EXITED_RE.search(status_text)
+            exit_code = int(exited.group(1)) if exited else None
+        if state != "Exited":
+            exit_code = None
+        started_at = entry.get("StartedAt")
+        labels = entry.get("Labels") or {}
+        if isinstance(labels, str):
+            labels = dict(label.partition("=")[::2] for label in labels.split(",") if label)
+        return cls(
+            name=name,
+            status=state,
+            exit_code=exit_code,
+            started_at=started_at if isinstance(started_at, (int, float)) and started_at else None,
+            health=health,
+            labels=labels,
+        )
+
+    def __repr__(self):
+        return f"ContainerState(name={self.name!r}, status={self.status!r})"
+
+
+def parse_ps(stdout):
+    """Container name -> ContainerState of `ps -a --format json` output.
+
+    Podman prints one JSON list, docker one JSON object per line.
+    """
+    stdout = stdout.strip()
+    if not stdout:
+        return {}
+    if stdout.startswith("["):
+        entries = json.loads(stdout)
+    else:
+        entries = [json.loads(line) for line in stdout.splitlines() if line.strip()]
+    states = (ContainerState.from_ps(entry) for entry in entries)
+    return {state.name: state for state in states}
+
+
+class StatusProvider:
+    """States of all containers matching a name prefix (or label) with one `ps` call.
+
+    Shared by engines (`status_provider=`), `status` of each of them is served from the
+    same snapshot while it is younger than `ttl`. Concurrent callers wait for one refresh
+    instead of running their own.
+
+    Args:
+        engine: podman/docker binary or "auto"
+        name_prefix: only containers whose name starts with it
+        label: only containers with label `key=value`
+        ttl: seconds a snapshot is reused
+
+    Example:
+        provider = StatusProvider(name_prefix="rhel-ci-")
+        conts = [RhelContainer(name=f"rhel-ci-{i}", status_provider=provider) for i in range(200)]
+        [cont.engine.status for cont in conts]  # one `podman ps` call
+    """
+
+    def __init__(self, engine="auto", name_prefix=None, label=None, ttl=DEFAULT_TTL):
+        self._engine = PodmanEngine(name=name_prefix or "status", engine=engine)
+        self.name_prefix = name_prefix
+        self.label = label
+        self.ttl = ttl
+        self._states = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def _ps_command(self):
+        command = [self._engine.engine, "ps", "-a", "--format", "json"]
+        if self.name_prefix:
+            command.extend(["--filter", f"name=^{self.name_prefix}"])
+        if self.label:
+            command.extend(["--filter", f"label={self.label}"])
+        return command
+
+    def _fresh(self, max_age):
+        max_age = self.ttl if max_age is None else max_age
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < max_age
+
+    def _update(self, out):
+        if out.exit_status != 0:
+            logger.error(f"Fail to list containers >> {out.stderr}")
+            return
+        try:
+            self._states = parse_ps(out.stdout)
+        except ValueError as exc:
+            logger.error(f"Fail to parse container list: {exc}")
+            return
+        self._fetched_at = time.monotonic()
+
+    def states(self, max_age=None):
+        """Container name -> ContainerState; refreshed if snapshot is older than max_age."""
+        with self._lock:
+            if not self._fresh(max_age):
+                self._update(self._engine._exec(self._ps_command()))
+            return dict(self._states)
+
+    def state(self, name, max_age=None):
+        """ContainerState of container or None if engine doesn't know it."""
+        return self.states(max_age=max_age).get(name)
+
+    def status(self, name):
+        """Status in the form of `PodmanEngine.status`."""
+        state = self.state(name)
+        return state.status if state is not None else f"{name} unavailable."
+
+    def invalidate(self):
+        """Drop snapshot; next call asks engine again."""
+        self._fetched_at = None
@@ -0,0 +1,254 @@
+# Setup profiles as graphs of steps. A step runs once every step it requires succeeded;
+# independent steps run at the same time, each in its own engine exec.
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from rhel_containers import tracing
+from rhel_containers.engine import ContCommandResult
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+# a required step failed (or was skipped itself), so the step never ran.
+SKIPPED = "skipped"
+
+
+class Step:
+    """One setup step.
+
+    Args:
+        name: unique step name in its graph
+        cmds: commands run in one engine exec, stopping at first failure
+        requires: names of steps which must succeed first
+        action: callable returning ContCommandResult (awaitable with async engines), run
+            instead of `cmds`
+    """
+
+    def __init__(self, name, cmds=None, requires=(), action=None):
+        if (cmds is None) == (action is None):
+            raise ValueError(f"Step '{name}' needs either cmds or action.")
+        self.name = name
+        self.cmds = list(cmds) if cmds is not None else None
+        self.requires = tuple(requires)
+        self.action = action
+
+    def __repr__(self):
+        return f"Step({self.name!r}, requires={self.requires})"
+
+
+class StepResult(ContCommandResult):
+    """Result of a step; `status` is one of SUCCEEDED, FAILED, SKIPPED."""
+
+    __slots__ = ("step", "status", "duration")
+
+    def __init__(self, step, status, duration=0.0, out=None):
+        super().__init__(stdout="", stderr="")
+        if out is not None:
+            self._share_output(out)
+        self.step = step
+        self.status = status
+        self.duration = duration
+
+    def __repr__(self):
+        return (
+            f"StepResult(step={self.step!r}, status={self.status!r}, duration={self.duration:.2f}s)"
+        )
+
+
+class ProfileResult(ContCommandResult):
+    """Result of a whole step graph.
+
+    Exit status and output are those of the first failed step, or of the last step to
+    finish if all succeeded.
+
+    Attributes:
+        steps: dict of step name -> StepResult, in order steps finished
+        duration: seconds for the whole graph
+    """
+
+    __slots__ = ("steps", "duration")
+
+    def __init__(self, steps, duration):
+        failed = [result for result in steps.values() if result.status == FAILED]
+        last = failed[0] if failed else (list(steps.values())[-1] if steps else None)
+        super().__init__(exit_status=0, stdout="", stderr="")
+        if last is not None:
+            self._share_output(last)
+        if failed and self.exit_status in (0, None):
+            self.exit_status = 1
+        self.steps = steps
+        self.duration = duration
+
+    @property
+    def failed(self):
+        """Names of failed steps."""
+        return [name for name, result in self.steps.items() if result.status == FAILED]
+
+    @property
+    def skipped(self):
+        """Names of steps skipped because a required step failed."""
+        return [name for name, result in self.steps.items() if result.status == SKIPPED]
+
+    def __repr__(self):
+        return f"ProfileResult(exit_status={self.exit_status}, duration={self.duration:.2f}s)"
+
+
+class StepGraph:
+    """Steps with dependencies; validated on creation.
+
+    Example:
+        graph = StepGraph([
+            Step("packages", ["dnf install -y httpd"]),
+            Step("config", ["echo 'Listen 8080' >/etc/httpd/conf.d/port.conf"]),
+            Step("enable", ["systemctl enable httpd"], requires=["packages", "config"]),
+        ])
+        out = graph.run(rc.engine)
+        out.steps["packages"].duration
+
+    Raises:
+        ValueError: duplicated step, unknown requirement or dependency cycle.
+    """
+
+    def __init__(self, steps):
+        self.steps = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicated step '{step.name}'.")
+            self.steps[step.name] = step
+        for step in self.steps.values():
+            unknown = set(step.requires) - set(self.steps)
+            if unknown:
+                raise ValueError(f"Step '{step.name}' requires unknown steps {sorted(unknown)}.")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, done, visiting = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through step '{name}'.")
+            visiting.add(name)
+            for required in self.steps[name].requires:
+                visit(required)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
+
+    def _ready(self, results, started):
+        """Steps not started yet whose requirements all finished; skips doomed ones."""
+        ready = []
+        for name in self.order:
+            if name in started:
+                continue
+            step = self.steps[name]
+            statuses = [results[req].status for req in step.requires if req in results]
+            if len(statuses) < len(step.requires):
+                continue
+            started.add(name)
+            if all(status == SUCCEEDED for status in statuses):
+                ready.append(step)
+            else:
+                logger.info(f"Skipping step '{name}'; required step failed")
+                results[name] = StepResult(name, SKIPPED)
+        return ready
+
+    @staticmethod
+    def _step_result(step, out, started):
+        status = SUCCEEDED if out is not None and out.exit_status == 0 else FAILED
+        result = StepResult(step.name, status, time.perf_counter() - started, out)
+        if status == FAILED:
+            logger.error(f"Step '{step.name}' failed >> {result.stderr}")
+        return result
+
+    def _run_step(self, engine, step):
+        started = time.perf_counter()
+        with tracing.span(f"step.{step.name}", engine.name) as span:
+            if step.action is not None:
+                out = step.action()
+            elif step.cmds:
+                out = engine.exec_many(step.cmds, stop_on_failure=True)[-1]
+            else:
+                out = ContCommandResult(exit_status=0, stdout="", stderr="")
+            span.finish(out)
+        return self._step_result(step, out, started)
+
+    def run(self, engine, workers=4):
+        """Run graph on engine; returns ProfileResult.
+
+        Args:
+            engine: engine steps run on
+            workers: max steps running at the same time
+        """
+        start = time.perf_counter()
+        results, started, running = {}, set(), {}
+        # record/replay engines need calls in a reproducible order.
+        if getattr(engine, "sequential", False):
+            workers = 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                for step in self._ready(results, started):
+                    # keep tracing parent span in worker threads.
+                    context = contextvars.copy_context()
+                    future = executor.submit(context.run, self._run_step, engine, step)
+                    running[future] = step
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        results[step.name] = future.result()
+                    except Exception as exc:
+                        logger.error(f"Step '{step.name}' raised {exc!r}")
+                        out = ContCommandResult(exit_status=None, stdout="", stderr=str(exc))
+                        results[step.name] = StepResult(step.name, FAILED, out=out)
+        return ProfileResult(results, time.perf_counter() - start)
+
+    async def _run_step_async(self, engine, step):
+        started = time.perf_counter()
+        with tracing.span(f"step.{step.name}", engine.name) as span:
+            if step.action is not None:
+                out = await step.action()
+            elif step.cmds:
+                out = (await engine.exec_many(step.cmds, stop_on_failure=True))[-1]
+            else:
+                out = ContCommandResult(exit_status=0, stdout="", stderr="")
+            span.finish(out)
+        return self._step_result(step, out, started)
+
+    async def run_async(self, engine):
+        """Run graph on async engine; returns ProfileResult."""
+        import asyncio
+
+        start = time.perf_counter()
+        results, started, running, pending = {}, set(), {}, []
+        limit = 1 if getattr(engine, "sequential", False) else None
+        while True:
+            pending.extend(self._ready(results, started))
+            while pending and (limit is None or len(running) < limit):
+                step = pending.pop(0)
+                task = asyncio.ensure_future(self._run_step_async(engine, step))
+                running[task] = step
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                step = running.pop(task)
+                try:
+                    results[step.name] = task.result()
+                except Exception as exc:
+                    logger.error(f"Step '{step.name}' raised {exc!r}")
+                    out = ContCommandResult(exit_status=None, stdout="", stderr=str(exc))
+                    results[step.name] = StepResult(step.name, FAILED, out=out)
+        return ProfileResult(results, time.perf_counter() - start)
@@ -0,0 +1,292 @@
+# Streaming execution: output is handed over line by line while the command runs and only a
+# bounded tail of it is kept in memory, or read as raw bytes from `ExecPipe.stdout`.
+import codecs
+import logging
+import queue
+import subprocess
+import threading
+from collections import deque
+
+from rhel_containers.deadline import TimeoutResult
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import DEFAULT_TAIL
+from rhel_containers.engine import kill_process_group
+from rhel_containers.engine import Watchdog
+from rhel_containers.tracing import redact
+
+logger = logging.getLogger(__name__)
+
+STDOUT = "stdout"
+STDERR = "stderr"
+# longest piece of output handed over at once; longer lines come in several chunks.
+CHUNK_SIZE = 64 * 1024
+
+
+class OutputCollector:
+    """Split raw output chunks into lines, forward them and keep a bounded tail.
+
+    Args:
+        callback: called with (stream, line) for every line
+        sink: file-like object every line gets written to
+        tail: lines of each stream kept for result; None keeps everything, 0 nothing
+    """
+
+    def __init__(self, callback=None, sink=None, tail=DEFAULT_TAIL):
+        self.callback = callback
+        self.sink = sink
+        self.lines = {STDOUT: 0, STDERR: 0}
+        self._tail = {STDOUT: deque(maxlen=tail), STDERR: deque(maxlen=tail)}
+        self._partial = {STDOUT: "", STDERR: ""}
+        self._decoders = {
+            name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for name in (STDOUT, STDERR)
+        }
+
+    def feed(self, name, data):
+        """Take raw bytes of stream `name` (None at end of stream); returns complete lines.
+
+        Lines keep their line ending; a pending partial line is returned at end of stream
+        or once it grows beyond `CHUNK_SIZE`.
+        """
+        final = data is None
+        text = self._partial[name] + self._decoders[name].decode(data or b"", final=final)
+        lines = text.splitlines(keepends=True)
+        self._partial[name] = ""
+        if lines and not final and not lines[-1].endswith(("\n", "\r")):
+            if len(lines[-1]) < CHUNK_SIZE:
+                self._partial[name] = lines.pop()
+        for line in lines:
+            self._emit(name, line)
+        return [(name, line) for line in lines]
+
+    def _emit(self, name, line):
+        self.lines[name] += 1
+        self._tail[name].append(line)
+        if self.sink is not None:
+            self.sink.write(line)
+        if self.callback is not None:
+            self.callback(name, line)
+
+    @property
+    def truncated(self):
+        """True if lines got dropped from captured output."""
+        return any(self.lines[name] > len(self._tail[name]) for name in self.lines)
+
+    def result(self, exit_status, command=None):
+        """ContCommandResult holding captured tail of output."""
+        if self.truncated:
+            logger.debug(
+                f"Output of '{redact(command)}' truncated to last {self._tail[STDOUT].maxlen} lines"
+            )
+        return ContCommandResult(
+            exit_status=exit_status,
+            stdout="".join(self._tail[STDOUT]).strip(),
+            stderr="".join(self._tail[STDERR]).strip(),
+            command=command,
+        )
+
+
+class ExecStream:
+    """Command running in container with output consumed while it runs.
+
+    Iterate over it to get (stream, line) tuples as soon as they are produced, or call
+    `wait` to just run it through `callback`/`sink`. Reader threads hand output over a
+    bounded queue, so a slow consumer slows the command down instead of piling output
+    up in memory. `result` (a ContCommandResult with the captured tail) is set once
+    the command finished; a `TimeoutResult` if it was killed at `timeout`.
+
+    Args:
+        command: engine command
+        callback: called with (stream, line) for every line
+        sink: file-like object every line gets written to
+        tail: lines of each stream kept in result; None keeps everything, 0 nothing
+        buffer: max chunks queued between readers and consumer
+        timeout: seconds after which command is killed; None: no limit
+
+    Example:
+        with rc.exec_stream("dnf install -y vim") as stream:
+            for name, line in stream:
+                print(line, end="")
+        stream.result.exit_status
+    """
+
+    def __init__(
+        self, command, callback=None, sink=None, tail=DEFAULT_TAIL, buffer=256, timeout=None
+    ):
+        self.command = command
+        self.collector = OutputCollector(callback=callback, sink=sink, tail=tail)
+        self.timeout = timeout
+        self.result = None
+        self._queue = queue.Queue(maxsize=buffer)
+        self._readers = 0
+        self._proc = None
+        self._watchdog = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Spawn command and its output readers."""
+        self._proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self._watch()
+        for name, pipe in [(STDOUT, self._proc.stdout), (STDERR, self._proc.stderr)]:
+            self._spawn_reader(self._read_pipe, name, pipe)
+        return self
+
+    def _watch(self):
+        """Kill command at `timeout`."""
+        self._watchdog = Watchdog(self.timeout, self._kill)
+
+    def _spawn_reader(self, target, *args):
+        self._readers += 1
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+    def _read_pipe(self, name, pipe):
+        try:
+            for chunk in iter(lambda: pipe.readline(CHUNK_SIZE), b""):
+                self._queue.put((name, chunk))
+        finally:
+            self._queue.put((name, None))
+
+    def _exit_status(self):
+        return self._proc.wait()
+
+    def __iter__(self):
+        while self._readers:
+            name, chunk = self._queue.get()
+            if chunk is None:
+                self._readers -= 1
+            yield from self.collector.feed(name, chunk)
+        if self.result is None:
+            self.result = self.collector.result(self._exit_status(), " ".join(self.command))
+            if self._watchdog is not None:
+                self._watchdog.cancel()
+                if self._watchdog.expired:
+                    out = self.result
+                    self.result = TimeoutResult(
+                        out.command, self.timeout, out.stdout_bytes, out.stderr_bytes
+                    )
+            if self.result.exit_status != 0:
+                logger.warning(
+                    f"Error: {redact(self.result.command)} >> exit {self.result.exit_status}"
+                )
+
+    def wait(self):
+        """Consume remaining output; returns ContCommandResult."""
+        for _ in self:
+            pass
+        return self.result
+
+    def _kill(self):
+        if self._proc is not None and self._proc.poll() is None:
+            kill_process_group(self._proc)
+            self._proc.wait()
+
+    def close(self):
+        """Kill command if still running and drop output not consumed yet."""
+        self._kill()
+        # readers may be blocked on a full queue; let them reach end of stream.
+        while self._readers:
+            if self._queue.get()[1] is None:
+                self._readers -= 1
+
+
+class ExecPipe:
+    """Command running in container with its raw stdout read while it runs.
+
+    For binary output too large to keep in memory, like archives: read `stdout` to its
+    end, then `wait` for a ContCommandResult with exit status and stderr, which is read
+    aside. The command is killed at `timeout`; `wait` then returns a `TimeoutResult`.
+
+    Args:
+        command: engine command
+        timeout: seconds after which command is killed; None: no limit
+
+    Example:
+        with engine.exec_pipe("tar -czf - /etc") as pipe:
+            shutil.copyfileobj(pipe.stdout, fp)
+        pipe.result.exit_status
+    """
+
+    def __init__(self, command, timeout=None):
+        self.command = command
+        self.timeout = timeout
+        self.stdout = None
+        self.result = None
+        self._stderr = []
+        self._reader = None
+        self._proc = None
+        self._watchdog = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Spawn command and its stderr reader."""
+        self._proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self.stdout = self._proc.stdout
+        self._read_aside(self._read_stderr, self._proc.stderr)
+        self._watchdog = Watchdog(self.timeout, self.kill)
+        return self
+
+    def _read_aside(self, target, *args):
+        self._reader = threading.Thread(target=target, args=args, daemon=True)
+        self._reader.start()
+
+    def _read_stderr(self, pipe):
+        for chunk in iter(lambda: pipe.read1(CHUNK_SIZE), b""):
+            self._stderr.append(chunk)
+
+    def _exit_status(self):
+        return self._proc.wait()
+
+    def kill(self):
+        """Kill command, e.g. once its output turned out to be broken."""
+        if self._proc is not None and self._proc.poll() is None:
+            kill_process_group(self._proc)
+
+    def wait(self):
+        """Wait for command to finish; returns ContCommandResult holding its stderr.
+
+        Output not read from `stdout` by then is dropped.
+        """
+        if self.result is not None:
+            return self.result
+        self.stdout.close()
+        exit_status = self._exit_status()
+        self._watchdog.cancel()
+        self._reader.join()
+        stderr = b"".join(self._stderr)
+        command = " ".join(self.command)
+        if self._watchdog.expired:
+            logger.error(f"Timed out after {self.timeout:.1f}s: {redact(command)}")
+            self.result = TimeoutResult(command, self.timeout, stderr=stderr)
+        else:
+            self.result = ContCommandResult(
+                exit_status=exit_status, stdout=b"", stderr=stderr, command=command
+            )
+        return self.result
+
+    def close(self):
+        """Kill command if still running and wait for it."""
+        if self.result is None and self.stdout is not None:
+            self.kill()
+            self.wait()
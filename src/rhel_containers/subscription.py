@@ -1,25 +1,27 @@
 # RHEL Subscription management.
 import logging
 
+from rhel_containers.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 
 class Subscription:
-    """Manage subscription."""
+    """Manage subscription.
+
+    Args:
+        cache: `RegistrationCache`; register injects certificates of an earlier
+            registration of the same identity instead of registering again
+    """
 
-    def __init__(self, engine, config, env="qa", *args, **kwargs):
+    def __init__(self, engine, config, env="qa", cache=None, *args, **kwargs):
         self._engine = engine
         self._config = config
         self._env = env
+        self._cache = cache
 
-    def register(self, auto_attach=True, force=True):
-        """Subscribed system
-
-        Args:
-            auto_attach: auto attach pool
-            force: force subscribed
-        """
-        logger.info(f"Subscribing system {self._engine.name} to {self._config.serverurl}")
+    def _register_cmd(self, auto_attach=True, force=True):
+        """Build `subscription-manager register` command."""
         auto_attach = self._config.auto_attach if auto_attach is None else auto_attach
         force = self._config.force if force is None else force
 
@@ -37,13 +39,33 @@ class Subscription:
             cmd = f"{cmd} --auto-attach"
         if force:
             cmd = f"{cmd} --force"
+        return cmd
 
-        out = self._engine.exec(cmd)
+    def _log_register(self, out):
         if out.exit_status != 0:
             logger.error(f"Fail to subscribe system {self._engine.name}: {out.stderr}")
         else:
-            logger.info(f"Successfully subscribed.")
+            logger.info("Successfully subscribed.")
 
+    @traced("subscription.register")
+    def register(self, auto_attach=True, force=True):
+        """Subscribed system
+
+        Args:
+            auto_attach: auto attach pool
+            force: force subscribed
+        """
+        if self._cache is not None:
+            key = self._cache.key(self._env, {**self._config, "auto_attach": auto_attach})
+            return self._cache.register(
+                key, self._engine, lambda: self._register(auto_attach=auto_attach, force=force)
+            )
+        return self._register(auto_attach=auto_attach, force=force)
+
+    def _register(self, auto_attach=True, force=True):
+        logger.info(f"Subscribing system {self._engine.name} to {self._config.serverurl}")
+        out = self._engine.exec(self._register_cmd(auto_attach=auto_attach, force=force))
+        self._log_register(out)
         return out
 
     def attach(self, pool=None):
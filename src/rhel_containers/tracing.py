@@ -0,0 +1,281 @@
+# Tracing of engine commands and high level operations. Spans are handed to hooks added with
+# `add_hook`; without hooks nothing is recorded and instrumented calls cost a list check.
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# seconds; upper bounds of latency histogram buckets.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_PREFIX = "rhel_containers_operation"
+REDACTED = "***"
+# option/key values never shown in logs or spans: `--password=x`, `--password x`, `token: x`.
+SECRET_RE = re.compile(
+    r"(?i)((?:--?|\b)(?:password|passwd|activationkey|token|secret)(?:=|:\s*|\s+))"
+    r"('[^']*'|\"[^\"]*\"|\S+)"
+)
+
+_hooks = []
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("rhel_containers_span", default=None)
+
+
+def redact(text):
+    """Text with secret option values masked."""
+    if not text:
+        return text
+    return SECRET_RE.sub(rf"\1{REDACTED}", text)
+
+
+def add_hook(hook):
+    """Call `hook(span)` for every finished span."""
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def enabled():
+    return bool(_hooks)
+
+
+def _output_size(out):
+    size = 0
+    for result in out if isinstance(out, list) else [out]:
+        result_size = getattr(result, "output_size", None)
+        if result_size is None:
+            result_size = len(getattr(result, "stdout", None) or "")
+            result_size += len(getattr(result, "stderr", None) or "")
+        size += result_size
+    return size
+
+
+class Span:
+    """Timed operation.
+
+    Attributes:
+        name: operation type, e.g. `engine.exec`, `start`, `subscription.register`
+        container: container name
+        command: redacted engine command, if any
+        parent_id: id of span this one ran in
+        start: epoch seconds
+        duration: seconds
+        exit_status: of result (last one for batches)
+        output_size: bytes (characters for decoded output) of stdout and stderr
+        error: exception type name if operation raised
+    """
+
+    __slots__ = (
+        "span_id",
+        "parent_id",
+        "name",
+        "container",
+        "command",
+        "start",
+        "duration",
+        "exit_status",
+        "output_size",
+        "error",
+        "_started",
+        "_token",
+    )
+
+    def __init__(self, name, container=None, command=None):
+        self.span_id = next(_ids)
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.container = container
+        if command is not None and not isinstance(command, str):
+            command = " ".join(command)
+        self.command = redact(command)
+        self.start = None
+        self.duration = None
+        self.exit_status = None
+        self.output_size = 0
+        self.error = None
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        for hook in list(_hooks):
+            try:
+                hook(self)
+            except Exception as hook_exc:
+                logger.warning(f"Tracing hook {hook!r} failed: {hook_exc}")
+
+    def finish(self, out):
+        """Take exit status and output size from ContCommandResult (or list of them)."""
+        last = out[-1] if isinstance(out, list) and out else out
+        self.exit_status = getattr(last, "exit_status", None)
+        self.output_size = _output_size(out)
+        return out
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if not slot.startswith("_")}
+
+    def __repr__(self):
+        return f"Span(name={self.name!r}, container={self.container!r}, duration={self.duration})"
+
+
+class _NoSpan:
+    """Stand-in for Span while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def finish(self, out):
+        return out
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(name, container=None, command=None):
+    """Context manager timing an operation; `NO_SPAN` if tracing is disabled."""
+    if not _hooks:
+        return NO_SPAN
+    return Span(name, container=container, command=command)
+
+
+def _container_name(obj):
+    name = getattr(obj, "name", None)
+    if isinstance(name, str):
+        return name
+    engine = getattr(obj, "engine", None) or getattr(obj, "_engine", None)
+    return getattr(engine, "name", None)
+
+
+def traced(name):
+    """Decorate method to run in a span named `name`; works on coroutine functions too."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                if not _hooks:
+                    return await func(self, *args, **kwargs)
+                with Span(name, container=_container_name(self)) as current:
+                    return current.finish(await func(self, *args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not _hooks:
+                return func(self, *args, **kwargs)
+            with Span(name, container=_container_name(self)) as current:
+                return current.finish(func(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.failures = 0
+        self.output_size = 0
+
+
+class LatencyMetrics:
+    """Tracing hook aggregating spans into latency histograms per operation type.
+
+    Example:
+        metrics = tracing.add_hook(LatencyMetrics())
+        rc.start(); rc.setup("insights-client")
+        print(metrics.to_prometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        with self._lock:
+            hist = self._histograms.get(span.name)
+            if hist is None:
+                hist = self._histograms[span.name] = _Histogram(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    hist.counts[i] += 1
+                    break
+            hist.count += 1
+            hist.sum += span.duration
+            hist.output_size += span.output_size
+            if span.error or span.exit_status not in (0, None):
+                hist.failures += 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def to_dict(self):
+        """{operation: {count, sum, failures, output_size, buckets: {le: cumulative count}}}."""
+        data = {}
+        with self._lock:
+            for name, hist in sorted(self._histograms.items()):
+                cumulative = list(itertools.accumulate(hist.counts))
+                buckets = {str(bound): count for bound, count in zip(self.buckets, cumulative)}
+                buckets["+Inf"] = hist.count
+                data[name] = {
+                    "count": hist.count,
+                    "sum": hist.sum,
+                    "failures": hist.failures,
+                    "output_size": hist.output_size,
+                    "buckets": buckets,
+                }
+        return data
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self):
+        """Metrics in Prometheus text exposition format."""
+        data = self.to_dict()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_seconds Duration of rhel-containers operations.",
+            f"# TYPE {METRIC_PREFIX}_seconds histogram",
+        ]
+        for name, hist in data.items():
+            for bound, count in hist["buckets"].items():
+                lines.append(
+                    f'{METRIC_PREFIX}_seconds_bucket{{operation="{name}",le="{bound}"}} {count}'
+                )
+            lines.append(f'{METRIC_PREFIX}_seconds_sum{{operation="{name}"}} {hist["sum"]}')
+            lines.append(f'{METRIC_PREFIX}_seconds_count{{operation="{name}"}} {hist["count"]}')
+        for metric, key, help_text in (
+            ("failures_total", "failures", "Operations with non-zero exit status or error."),
+            ("output_chars_total", "output_size", "Characters of stdout and stderr."),
+        ):
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+            for name, hist in data.items():
+                lines.append(f'{METRIC_PREFIX}_{metric}{{operation="{name}"}} {hist[key]}')
+        return "\n".join(lines) + "\n"
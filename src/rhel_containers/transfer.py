@@ -0,0 +1,263 @@
+# Binary safe file transfer: bytes are streamed over stdin/stdout of an engine exec, so
+# content never ends up in a command line. A transfer running into its timeout is killed
+# with its process group and returns a `TimeoutResult`; transfers are never retried.
+import hashlib
+import io
+import logging
+import shlex
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+from rhel_containers.deadline import TimeoutResult
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import kill_process_group
+from rhel_containers.engine import Watchdog
+from rhel_containers.tracing import redact
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# first line printed by `put_script`; tells whether content needs to be sent.
+SEND = "SEND"
+SKIP = "SKIP"
+
+
+class Source:
+    """Content of a file to transfer: str/bytes, binary file object or host path."""
+
+    def __init__(self, data=None, host_path=None):
+        if (data is None) == (host_path is None):
+            raise ValueError("Provide either data or host_path.")
+        if isinstance(data, str):
+            data = data.encode()
+        self.data = data
+        self.host_path = Path(host_path) if host_path is not None else None
+
+    def open(self):
+        if self.host_path is not None:
+            return self.host_path.open("rb")
+        if isinstance(self.data, bytes):
+            return io.BytesIO(self.data)
+        return self.data
+
+    def sha256(self):
+        if isinstance(self.data, bytes):
+            return hashlib.sha256(self.data).hexdigest()
+        fp = self.open()
+        if self.host_path is None and not fp.seekable():
+            raise ValueError("Can't checksum a non seekable stream; use checksum=False.")
+        start = fp.tell()
+        digest = hashlib.sha256()
+        try:
+            for chunk in iter(lambda: fp.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        finally:
+            if self.host_path is not None:
+                fp.close()
+            else:
+                fp.seek(start)
+        return digest.hexdigest()
+
+    def size(self):
+        if self.host_path is not None:
+            return self.host_path.stat().st_size
+        if isinstance(self.data, bytes):
+            return len(self.data)
+        fp = self.data
+        start = fp.tell()
+        size = fp.seek(0, io.SEEK_END) - start
+        fp.seek(start)
+        return size
+
+
+def put_script(path, digest=None, mode=None, append=False):
+    """Shell script writing stdin to `path` atomically (or appending to it).
+
+    With `digest`, the script prints `SKIP` and exits if the file already has that
+    sha256, `SEND` before reading stdin otherwise.
+    """
+    tmp = shlex.quote(f"{path}.rc-tmp")
+    path = shlex.quote(path)
+    steps = [f"echo {SEND}", f'mkdir -p "$(dirname {path})"']
+    if append:
+        steps.append(f"cat >>{path}")
+    else:
+        # write next to target and rename; readers never see a partial file.
+        steps.append(f"cat >{tmp} && mv -f {tmp} {path}")
+    if mode is not None:
+        steps.append(f"chmod {mode:o} {path}")
+    script = " && ".join(steps)
+    if digest:
+        check = f'[ -f {path} ] && [ "$(sha256sum <{path} | cut -c1-64)" = {digest} ]'
+        script = f"{check} && {{ echo {SKIP}; exit 0; }}; {script}"
+    return script
+
+
+def hash_script(paths):
+    """Shell script printing sha256 of existing files among `paths`."""
+    return f"sha256sum -- {' '.join(shlex.quote(p) for p in paths)} 2>/dev/null; true"
+
+
+def parse_hashes(stdout):
+    """`sha256sum` output to {path: digest}."""
+    hashes = {}
+    for line in stdout.splitlines():
+        digest, _, path = line.partition("  ")
+        if path:
+            hashes[path] = digest
+    return hashes
+
+
+def add_to_tar(tar, cont_path, source, mode=None):
+    """Add `source` to tar stream as member for absolute `cont_path`."""
+    info = tarfile.TarInfo(cont_path.lstrip("/"))
+    info.size = source.size()
+    info.mtime = int(time.time())
+    info.mode = 0o644 if mode is None else mode
+    if source.host_path is not None and mode is None:
+        info.mode = source.host_path.stat().st_mode & 0o7777
+    with_close = source.host_path is not None
+    fp = source.open()
+    try:
+        tar.addfile(info, fp)
+    finally:
+        if with_close:
+            fp.close()
+
+
+def _result(command, proc, stdout=b"", stderr=b"", watchdog=None):
+    if watchdog is not None and watchdog.expired:
+        logger.error(f"Timed out after {watchdog.timeout:.1f}s: {redact(' '.join(command))}")
+        return TimeoutResult(" ".join(command), watchdog.timeout, stdout, stderr)
+    out = ContCommandResult(
+        exit_status=proc.returncode,
+        stdout=stdout.decode(errors="replace").strip(),
+        stderr=stderr.decode(errors="replace").strip(),
+        command=" ".join(command),
+    )
+    if out.exit_status != 0:
+        logger.warning(f"Error: {redact(out.command)} >> {redact(out.stderr)}")
+    return out
+
+
+class _Drain:
+    """Read a pipe to its end in a thread, so the child never blocks on a full pipe."""
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self._chunks = []
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        for chunk in iter(lambda: self._pipe.read1(CHUNK_SIZE), b""):
+            self._chunks.append(chunk)
+        self._pipe.close()
+
+    def result(self):
+        """Everything read, once the pipe is closed."""
+        self._thread.join()
+        return b"".join(self._chunks)
+
+
+def _close_stdin(proc):
+    try:
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+
+
+def _popen(command, timeout, stdin=subprocess.PIPE, stdout=subprocess.PIPE):
+    """Spawn command in its own process group, killed after `timeout` seconds."""
+    proc = subprocess.Popen(
+        command, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE, start_new_session=True
+    )
+    return proc, Watchdog(timeout, lambda: kill_process_group(proc))
+
+
+def _wait(proc, watchdog):
+    proc.wait()
+    watchdog.cancel()
+
+
+def run(command, timeout=None):
+    """Run command without going through engine `_exec`; usable from worker threads."""
+    proc, watchdog = _popen(command, timeout, stdin=subprocess.DEVNULL)
+    stdout, stderr = proc.communicate()
+    watchdog.cancel()
+    return _result(command, proc, stdout, stderr, watchdog)
+
+
+def send(command, source, handshake=False, timeout=None):
+    """Run command streaming `source` to its stdin.
+
+    With `handshake`, the command's first output line must be `SEND` before anything is
+    written; on `SKIP` nothing is sent.
+    """
+    proc, watchdog = _popen(command, timeout)
+    stderr = _Drain(proc.stderr)
+    skipped = False
+    if handshake:
+        answer = proc.stdout.readline().decode().strip()
+        skipped = answer != SEND
+    stdout = _Drain(proc.stdout)
+    if not skipped:
+        fp = source.open()
+        try:
+            shutil.copyfileobj(fp, proc.stdin, CHUNK_SIZE)
+        except BrokenPipeError:
+            pass
+        finally:
+            if source.host_path is not None:
+                fp.close()
+    _close_stdin(proc)
+    _wait(proc, watchdog)
+    out = _result(command, proc, stdout.result(), stderr.result(), watchdog)
+    if handshake and skipped and out.exit_status == 0:
+        out.stdout = SKIP
+    return out
+
+
+def send_tar(command, members, timeout=None):
+    """Run command streaming a tar of `members` ((cont_path, source, mode) tuples) to stdin."""
+    proc, watchdog = _popen(command, timeout)
+    stdout, stderr = _Drain(proc.stdout), _Drain(proc.stderr)
+    try:
+        # stream mode; nothing but the current member is held in memory.
+        with tarfile.open(fileobj=proc.stdin, mode="w|") as tar:
+            for cont_path, source, mode in members:
+                add_to_tar(tar, cont_path, source, mode=mode)
+    except BrokenPipeError:
+        pass
+    _close_stdin(proc)
+    _wait(proc, watchdog)
+    return _result(command, proc, stdout.result(), stderr.result(), watchdog)
+
+
+def receive(command, dest, timeout=None):
+    """Run command writing its stdout to `dest` (host path or binary file object)."""
+    host_path = Path(dest) if isinstance(dest, (str, Path)) else None
+    fp = host_path.open("wb") if host_path else dest
+    try:
+        try:
+            fp.flush()
+            # real file: engine writes straight into it.
+            stdout = fp.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            stdout = subprocess.PIPE
+        proc, watchdog = _popen(command, timeout, stdin=subprocess.DEVNULL, stdout=stdout)
+        stderr = _Drain(proc.stderr)
+        if stdout == subprocess.PIPE:
+            shutil.copyfileobj(proc.stdout, fp, CHUNK_SIZE)
+        _wait(proc, watchdog)
+        out = _result(command, proc, stderr=stderr.result(), watchdog=watchdog)
+    finally:
+        if host_path:
+            fp.close()
+    if host_path and out.exit_status != 0:
+        host_path.unlink()
+    return out
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+import pytest
+from rhel_containers.engine import which
+
+STUB = Path(__file__).parents[1].joinpath("benchmarks", "stub", "engine")
+
+
+@pytest.fixture
+def stub_podman(tmp_path, monkeypatch):
+    """Stub podman and kubectl (benchmarks/stub/engine) on PATH; yields its state root."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for engine in ("podman", "kubectl"):
+        bin_dir.joinpath(engine).symlink_to(STUB.resolve())
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    monkeypatch.setenv("RC_STUB_ROOT", str(tmp_path))
+    which.cache_clear()
+    yield tmp_path
+    which.cache_clear()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers.admission import AdmissionController
+from rhel_containers.admission import HostStats
+from rhel_containers.admission import NOT_ADMITTED_STATUS
+from rhel_containers.aio import AsyncRhelContainer
+from rhel_containers.resources import parse_memory
+from rhel_containers.resources import ResourceLimits
+
+GIB = 1024**3
+
+RESOURCES = {
+    "cpus": 2,
+    "memory": "2g",
+    "pids_limit": 4096,
+    "openshift": {"requests": {"cpu": "500m"}},
+    "profiles": {"ansible": {"memory": "3g"}, "python": {"cpus": 0.5}},
+}
+
+
+def write_proc(proc, available_gib=8, load=0.5):
+    proc.mkdir(exist_ok=True)
+    proc.joinpath("meminfo").write_text(
+        f"MemTotal:       {16 * 1024**2} kB\nMemFree:    1024 kB\n"
+        f"MemAvailable:   {int(available_gib * 1024**2)} kB\n"
+    )
+    proc.joinpath("loadavg").write_text(f"{load} 0.40 0.30 1/100 1234\n")
+    proc.joinpath("stat").write_text("cpu  100 0 100 800 0 0 0 0 0 0\ncpu0 1 0 1 8 0 0 0 0 0 0\n")
+
+
+def test_resource_limits():
+    assert parse_memory("512m") == 512 * 1024**2
+    assert parse_memory("2Gi") == parse_memory("2g") == 2 * GIB
+    assert parse_memory(None) is None
+    with pytest.raises(ValueError):
+        parse_memory("lots")
+
+    limits = ResourceLimits.from_config(RESOURCES, profile=["python", "ansible"])
+    assert (limits.cpus, limits.memory, limits.pids_limit) == (0.5, 3 * GIB, 4096)
+    assert limits.podman_args() == ["--cpus", "0.5", "--memory", str(3 * GIB)] + [
+        "--pids-limit",
+        "4096",
+    ]
+    assert limits.k8s_resources() == {
+        "limits": {"cpu": "500m", "memory": "3Gi"},
+        "requests": {"cpu": "500m"},
+    }
+    assert ResourceLimits.from_config(RESOURCES, overrides={"cpus": 4}).cpus == 4
+    assert ResourceLimits.from_config({"cpus": None}) is None
+
+
+def test_run_with_limits(stub_podman):
+    rc = RhelContainer(name="rhel-limits", config={"RHEL_CONTAINERS": {"resources": RESOURCES}})
+    out = rc.start(profile="ansible")
+    assert out.exit_status == 0
+    assert f"--cpus 2 --memory {3 * GIB} --pids-limit 4096" in out.command
+
+    rc = RhelContainer(
+        name="rhel-pod", engine_name="kubectl", config={"RHEL_CONTAINERS": {"resources": RESOURCES}}
+    )
+    out = rc.start(wait=False, profile="ansible")
+    overrides = json.loads(out.command.partition("--overrides=")[2])
+    assert overrides["spec"]["containers"][0]["resources"]["limits"] == {
+        "cpu": "2",
+        "memory": "3Gi",
+    }
+
+
+def test_admission_waits_for_memory(tmp_path):
+    write_proc(tmp_path, available_gib=1.2)
+    admission = AdmissionController(min_memory="1g", interval=0.05, proc=tmp_path)
+    assert admission.try_admit("rhel-0") is None
+    assert "MiB available" in admission.last_reason
+
+    ticket = {}
+    waiter = threading.Thread(target=lambda: ticket.update(t=admission.acquire("rhel-1")))
+    waiter.start()
+    time.sleep(0.2)
+    assert admission.queue_depth == 1
+    write_proc(tmp_path, available_gib=8)
+    waiter.join(5)
+
+    assert ticket["t"].waited >= 0.2
+    metrics = admission.to_dict()
+    assert (metrics["queue_depth"], metrics["max_queue_depth"], metrics["admitted"]) == (0, 1, 1)
+    assert metrics["latency"]["max"] == ticket["t"].waited
+    assert metrics["reserved_memory"] == parse_memory("512m")
+
+
+def test_admission_reserves_starting_containers(tmp_path):
+    write_proc(tmp_path, available_gib=4)
+    admission = AdmissionController(min_memory="1g", settle=60, proc=tmp_path)
+    assert admission.try_admit("rhel-0", memory=2 * GIB) is not None
+    # host still reports 4 GiB free, but rhel-0 is about to use 2 of them.
+    assert admission.try_admit("rhel-1", memory=2 * GIB) is None
+    assert admission.try_admit("rhel-1", memory=GIB // 2) is not None
+
+    admission = AdmissionController(max_load=1.0, max_starting=1, proc=tmp_path)
+    stats = HostStats(cpus=4, load=8, mem_available=None)
+    assert admission.check(stats) == "load 8.00 on 4 cpus"
+    assert admission.try_admit("rhel-2") is not None
+    assert admission.try_admit("rhel-3") is None
+    assert admission.last_reason == "1 containers starting"
+
+
+def test_start_not_admitted(stub_podman):
+    write_proc(stub_podman / "proc", load=64)
+    admission = AdmissionController(max_load=1.0, interval=0.05, max_wait=0.2)
+    admission.proc = stub_podman / "proc"
+    rc = RhelContainer(name="rhel-busy", admission=admission)
+    out = rc.start()
+
+    assert out.exit_status == NOT_ADMITTED_STATUS and not out.timed_out
+    assert "Host has no capacity: load 64.00" in out.stderr
+    assert admission.to_dict()["given_up"] == 1
+    assert not stub_podman.joinpath("state", "rhel-busy").exists()
+
+
+def test_start_timeout_releases_admission(stub_podman, monkeypatch):
+    write_proc(stub_podman / "proc")
+    monkeypatch.setenv("RC_STUB_START_DELAY", "30")
+    admission = AdmissionController(max_starting=1, proc=stub_podman / "proc")
+
+    rc = RhelContainer(name="rhel-slow", admission=admission)
+    assert rc.start(timeout=1).timed_out
+    assert rc.admission_ticket is None and admission.reserved_memory == 0
+    assert not stub_podman.joinpath("state", "rhel-slow").exists()
+
+    async def scenario():
+        rc = AsyncRhelContainer(name="rhel-slow-aio", admission=admission)
+        return rc, await rc.start(timeout=1)
+
+    rc, out = asyncio.run(scenario())
+    assert out.timed_out and rc.admission_ticket is None
+    assert not stub_podman.joinpath("state", "rhel-slow-aio").exists()
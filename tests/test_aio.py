@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from rhel_containers import tracing
+from rhel_containers.aio import AsyncContainerFacts
+from rhel_containers.aio import AsyncRhelContainer
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.packages import ALREADY_INSTALLED
+from rhel_containers.packages import INSTALLED
+from rhel_containers.packages import NOT_INSTALLED
+
+
+def test_async_container(stub_podman):
+    async def scenario():
+        rc = AsyncRhelContainer(name="rhel-aio")
+        assert (await rc.start(timeout=10)).exit_status == 0
+        out = await rc.exec("echo hello")
+        batch = await rc.exec_many(["true", "false", "echo done"], stop_on_failure=True)
+        packages = await rc.facts.packages
+        installed = await rc.is_pkg_installed("bash"), await rc.is_pkg_installed("rc-test-pkg")
+        await rc.stop()
+        return out, batch, packages, installed
+
+    out, batch, packages, installed = asyncio.run(scenario())
+    assert (out.exit_status, out.stdout) == (0, "hello")
+    assert [res.exit_status for res in batch] == [0, 1]
+    assert {"bash", "rpm", "python3"} <= packages
+    assert installed == (True, False)
+
+
+def test_async_facts_cache(stub_podman):
+    async def scenario():
+        rc = AsyncRhelContainer(name="rhel-aio-facts")
+        await rc.start(timeout=10)
+        assert isinstance(rc.facts, AsyncContainerFacts)
+        assert rc.facts.cached("packages") is None
+        assert await rc.facts.load()
+        generation = rc.engine.generation
+        release = await rc.facts.redhat_release
+        hostname = await rc.hostname
+        assert rc.engine.generation == generation
+        await rc.exec("true")
+        assert not rc.facts.stale
+        await rc.exec("dnf install -y rc-test-pkg")
+        stale = rc.facts.stale, rc.facts.static_stale
+        packages = await rc.facts.packages
+        await rc.stop()
+        return release, hostname, stale, packages
+
+    release, hostname, stale, packages = asyncio.run(scenario())
+    assert release is not None and hostname is not None
+    assert stale == (True, False)
+    assert "rc-test-pkg" in packages
+
+
+def test_async_transaction(stub_podman):
+    async def scenario():
+        rc = AsyncRhelContainer(name="rhel-aio-txn")
+        await rc.start(timeout=10)
+        async with rc.transaction() as txn:
+            txn.install("rc-test-pkg", "bash").remove("emacs")
+        first = txn.result
+        second = await rc.transaction().install("rc-test-pkg").flush()
+        await rc.stop()
+        return rc, first, second
+
+    rc, first, second = asyncio.run(scenario())
+    assert first.outcomes == {
+        "rc-test-pkg": INSTALLED,
+        "bash": ALREADY_INSTALLED,
+        "emacs": NOT_INSTALLED,
+    }
+    assert second.outcomes == {"rc-test-pkg": ALREADY_INSTALLED}
+    with pytest.raises(TypeError, match="async with"):
+        with rc.transaction():
+            pass
+    with pytest.raises(TypeError, match="facts.load"):
+        rc.transaction().install("rc-test-pkg").commands(load=True)
+
+
+def test_async_exec_stream_timeout(stub_podman):
+    async def scenario():
+        rc = AsyncRhelContainer(name="rhel-aio-stream")
+        await rc.start(timeout=10)
+        out = await rc.exec_stream("echo started; sleep 30", timeout=0.5)
+        await rc.stop()
+        return out
+
+    out = asyncio.run(scenario())
+    assert out.timed_out and out.stdout == "started"
+
+
+def test_async_unsupported_features(stub_podman):
+    reg_cache = {"enabled": True, "path": str(stub_podman / "registrations")}
+    for kwargs, match in (
+        ({"session": True}, "Shell sessions"),
+        ({"image_cache": True}, "Image cache"),
+        ({"config": {"RHEL_CONTAINERS": {"registration_cache": reg_cache}}}, "Registration cache"),
+    ):
+        with pytest.raises(RhelContainerException, match=match):
+            AsyncRhelContainer(name="rhel-aio-unsupported", **kwargs)
+
+
+def test_async_collect_archive_context(tmp_path, stub_podman):
+    spans = []
+    hook = tracing.add_hook(spans.append)
+
+    async def scenario():
+        rc = AsyncRhelContainer(name="rhel-aio-archive")
+        await rc.start(timeout=10)
+        with tracing.span("outer", rc.name) as outer:
+            await rc.insights_client.collect_archive(tmp_path / "archive.tar.gz")
+        await rc.stop()
+        return outer
+
+    try:
+        outer = asyncio.run(scenario())
+    finally:
+        tracing.remove_hook(hook)
+    # worker thread runs in a copy of the caller's context, so its span is nested.
+    (collect,) = [span for span in spans if "insights-client" in (span.command or "")]
+    assert collect.parent_id == outer.span_id
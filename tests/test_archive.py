@@ -0,0 +1,50 @@
+import io
+import tarfile
+from pathlib import Path
+
+from rhel_containers import RhelContainer
+from rhel_containers.archive import stream_archive
+from rhel_containers.stream import ExecPipe
+
+# local bash stands in for the insights-client exec: archive on stdout, name on stderr.
+SCRIPT = """
+mkdir -p "$1/insights-host/data" && echo hello >"$1/insights-host/data/uname"
+tar -C "$1" -czf "$1/insights-host-1.tar.gz" insights-host
+echo "Insights archive retained in $1/insights-host-1.tar.gz" >&2
+cat "$1/insights-host-1.tar.gz"
+"""
+
+
+def test_stream_archive(tmp_path):
+    command = ["bash", "-c", SCRIPT, "-", str(tmp_path / "cont")]
+
+    out = stream_archive(ExecPipe(command).start(), tmp_path / "a.tar.gz", index=True)
+    assert out.exit_status == 0
+    assert out.stdout == "insights-host-1.tar.gz"
+    assert ("insights-host/data/uname", 6) in out.members
+    assert out.size == (tmp_path / "a.tar.gz").stat().st_size
+
+    buf = io.BytesIO()
+    out = stream_archive(ExecPipe(command).start(), buf, decompress=True)
+    assert out.stdout == "insights-host-1.tar"
+    assert tarfile.open(fileobj=io.BytesIO(buf.getvalue())).getnames()[-1].endswith("uname")
+
+
+def test_stream_archive_failure(tmp_path):
+    dest = tmp_path / "a.tar.gz"
+    pipe = ExecPipe(["bash", "-c", "printf abc; exit 1"]).start()
+    assert stream_archive(pipe, dest).exit_status == 1
+    assert not dest.exists()
+
+    pipe = ExecPipe(["bash", "-c", "printf abc; sleep 30"], timeout=0.5).start()
+    out = stream_archive(pipe, dest)
+    assert out.timed_out and not dest.exists()
+
+
+def test_create_archive_through_engine(tmp_path, stub_podman):
+    rc = RhelContainer(name="rhel-archive")
+    rc.start()
+    out = rc.create_archive(tmp_path / "archives", index=True)
+    rc.stop()
+    assert out.exit_status == 0, out.stderr
+    assert out.members and Path(out.dest).stat().st_size == out.size
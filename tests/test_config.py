@@ -0,0 +1,41 @@
+import os
+
+from rhel_containers import config
+from rhel_containers import RhelContainer
+
+
+def test_load_config_cached(tmp_path, monkeypatch):
+    local = tmp_path / "rhel_cont.yaml"
+    monkeypatch.setattr(config, "LOCAL_CONF", local)
+    config.clear_config_cache()
+    loads = []
+    load_file = config._load_file
+    monkeypatch.setattr(config, "_load_file", lambda path: loads.append(path) or load_file(path))
+
+    conf = config.load_config("qa")
+    assert config.load_config("qa") == conf
+    assert len(loads) == 1
+    extra = {"RHEL_CONTAINERS": {"x": [1]}}
+    assert config.load_config("qa", extra).x == [1]
+    extra["RHEL_CONTAINERS"]["x"].append(2)
+    assert config.load_config("qa", {"RHEL_CONTAINERS": {"x": [1]}}).x == [1]
+    assert config.load_config("qa", {"RHEL_CONTAINERS": {"x": True}}).x is True
+    assert config.load_config("qa", {"RHEL_CONTAINERS": {"x": 1}}).x == 1
+    assert "x" not in config.load_config("qa")
+    # extra_conf (credentials) is never cached.
+    assert len(loads) == 1
+    assert config._load_files.cache_info().currsize == 1
+    assert config.load_config("stage") != conf
+
+    # local conf change invalidates cache
+    local.write_text("qa:\n  RHEL_CONTAINERS:\n    subscription:\n      username: me\n")
+    os.utime(local, ns=(1, 1))
+    assert config.load_config("qa").subscription.username == "me"
+
+
+def test_config_per_handle(stub_podman):
+    first, second = RhelContainer(name="rhel-conf-1"), RhelContainer(name="rhel-conf-2")
+    first.config.subscription.username = "me"
+    first.config.engine = {"timeout": 5}
+    assert second.config.subscription.username != "me"
+    assert RhelContainer(name="rhel-conf-3").config.get("engine") != {"timeout": 5}
@@ -0,0 +1,123 @@
+import os
+import time
+
+import pytest
+from rhel_containers.deadline import deadline
+from rhel_containers.deadline import RetryPolicy
+from rhel_containers.deadline import TIMEOUT_STATUS
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.engine import PodmanEngine
+from rhel_containers.engine import which
+from rhel_containers.steps import FAILED
+from rhel_containers.steps import Step
+from rhel_containers.steps import StepGraph
+
+# `podman exec NAME bash -c CMD` runs CMD locally; while $FAIL_FILE holds a positive count,
+# calls fail with engine error 125 and decrement it.
+FAKE_PODMAN = """#!/bin/bash
+if [ -n "$FAIL_FILE" ] && [ "$(cat "$FAIL_FILE")" -gt 0 ]; then
+    echo $(( $(cat "$FAIL_FILE") - 1 )) >"$FAIL_FILE"
+    echo "Error: cannot connect to Podman socket" >&2
+    exit 125
+fi
+[ "$1" = exec ] && { shift 2; exec "$@"; }
+echo "$1 ok"
+"""
+
+
+def _alive(pid):
+    # killed orphans may linger as zombies until reaped.
+    try:
+        with open(f"/proc/{pid}/stat") as fp:
+            return fp.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    podman = tmp_path / "podman"
+    podman.write_text(FAKE_PODMAN)
+    podman.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    which.cache_clear()
+    yield PodmanEngine(name="rhel-test")
+    which.cache_clear()
+
+
+def test_timeout_kills_process_group(engine, tmp_path):
+    pid_file = tmp_path / "pid"
+    start = time.monotonic()
+    out = engine.exec(f"sleep 30 & echo $! >{pid_file}; echo started; wait", timeout=0.5)
+
+    assert time.monotonic() - start < 5
+    assert out.timed_out and out.exit_status == TIMEOUT_STATUS
+    assert out.stdout == "started"
+    assert "Timed out after 0.5s" in out.stderr
+    time.sleep(0.1)
+    assert not _alive(int(pid_file.read_text()))
+
+
+def test_stream_and_transfer_deadlines(engine, tmp_path):
+    start = time.monotonic()
+    out = engine.exec_stream("echo started; sleep 30", timeout=0.5).wait()
+    assert out.timed_out and out.stdout == "started"
+
+    fifo = tmp_path / "fifo"
+    os.mkfifo(fifo)
+    # nobody writes the fifo; reading it blocks until killed.
+    with deadline(0.5):
+        out = engine.get_file(str(fifo), tmp_path / "dest")
+    assert out.timed_out and not (tmp_path / "dest").exists()
+    assert time.monotonic() - start < 5
+
+
+def test_deadline_propagates_to_steps(engine):
+    graph = StepGraph([Step("slow", ["sleep 30"]), Step("after", ["true"], requires=["slow"])])
+    start = time.monotonic()
+    with deadline(0.5):
+        out = graph.run(engine)
+        # already expired deadline doesn't even spawn the engine.
+        time.sleep(0.5)
+        assert engine.exec("true").timed_out
+
+    assert time.monotonic() - start < 5
+    assert out.steps["slow"].status == FAILED and out.steps["slow"].timed_out
+    assert out.skipped == ["after"]
+    assert not engine.exec("true").timed_out
+
+
+def test_retry_engine_errors(engine, tmp_path, monkeypatch):
+    fail_file = tmp_path / "fail"
+    monkeypatch.setenv("FAIL_FILE", str(fail_file))
+    engine.retry_policy = RetryPolicy(retries=2, backoff=0.01, jitter=0.5)
+
+    fail_file.write_text("2")
+    assert engine.exec("echo hi").stdout == "hi"
+
+    fail_file.write_text("3")
+    assert engine.exec("echo hi").exit_status == 125
+
+    # command failures are not retried.
+    fail_file.write_text("0")
+    assert engine.exec("exit 3").exit_status == 3
+
+
+def test_backoff():
+    policy = RetryPolicy(backoff=1, max_backoff=5, jitter=0.5)
+    for attempt, full in enumerate((1, 2, 4, 5, 5)):
+        assert full / 2 <= policy.delay(attempt) <= full
+
+
+def test_engine_errors():
+    def result(exit_status, stderr):
+        return ContCommandResult(exit_status=exit_status, stdout="", stderr=stderr)
+
+    assert RetryPolicy.is_engine_error(result(125, "Error: no such container"))
+    assert RetryPolicy.is_engine_error(
+        result(1, "The connection to the server api.ocp:6443 was refused")
+    )
+    assert not RetryPolicy.is_engine_error(result(7, "curl: (7) Connection refused"))
+    assert not RetryPolicy.is_engine_error(result(0, "Unable to connect to the server"))
+    # may happen while the command runs; retrying would run it twice.
+    assert not RetryPolicy.is_engine_error(result(1, "error: http2: client connection lost"))
@@ -0,0 +1,82 @@
+import json
+import time
+from collections import Counter
+
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.engine import OpenshiftEngine
+from rhel_containers.engine import PodmanEngine
+from rhel_containers.exception import RhelContainerException
+
+
+class ScriptedPodman(PodmanEngine):
+    """Podman whose event stream is a fixed list of lines."""
+
+    events = []
+
+    def _watch_command(self):
+        return ["printf", "%s\\n", *self.events]
+
+
+@pytest.fixture
+def spans():
+    calls = Counter()
+    hook = tracing.add_hook(lambda span: calls.update([span.name]))
+    yield calls
+    tracing.remove_hook(hook)
+
+
+def test_parse_event(stub_podman):
+    podman = PodmanEngine(name="rhel-ev")
+    assert podman._parse_event("start") == "running"
+    assert podman._parse_event("died") == "Exited"
+    assert podman._parse_event("create") is None
+    assert podman._parse_event("") is None
+    # podman and docker `--format json` events
+    assert podman._parse_event(json.dumps({"Name": "rhel-ev", "Status": "start"})) == "running"
+    assert podman._parse_event(json.dumps({"id": "abc", "status": "die"})) == "Exited"
+    assert podman._parse_event(json.dumps({"status": "pull"})) is None
+    assert podman._parse_event("{not json") is None
+
+    pod = OpenshiftEngine(name="rhel-ev")
+    assert pod._parse_event("Running ") == "running"
+    assert pod._parse_event("Pending ContainerCreating") is None
+    assert pod._parse_event("Pending ErrImagePull") == "ErrImagePull"
+    assert pod._parse_event("Failed ") == "Failed"
+
+
+@pytest.mark.parametrize("engine_name", ["podman", "kubectl"])
+def test_wait_running_watches_events(stub_podman, monkeypatch, spans, engine_name):
+    monkeypatch.setenv("RC_STUB_START_DELAY", "0.5")
+    rc = RhelContainer(name=f"rhel-watch-{engine_name}", engine_name=engine_name)
+    rc.start(wait=False)
+    assert rc.engine.wait_running(timeout=10)
+    # state came from the event stream, not from status polls.
+    assert spans["engine.inspect"] == spans["engine.get"] == 0
+
+    # already running before the watch starts: replayed events still tell so.
+    started = time.monotonic()
+    assert rc.engine.wait_running(timeout=10)
+    assert time.monotonic() - started < 1
+    rc.stop()
+
+
+@pytest.mark.parametrize("engine_name", ["podman", "kubectl"])
+def test_wait_running_falls_back_to_polling(stub_podman, monkeypatch, spans, engine_name):
+    monkeypatch.setenv("RC_STUB_START_DELAY", "0.5")
+    monkeypatch.setenv("RC_STUB_NO_WATCH", "rhel-poll-*")
+    rc = RhelContainer(name=f"rhel-poll-{engine_name}", engine_name=engine_name)
+    rc.start(wait=False)
+    assert rc.engine.wait_running(timeout=10)
+    assert spans["engine.inspect"] + spans["engine.get"] >= 1
+    rc.stop()
+
+
+def test_wait_running_terminal_event(stub_podman):
+    engine = ScriptedPodman(name="rhel-scripted")
+    engine.events = ["create", json.dumps({"status": "die"}), "start"]
+    with pytest.raises(RhelContainerException, match="rhel-scripted failed to start: Exited"):
+        engine.wait_running(timeout=5)
+    engine.events = ["create", "init", "start"]
+    assert engine.wait_running(timeout=5)
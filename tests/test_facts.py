@@ -0,0 +1,90 @@
+from collections import Counter
+
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.engine import PACKAGE_CHANGE_RE
+
+
+@pytest.fixture
+def execs():
+    commands = Counter()
+
+    def _count(span):
+        if span.name == "engine.exec":
+            commands.update(
+                ["exec"] + [name for name in ("release", "rpm -qa") if name in span.command]
+            )
+
+    hook = tracing.add_hook(_count)
+    yield commands
+    tracing.remove_hook(hook)
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "dnf install -y vim",
+        "yum -y remove emacs",
+        "microdnf update",
+        "rpm -ivh /tmp/x.rpm",
+        "rpm -e vim",
+        "python3 -m pip install ansible",
+        "cd /tmp && pip3 uninstall -y foo",
+    ],
+)
+def test_package_change_commands(cmd):
+    assert PACKAGE_CHANGE_RE.search(cmd)
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "rpm -qa --qf '%{NAME}\\n'",
+        "rpm -qi bash",
+        'rpm -q --whatprovides "$p"',
+        "dnf repolist",
+        "echo install",
+        "cat /etc/redhat-release",
+    ],
+)
+def test_read_only_commands(cmd):
+    assert not PACKAGE_CHANGE_RE.search(cmd)
+
+
+def test_facts_lifetime(stub_podman, execs):
+    rc = RhelContainer(name="rhel-facts")
+    rc.start(timeout=10)
+    assert rc.facts.stale and rc.facts.cached("arch") is None
+    arch = rc.facts.arch
+    assert arch and rc.is_pkg_installed("bash")
+    assert execs["exec"] == 1
+
+    # commands not touching packages keep all facts.
+    rc.exec("echo hello > greeting")
+    rc.exec_many(["true", "rpm -q bash"])
+    rc.engine.put_file("/tmp/rc-facts", data="x", checksum=False)
+    assert not rc.facts.stale
+    assert rc.facts.cached("packages") is not None
+
+    # package change: package facts reload alone, static ones are kept.
+    rc.exec("dnf install -y rc-test-pkg")
+    assert rc.facts.stale and not rc.facts.static_stale
+    assert rc.facts.cached("packages") is None and rc.facts.cached("arch") == arch
+    assert rc.is_pkg_installed("rc-test-pkg")
+    assert (execs["rpm -qa"], execs["release"]) == (2, 1)
+
+    # transactions change packages too.
+    rc.transaction().remove("rc-test-pkg").flush()
+    assert not rc.is_pkg_installed("rc-test-pkg")
+
+    rc.facts.invalidate()
+    assert rc.facts.stale and rc.facts.cached("hostname") is not None
+
+    # new container: everything is loaded again.
+    rc.stop()
+    rc.start(timeout=10)
+    assert rc.facts.static_stale
+    releases = execs["release"]
+    assert rc.facts.arch == arch and execs["release"] == releases + 1
+    rc.stop()
@@ -0,0 +1,48 @@
+from collections import Counter
+
+import pytest
+from rhel_containers import tracing
+from rhel_containers.admission import AdmissionController
+from rhel_containers.admission import parse_memory
+from rhel_containers.fleet import OpenshiftFleet
+
+from tests.test_admission import write_proc
+
+
+@pytest.fixture
+def stub_kubectl(stub_podman, monkeypatch):
+    monkeypatch.setenv("RC_STUB_START_DELAY", "0.3")
+    return stub_podman
+
+
+def test_openshift_fleet_bulk_status(stub_kubectl):
+    calls = Counter()
+    hook = tracing.add_hook(lambda span: calls.update([span.name]))
+    try:
+        fleet = OpenshiftFleet(count=5, name_prefix="rhel-fleet", poll_interval=0.1)
+        result = fleet.start(timeout=10)
+        states = fleet.states()
+        fleet.stop()
+    finally:
+        tracing.remove_hook(hook)
+
+    assert result.succeeded == [f"rhel-fleet-{i}" for i in range(5)]
+    assert states == {f"rhel-fleet-{i}": "Running" for i in range(5)}
+    assert calls["engine.run"] == 5
+    # pods are pending for a few polls; each poll is a single call for all of them.
+    assert 2 <= calls["engine.get"] < 5 * 2
+    assert calls["engine.delete"] == 1
+    assert fleet.states() == {}
+
+
+def test_openshift_fleet_stop_releases(stub_kubectl):
+    write_proc(stub_kubectl / "proc")
+    admission = AdmissionController(reserve_memory="1g", settle=60, proc=stub_kubectl / "proc")
+    fleet = OpenshiftFleet(count=3, name_prefix="rhel-rel", poll_interval=0.1, admission=admission)
+    fleet.start(timeout=10)
+    assert all(cont.admission_ticket is not None for cont in fleet)
+    assert admission.reserved_memory == 3 * parse_memory("1g")
+
+    fleet.stop()
+    assert all(cont.admission_ticket is None for cont in fleet)
+    assert admission.reserved_memory == 0
@@ -0,0 +1,132 @@
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers.image_cache import cache_key
+from rhel_containers.image_cache import CACHE_REPOSITORY
+from rhel_containers.image_cache import ImageCache
+from rhel_containers.image_cache import public_config
+from rhel_containers.steps import Step
+
+
+def test_cache_key_ignores_secrets():
+    conf = {"subscription": {"username": "u", "password": "p", "serverurl": "rhsm"}}
+    rotated = {"subscription": {"username": "x", "password": "y", "serverurl": "rhsm"}}
+    assert public_config(conf) == {"subscription": {"serverurl": "rhsm"}}
+
+    key = cache_key("ubi8:8.3", "8.3", "ci", ["insights-client"], conf)
+    assert key == cache_key("ubi8:8.3", "8.3", "ci", ["insights-client"], rotated)
+    assert key != cache_key("ubi8:8.3", "8.3", "qa", ["insights-client"], conf)
+    assert key != cache_key("ubi8:8.3", "8.3", "ci", ["python3"], conf)
+
+
+class CachedContainer(RhelContainer):
+    """Container whose ansible profile only records its options."""
+
+    def _ansible_steps(self, setup_ssh=True):
+        return [Step("ansible", [f"echo ssh={setup_ssh} >ansible"])]
+
+
+@pytest.fixture
+def stub_cache(stub_podman, monkeypatch):
+    # stub exec runs on this host: never stash its real secrets.
+    monkeypatch.setattr(ImageCache, "secret_paths", ())
+    monkeypatch.setattr(ImageCache, "stash", str(stub_podman / "shm" / "stash"))
+    yield stub_podman
+
+
+def test_profile_name(stub_cache):
+    rc = RhelContainer(name="rhel-names", image_cache=True)
+    assert rc.profile_name("ansible") == rc.profile_name("ansible", setup_ssh=True) == "ansible"
+    assert rc.profile_name("ansible", setup_ssh=False) == "ansible(setup_ssh=False)"
+    assert rc.profile_name("python", python="3") == "python"
+    assert rc.profile_name("python", python="3.9") == "python(python='3.9')"
+
+    default, no_ssh = rc._cached_image(["ansible"]), rc._cached_image(["ansible(setup_ssh=False)"])
+    assert default != no_ssh
+    assert default.startswith(f"{CACHE_REPOSITORY}:ansible-8.3-qa-")
+    assert no_ssh.startswith(f"{CACHE_REPOSITORY}:ansible-8.3-qa-")
+    assert rc.resource_limits("ansible(setup_ssh=False)") == rc.resource_limits("ansible")
+
+
+def test_cache_key_profile_config(stub_cache):
+    rc = RhelContainer(name="rhel-conf", image_cache=True)
+    other = RhelContainer(
+        name="rhel-conf",
+        image_cache=True,
+        config={
+            "RHEL_CONTAINERS": {
+                "admission": {"enabled": True},
+                "insights_client": {"auto_config": "False"},
+            }
+        },
+    )
+    # python images don't depend on admission or insights-client config.
+    assert rc._cached_image(["python"]) == other._cached_image(["python"])
+    assert rc._cached_image(["insights-client"]) != other._cached_image(["insights-client"])
+
+
+def test_commit_stashes_secrets(stub_cache):
+    rc = RhelContainer(name="rhel-commit", image_cache=True)
+    rc.start(timeout=10)
+    fs = stub_cache / "fs" / "rhel-commit"
+    fs.joinpath("etc", "pki", "consumer").mkdir(parents=True)
+    fs.joinpath("etc", "pki", "consumer", "cert.pem").write_text("cert")
+    fs.joinpath("etc", "insights-client", "machine-id").write_text("id")
+    fs.joinpath("etc", "keep").write_text("keep")
+    cache = rc.image_cache
+    cache.secret_paths = (
+        str(fs / "etc" / "pki" / "consumer"),
+        str(fs / "etc" / "insights-client" / "machine-id"),
+        str(fs / "var" / "lib" / "rhsm"),
+    )
+
+    image = f"{CACHE_REPOSITORY}:test-8.3-qa-0"
+    assert cache.commit(image).exit_status == 0
+    committed = stub_cache / "images" / rc.engine.image_id(image)
+    # secrets left out of the image (directories kept empty) and restored in container.
+    assert committed.joinpath("etc", "keep").read_text() == "keep"
+    assert list(committed.joinpath("etc", "pki", "consumer").iterdir()) == []
+    assert not committed.joinpath("etc", "insights-client", "machine-id").exists()
+    assert fs.joinpath("etc", "pki", "consumer", "cert.pem").read_text() == "cert"
+    assert fs.joinpath("etc", "insights-client", "machine-id").read_text() == "id"
+    assert not (stub_cache / "shm" / "stash").exists()
+    assert [entry["profiles"] for entry in cache.list(release="8.3")] == [["test"]]
+
+    # stash that can't be written: nothing committed, secrets stay put.
+    cache.stash = str(fs / "etc" / "keep" / "stash")
+    other = f"{CACHE_REPOSITORY}:test-8.3-qa-1"
+    assert cache.commit(other).exit_status != 0
+    assert not cache.exists(other)
+    assert fs.joinpath("etc", "pki", "consumer", "cert.pem").read_text() == "cert"
+
+    assert cache.prune() == [image] and cache.list() == []
+    rc.stop()
+
+
+def test_start_from_cache(stub_cache):
+    def container(name):
+        rc = CachedContainer(name=name, image_cache=True)
+        rc.start(timeout=10, profile="ansible")
+        return rc, stub_cache / "fs" / name
+
+    rc, _ = container("rhel-cache-a")
+    assert rc.cached_profiles == ()
+    assert rc.setup_ansible(setup_ssh=False).exit_status == 0
+    rc.stop()
+
+    # image of `setup_ssh=False` isn't taken for the default profile.
+    rc, fs = container("rhel-cache-b")
+    assert rc.cached_profiles == ()
+    assert rc.setup_ansible().exit_status == 0
+    assert fs.joinpath("ansible").read_text() == "ssh=True\n"
+    rc.stop()
+    assert len(rc.image_cache.list(profile="ansible")) == 2
+
+    rc = CachedContainer(name="rhel-cache-c", image_cache=True)
+    rc.start(timeout=10, profile=rc.profile_name("ansible", setup_ssh=False))
+    assert rc.cached_profiles == ("ansible(setup_ssh=False)",)
+    fs = stub_cache / "fs" / "rhel-cache-c"
+    assert fs.joinpath("ansible").read_text() == "ssh=False\n"
+    assert "restored from image cache" in rc.setup_ansible(setup_ssh=False).stdout
+    assert rc.setup_ansible().exit_status == 0
+    assert fs.joinpath("ansible").read_text() == "ssh=True\n"
+    rc.stop()
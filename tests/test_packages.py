@@ -0,0 +1,63 @@
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers.packages import ALREADY_INSTALLED
+from rhel_containers.packages import FAILED
+from rhel_containers.packages import INSTALLED
+from rhel_containers.packages import NOT_INSTALLED
+from rhel_containers.packages import REMOVED
+
+# the stub's rpm knows bash, rpm and python3 plus whatever its dnf installed; rc-missing-*
+# packages are in no repo.
+
+
+@pytest.fixture
+def rc(stub_podman):
+    rc = RhelContainer(name="rhel-txn")
+    rc.start(timeout=10)
+    yield rc
+    rc.stop()
+
+
+def test_transaction_outcomes(rc):
+    with rc.transaction() as txn:
+        txn.install("rc-test-pkg", "bash", "/tmp/rc-local.rpm").remove("rc-gone")
+    assert txn.result.outcomes == {
+        "bash": ALREADY_INSTALLED,
+        "rc-gone": NOT_INSTALLED,
+        "rc-test-pkg": INSTALLED,
+        "/tmp/rc-local.rpm": INSTALLED,
+    }
+    assert txn.result.exit_status == 0
+    # transaction, then one `rpm -q --whatprovides` pass over packages acted on.
+    assert [out.command for out in txn.result.results] == [
+        f"{rc.pkg_mng} install -y rc-test-pkg /tmp/rc-local.rpm",
+        'for p in rc-test-pkg; do rpm -q --whatprovides "$p" >/dev/null && echo "$p"; '
+        "done; true",
+    ]
+
+    result = rc.transaction().install("rc-test-pkg").flush()
+    assert result.outcomes == {"rc-test-pkg": ALREADY_INSTALLED} and result.results == []
+    result = rc.transaction().remove("rc-test-pkg").flush()
+    assert result.outcomes == {"rc-test-pkg": REMOVED}
+    assert not rc.is_pkg_installed("rc-test-pkg")
+
+
+def test_transaction_failures(rc):
+    result = rc.transaction().install("rc-test-a", "rc-missing-x").remove("bash").flush()
+    assert result.outcomes == {"rc-test-a": FAILED, "rc-missing-x": FAILED, "bash": FAILED}
+    assert result.exit_status == 1 and len(result.failed) == 3
+    assert "Unable to find a match: rc-missing-x" in result.stderr
+
+    result = rc.transaction(skip_broken=True).install("rc-test-a", "rc-missing-x").flush()
+    assert result.outcomes == {"rc-test-a": INSTALLED, "rc-missing-x": FAILED}
+    assert result.failed == ["rc-missing-x"]
+
+
+def test_transaction_commands(rc):
+    txn = rc.transaction().install("bash", "rc-test-b").remove("rc-gone")
+    # without facts nothing is known to be skipped.
+    assert txn.commands() == [
+        f"{rc.pkg_mng} remove -y rc-gone",
+        f"{rc.pkg_mng} install -y bash rc-test-b",
+    ]
+    assert txn.commands(load=True) == [f"{rc.pkg_mng} install -y rc-test-b"]
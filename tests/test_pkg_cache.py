@@ -0,0 +1,45 @@
+import fcntl
+import os
+import subprocess
+import sys
+
+from rhel_containers.pkg_cache import PackageCache
+
+
+def _write(path, size, atime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (atime, atime))
+
+
+def test_evict_oldest_packages_first(tmp_path):
+    cache = PackageCache(path=tmp_path, release="8.3", max_size=1)
+    cache.volumes()
+    mib = 1024 * 1024
+    repodata = cache.pkg_dir / "ubi-8-baseos" / "repodata" / "primary.xml.gz"
+    old_rpm = cache.pkg_dir / "ubi-8-baseos" / "packages" / "old.rpm"
+    new_rpm = cache.pkg_dir / "ubi-8-baseos" / "packages" / "new.rpm"
+    _write(repodata, mib // 2, atime=1)
+    _write(old_rpm, mib // 4, atime=2)
+    _write(new_rpm, mib * 3 // 4, atime=3)
+
+    assert cache.evict() == 2
+    assert repodata.exists()
+    assert not old_rpm.exists() and not new_rpm.exists()
+
+
+def test_evict_skipped_while_locked(tmp_path):
+    cache = PackageCache(path=tmp_path, release="8.3", max_size=0)
+    cache.volumes()
+    _write(cache.pkg_dir / "pkg.rpm", 10, atime=1)
+    with cache.lock_path.open() as lock:
+        # a container running dnf holds the same lock through the volume.
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        assert cache.evict() == 0
+    assert cache.evict() == 1
+
+
+def test_import_without_fcntl():
+    # as on Windows: locking is POSIX only, importing the package must still work.
+    code = "import sys; sys.modules['fcntl'] = None; from rhel_containers import RhelContainer"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
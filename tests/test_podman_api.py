@@ -0,0 +1,306 @@
+import io
+import json
+import posixpath
+import socketserver
+import struct
+import subprocess
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers.deadline import RetryPolicy
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.podman_api import PodmanAPIEngine
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Docker compatible API of podman."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b"", content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _route(self, method):
+        state = self.server.state
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.split("/")[2:]
+        body = self._body()
+
+        if parts == ["events"]:
+            return self._reply(200, b'{"status": "create"}\n{"status": "start"}\n')
+        if parts == ["containers", "create"]:
+            state["containers"][query["name"]] = {"files": {}}
+            return self._reply(201, {"Id": "c0ffee"})
+        if parts[0] == "containers" and parts[1] not in state["containers"]:
+            return self._reply(404, {"message": f"no container with name {parts[1]}"})
+        if parts[0] == "containers" and parts[2:] in (["start"], ["stop"]):
+            return self._reply(204)
+        if parts[0] == "containers" and parts[2:] == ["json"]:
+            return self._reply(200, {"State": {"Status": "running"}})
+        if parts[0] == "containers" and parts[2:] == ["exec"] and state["fail_exec"]:
+            state["fail_exec"] -= 1
+            return self._reply(500, {"message": "runtime busy"})
+        if parts[0] == "containers" and parts[2:] == ["exec"]:
+            state["execs"].append(json.loads(body)["Cmd"])
+            return self._reply(201, {"Id": str(len(state["execs"]) - 1)})
+        if parts[0] == "exec" and parts[2:] == ["start"]:
+            out = subprocess.run(state["execs"][int(parts[1])], capture_output=True)
+            state["exit"] = out.returncode
+            stream = b"".join(
+                struct.pack(">BxxxL", kind, len(data)) + data
+                for kind, data in [(1, out.stdout), (2, out.stderr)]
+                if data
+            )
+            return self._reply(200, stream, "application/vnd.docker.multiplexed-stream")
+        if parts[0] == "exec" and parts[2:] == ["json"]:
+            return self._reply(200, {"ExitCode": state["exit"]})
+        if parts == ["images", "json"]:
+            reference = json.loads(query["filters"])["reference"][0]
+            return self._reply(
+                200,
+                [
+                    image
+                    for image in state["images"]
+                    if any(
+                        tag.partition(":")[0] == reference or tag == reference
+                        for tag in image["RepoTags"]
+                    )
+                ],
+            )
+        if parts[0] == "containers" and parts[2:] == ["archive"]:
+            if query["path"] in state["archives"]:
+                return self._reply(200, state["archives"][query["path"]], "application/x-tar")
+            files = state["containers"][parts[1]]["files"]
+            if method == "PUT":
+                with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+                    for member in tar:
+                        path = posixpath.join(query["path"], member.name)
+                        files[path] = tar.extractfile(member).read()
+                return self._reply(200)
+            data = files[query["path"]]
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w") as tar:
+                info = tarfile.TarInfo(query["path"].rsplit("/", 1)[-1])
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            return self._reply(200, buffer.getvalue(), "application/x-tar")
+        return self._reply(404, {"message": "not found"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+
+class FakeAPIServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, FakeAPIHandler)
+        self.state = {
+            "containers": {},
+            "execs": [],
+            "exit": None,
+            "fail_exec": 0,
+            "images": [],
+            "archives": {},
+        }
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def api_server(tmp_path):
+    server = FakeAPIServer(str(tmp_path / "podman.sock"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def rc_api(api_server):
+    return RhelContainer(engine_name="podman-api", socket_path=api_server.server_address)
+
+
+def test_api_run_exec_status(api_server, rc_api):
+    assert rc_api.start().exit_status == 0
+    assert rc_api.status == "Running"
+
+    out = rc_api.exec("echo foo; echo bar >&2; exit 3")
+    assert (out.exit_status, out.stdout, out.stderr) == (3, "foo", "bar")
+    results = rc_api.exec_many(["echo a", "false", "echo c"], stop_on_failure=True)
+    assert [r.exit_status for r in results] == [0, 1]
+
+    assert rc_api.stop().exit_status == 0
+    # every call went over one keep-alive connection, plus one for the event stream
+    assert api_server.connections == 2
+
+
+def test_api_archive(api_server, rc_api, tmp_path):
+    rc_api.start(wait=False)
+    host_file = tmp_path / "host.txt"
+    host_file.write_text("some $content\nEOF\n")
+
+    assert rc_api.copy_to_cont(host_path=str(host_file), cont_path="/tmp/cont.txt").exit_status == 0
+    out = rc_api.copy_to_host(cont_path="/tmp/cont.txt", host_path=str(tmp_path / "back.txt"))
+    assert out.exit_status == 0
+    assert (tmp_path / "back.txt").read_text() == host_file.read_text()
+
+    rc_api.add_file("/etc/foo.conf", "[foo]\nbar=$baz", overwrite=True)
+    files = api_server.state["containers"][rc_api.name]["files"]
+    assert files["/etc/foo.conf"] == b"[foo]\nbar=$baz\n"
+
+    out = rc_api.engine.put_files({"/etc/a.bin": b"\x00EOF", "/etc/b/c": "c"}, checksum=False)
+    assert out.stdout.split() == ["/etc/a.bin", "/etc/b/c"]
+    assert files["/etc/a.bin"] == b"\x00EOF"
+    back = io.BytesIO()
+    assert rc_api.engine.get_file("/etc/b/c", back).exit_status == 0
+    assert back.getvalue() == b"c"
+
+
+def test_api_unavailable(rc_api):
+    assert "unavailable" in rc_api.status
+    assert rc_api.exec("true").exit_status == 125
+
+
+def test_api_exec_stream(rc_api):
+    rc_api.start(wait=False)
+    seen = []
+    stream = rc_api.exec_stream(
+        "seq 5; echo oops >&2; exit 2",
+        callback=lambda name, line: seen.append((name, line)),
+        tail=2,
+    )
+    assert list(stream) == seen
+    assert ("stderr", "oops\n") in seen
+    assert (stream.result.exit_status, stream.result.stdout) == (2, "4\n5")
+
+
+def test_api_deadline_and_retry(api_server, rc_api):
+    rc_api.start(wait=False)
+    rc_api.engine.retry_policy = RetryPolicy(retries=2, backoff=0.01, jitter=0)
+    api_server.state["fail_exec"] = 2
+    assert rc_api.exec("echo ok").stdout == "ok"
+    assert len(api_server.state["execs"]) == 1
+
+    started = time.monotonic()
+    out = rc_api.engine.exec("sleep 3", timeout=0.5)
+    assert out.timed_out and time.monotonic() - started < 2
+    # the command started; it isn't run again.
+    assert len(api_server.state["execs"]) == 2
+    assert rc_api.exec("echo again").stdout == "again"
+
+
+def test_api_rejects_session(api_server):
+    with pytest.raises(RhelContainerException, match="Shell sessions"):
+        RhelContainer(engine_name="podman-api", socket_path=api_server.server_address, session=True)
+
+
+def test_api_exec_stream_timeout(rc_api):
+    rc_api.start(wait=False)
+    started = time.monotonic()
+    out = rc_api.exec_stream("sleep 3", timeout=0.5).wait()
+    assert out.timed_out and time.monotonic() - started < 2
+
+
+def test_api_exec_pipe(rc_api):
+    rc_api.start(wait=False)
+    with rc_api.engine.exec_pipe("head -c 200000 /dev/zero; echo oops >&2; exit 3") as pipe:
+        data = pipe.stdout.read()
+    assert data == b"\0" * 200000
+    assert (pipe.result.exit_status, pipe.result.stderr) == (3, "oops")
+
+
+def _tar(*members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, linkname in members:
+            info = tarfile.TarInfo(name)
+            if linkname:
+                info.type, info.linkname = tarfile.SYMTYPE, linkname
+                tar.addfile(info)
+            else:
+                info.size = 2
+                tar.addfile(info, io.BytesIO(b"ok"))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("data_filter", [True, False])
+def test_api_cp_refuses_escaping_members(api_server, rc_api, tmp_path, monkeypatch, data_filter):
+    if not data_filter:
+        monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    rc_api.start(wait=False)
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    archives = api_server.state["archives"]
+    archives["/data"] = _tar(("data/sub/file", None))
+    archives["/evil"] = _tar(("../escaped", None))
+    archives["/link"] = _tar(("link", "/etc"), ("link/passwd", None))
+
+    assert rc_api.engine.cp(f"{rc_api.name}:/data", str(dest)).exit_status == 0
+    assert (dest / "data" / "sub" / "file").read_bytes() == b"ok"
+    for path in ("/evil", "/link"):
+        assert rc_api.engine.cp(f"{rc_api.name}:{path}", str(dest)).exit_status == 125
+    assert not (tmp_path / "escaped").exists() and not (dest / "link").exists()
+
+
+def test_api_images(api_server, rc_api):
+    api_server.state["images"] = [
+        {"Id": "sha256:1", "RepoTags": ["rhel-cache:a", "rhel-cache:b"], "Created": 1},
+        {"Id": "sha256:2", "RepoTags": ["other:latest"]},
+    ]
+    assert rc_api.engine.image_id("rhel-cache:b") == "sha256:1"
+    assert rc_api.engine.image_id("missing:latest") is None
+    assert rc_api.engine.images("rhel-cache") == [
+        ("rhel-cache:a", "sha256:1", "1"),
+        ("rhel-cache:b", "sha256:1", "1"),
+    ]
+
+
+def test_api_socket_gone(tmp_path):
+    # failing requests are results, so status polling of wait_running keeps going.
+    engine = PodmanAPIEngine(name="rhel-gone", socket_path=str(tmp_path / "missing.sock"))
+    assert engine.status == "rhel-gone unavailable."
+    assert engine.image_id("ubi8") is None and engine.images("rhel-cache") == []
+    engine.started_at = time.time()
+    assert engine.wait_running(timeout=1) is False
+
+
+def test_api_exec_frees_connection(api_server, rc_api):
+    rc_api.start(wait=False)
+    slow = threading.Thread(target=rc_api.exec, args=("sleep 2",))
+    slow.start()
+    time.sleep(0.3)
+    started = time.monotonic()
+    # other calls go over another connection while exec start waits for the command.
+    assert rc_api.status == "Running"
+    assert rc_api.exec("echo quick").stdout == "quick"
+    assert time.monotonic() - started < 1
+    slow.join()
@@ -0,0 +1,39 @@
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.pool import ContainerPool
+
+
+def test_pool_gives_up_provisioning(stub_podman, monkeypatch):
+    starts = []
+
+    def start(self, *args, **kwargs):
+        starts.append(self.name)
+        raise RhelContainerException("registry unreachable")
+
+    monkeypatch.setattr(RhelContainer, "start", start)
+    with ContainerPool(size=1, max_failures=3, retry_delay=0.01) as pool:
+        # waits forever without timeout unless the pool gives up.
+        with pytest.raises(RhelContainerException, match="registry unreachable"):
+            pool.acquire()
+        with pytest.raises(RhelContainerException, match="gave up"):
+            pool.acquire(timeout=1)
+    assert len(starts) == 3
+    assert pool.ready == 0
+
+
+def test_pool_discards_container_failing_reset(stub_podman, monkeypatch):
+    with ContainerPool(size=1, workers=1) as pool:
+        cont = pool.acquire(timeout=10)
+        name = cont.name
+
+        def broken(*args, **kwargs):
+            raise OSError("exec failed")
+
+        monkeypatch.setattr(cont, "exec_many", broken)
+        pool.release(cont)
+        # single worker: reset is done once a later job runs.
+        pool._executor.submit(lambda: None).result(timeout=10)
+        cont = pool.acquire(timeout=10)
+        assert cont.name != name and cont.status == "Running"
+        assert not stub_podman.joinpath("state", name).exists()
@@ -0,0 +1,99 @@
+import calendar
+import threading
+import time
+
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.reg_cache import parse_not_after
+from rhel_containers.reg_cache import RegistrationCache
+from rhel_containers.reg_cache import RESTORED
+
+
+def _config(tmp_path, password="p"):
+    # the stub runs container commands in its container directory, so paths are relative.
+    return {
+        "RHEL_CONTAINERS": {
+            "subscription": {"username": "u", "password": password},
+            "registration_cache": {
+                "enabled": True,
+                "path": str(tmp_path / "registrations"),
+                "paths": ["etc/pki/consumer", "etc/pki/entitlement"],
+            },
+        }
+    }
+
+
+def test_parse_not_after():
+    text = "notAfter=Oct 17 12:00:00 2030 GMT\nnotAfter=Jan  2 00:00:00 2029 GMT\n"
+    assert parse_not_after(text) == calendar.timegm((2029, 1, 2, 0, 0, 0))
+    assert parse_not_after("unable to load certificate") is None
+
+
+def test_registration_reused(stub_podman):
+    spans = []
+    hook = tracing.add_hook(spans.append)
+    try:
+        outs = []
+        for i, password in enumerate(("p", "p", "other")):
+            rc = RhelContainer(name=f"rhel-reg-{i}", config=_config(stub_podman, password))
+            rc.start(wait=False)
+            outs.append(rc.subscription.register())
+    finally:
+        tracing.remove_hook(hook)
+
+    registrations = [s for s in spans if s.command and "subscription-manager register" in s.command]
+    # second container got certificates injected, other credentials register again.
+    assert len(registrations) == 2
+    assert [out.stdout == RESTORED for out in outs] == [False, True, False]
+    cert = stub_podman.joinpath("fs", "rhel-reg-1", "etc", "pki", "consumer", "key.pem")
+    assert cert.read_text() == "key\n"
+    assert cert.stat().st_mode & 0o777 == 0o600
+
+
+def test_injection_takes_no_lock(stub_podman):
+    rc = RhelContainer(name="rhel-reg-first", config=_config(stub_podman))
+    rc.start(wait=False)
+    assert rc.subscription.register().exit_status == 0
+    cache = rc.registration_cache
+    key = cache.key("qa", {**rc.config.subscription, "auto_attach": True})
+
+    # a registration of the same identity in progress elsewhere holds the lock.
+    lock = cache._lock(key)
+    outs = []
+    try:
+        rc = RhelContainer(name="rhel-reg-second", config=_config(stub_podman))
+        rc.start(wait=False)
+        injecting = threading.Thread(target=lambda: outs.append(rc.subscription.register()))
+        injecting.start()
+        injecting.join(10)
+    finally:
+        cache._unlock(lock)
+    assert [out.stdout for out in outs] == [RESTORED]
+
+
+def test_expiry(tmp_path):
+    cache = RegistrationCache(tmp_path, max_age=60, min_validity=10)
+    entry = tmp_path / "key"
+    entry.mkdir()
+    meta = entry / "meta.json"
+    now = time.time()
+    meta.write_text(f'{{"created": {now}, "not_after": {now + 3600}, "files": {{}}}}')
+    assert cache.is_valid("key")
+    assert not cache.is_valid("key", now=now + 120)
+    meta.write_text(f'{{"created": {now}, "not_after": {now + 5}, "files": {{}}}}')
+    assert not cache.is_valid("key")
+    cache.invalidate("key")
+    assert not cache.is_valid("key")
+
+
+def test_identity_key_is_keyed(tmp_path):
+    config = {"username": "u", "password": "p"}
+    cache = RegistrationCache(tmp_path / "a")
+    key = cache.key("qa", config)
+    assert key == cache.key("qa", config)
+    assert key != cache.key("qa", {**config, "password": "other"})
+    # another host secret gives another key; the password can't be tested offline.
+    assert key != RegistrationCache(tmp_path / "b").key("qa", config)
+    secret = tmp_path / "a" / ".secret"
+    assert secret.stat().st_mode & 0o777 == 0o600
+    assert (tmp_path / "a").stat().st_mode & 0o777 == 0o700
@@ -0,0 +1,82 @@
+import io
+
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers.engine import which
+from rhel_containers.exception import RhelContainerException
+from rhel_containers.replay import ReplayDivergence
+
+# `podman exec NAME bash -c CMD` runs CMD locally; everything else just succeeds.
+FAKE_PODMAN = """#!/bin/bash
+[ "$1" = exec ] && { shift 2; exec "$@"; }
+echo "$1 ok"
+"""
+CONFIG = {"RHEL_CONTAINERS": {"subscription": {"username": "u", "password": "s3cret"}}}
+
+
+@pytest.fixture
+def fake_podman(tmp_path, monkeypatch):
+    podman = tmp_path / "podman"
+    podman.write_text(FAKE_PODMAN)
+    podman.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    which.cache_clear()
+    yield
+    which.cache_clear()
+
+
+def _flow(rc):
+    return [
+        rc.start(wait=False).stdout,
+        rc.exec("echo password=s3cret").stdout,
+        [out.stdout for out in rc.exec_many(["echo a", "echo b >&2"])],
+        rc.stop().exit_status,
+    ]
+
+
+def test_record_replay(tmp_path, fake_podman):
+    recording = tmp_path / "session.jsonl.gz"
+    recorded = _flow(RhelContainer(name="rhel-rec", record=recording, config=CONFIG))
+    assert recorded == ["run ok", "password=s3cret", ["a", ""], 0]
+
+    rc = RhelContainer(engine_name="replay", recording=recording, config=CONFIG)
+    assert _flow(rc) == ["run ok", "password=***", ["a", ""], 0]
+    assert rc.engine.remaining == 0
+
+    rc = RhelContainer(engine_name="replay", recording=recording, config=CONFIG)
+    rc.start(wait=False)
+    with pytest.raises(ReplayDivergence):
+        rc.exec("echo other")
+
+
+def _streams(rc):
+    stream = rc.exec_stream("echo one; echo two >&2; echo three")
+    # stdout and stderr are read apart; only order within a stream is kept.
+    lines = sorted((name, line.strip()) for name, line in stream)
+    with rc.engine.exec_pipe("printf 'raw\\0data'") as pipe:
+        data = pipe.stdout.read()
+    buffer = io.BytesIO()
+    rc.engine.get_file("/etc/hostname", buffer)
+    return [lines, stream.result.exit_status, data, pipe.result.exit_status, buffer.getvalue()]
+
+
+def test_record_replay_streams(tmp_path, fake_podman):
+    recording = tmp_path / "streams.jsonl"
+    recorded = _streams(RhelContainer(name="rhel-rec", record=recording, config=CONFIG))
+    lines = [("stderr", "two"), ("stdout", "one"), ("stdout", "three")]
+    assert recorded[:4] == [lines, 0, b"raw\0data", 0]
+    assert recorded[4] == open("/etc/hostname", "rb").read()
+
+    # fake podman gone: replay runs no engine at all.
+    (tmp_path / "podman").unlink()
+    rc = RhelContainer(engine_name="replay", recording=recording, config=CONFIG)
+    assert _streams(rc) == recorded
+    assert rc.engine.remaining == 0
+
+
+def test_record_replay_reject_session(tmp_path, fake_podman):
+    recording = tmp_path / "session.jsonl"
+    with pytest.raises(RhelContainerException, match="Shell sessions"):
+        RhelContainer(record=recording, session=True)
+    with pytest.raises(RhelContainerException, match="Recording is not supported"):
+        RhelContainer(engine_name="podman-api", record=recording)
@@ -0,0 +1,37 @@
+import os
+import subprocess
+
+from rhel_containers.engine import ContCommandResult
+
+
+def _result(stdout, stderr=b"", returncode=0):
+    return ContCommandResult.from_subprocess_out(
+        subprocess.CompletedProcess(["podman", "exec", "rhel", "true"], returncode, stdout, stderr)
+    )
+
+
+def test_lazy_decoding():
+    out = _result(b" caf\xc3\xa9 \n\xff\n")
+    assert out.stdout_bytes == b" caf\xc3\xa9 \n\xff\n"
+    assert out.stdout == "café \n�"
+    assert out.decode(encoding="latin-1")[0] == "cafÃ© \nÿ"
+    assert out.stderr == ""
+    assert out.command == "podman exec rhel true"
+    assert out.output_size == 10
+    assert not hasattr(out, "__dict__")
+
+    out.stdout = "replaced"
+    assert (out.stdout, out.stdout_bytes) == ("replaced", b"replaced")
+
+
+def test_spill_to_disk(monkeypatch):
+    monkeypatch.setattr(ContCommandResult, "spill_size", 16)
+    out = _result(b"x" * 100, b"short")
+    assert out.spilled
+    path = out._stdout.path
+    assert os.path.getsize(path) == 100
+    assert out.stdout == "x" * 100
+    assert (out.stderr, out.output_size) == ("short", 105)
+
+    del out
+    assert not os.path.exists(path)
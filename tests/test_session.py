@@ -0,0 +1,98 @@
+import subprocess
+import time
+
+from rhel_containers import RhelContainer
+from rhel_containers.deadline import deadline
+from rhel_containers.session import frame_commands
+from rhel_containers.session import frames_to_results
+from rhel_containers.session import read_frames
+from rhel_containers.session import ShellSession
+
+# local bash stands in for an engine exec of an interactive shell.
+MARKER = "__RHEL_CONT_test__"
+
+
+def _run_framed(cmds, stop_on_failure=False):
+    script = frame_commands(cmds, MARKER, stop_on_failure=stop_on_failure)
+    out = subprocess.run(["bash", "-c", script], capture_output=True, text=True)
+    stdout_frames, complete = read_frames(out.stdout.splitlines(keepends=True), MARKER)
+    stderr_frames, _ = read_frames(out.stderr.splitlines(keepends=True), MARKER)
+    return frames_to_results(cmds, stdout_frames, stderr_frames), complete
+
+
+def test_frames():
+    cmds = [
+        "printf 'no newline'",
+        f"echo 'said {MARKER} 0 0'; echo err >&2; exit 4",
+        "echo after",
+    ]
+    results, complete = _run_framed(cmds)
+    assert complete
+    assert [(out.exit_status, out.stdout, out.stderr) for out in results] == [
+        (0, "no newline", ""),
+        # marker within a line of user output is output, not a frame boundary.
+        (4, f"said {MARKER} 0 0", "err"),
+        (0, "after", ""),
+    ]
+    assert [out.command for out in results] == cmds
+
+    results, complete = _run_framed(cmds, stop_on_failure=True)
+    assert complete and [out.exit_status for out in results] == [0, 4]
+
+
+def test_read_frames_incomplete():
+    lines = ["a\n", f"{MARKER} 0 0\n", "partial\n"]
+    assert read_frames(lines, MARKER) == ([("a", 0)], False)
+    assert read_frames([f"{MARKER} end\n"], MARKER) == ([], True)
+
+
+def test_exec_many_batch(stub_podman):
+    rc = RhelContainer(name="rhel-batch")
+    rc.start(timeout=10)
+    try:
+        outs = rc.exec_many(["echo a", "echo b >&2; exit 2", "echo c"])
+        assert [(out.exit_status, out.stdout, out.stderr) for out in outs] == [
+            (0, "a", ""),
+            (2, "", "b"),
+            (0, "c", ""),
+        ]
+        outs = rc.exec_many(["echo a", "exit 2", "echo c"], stop_on_failure=True)
+        assert [out.exit_status for out in outs] == [0, 2]
+        # batch shell killed mid-batch: finished commands, then the engine result.
+        outs = rc.exec_many(["echo a", "kill -9 $PPID", "echo never"])
+        assert [out.stdout for out in outs[:1]] == ["a"]
+        assert len(outs) == 2 and outs[-1].exit_status != 0
+        assert outs[-1].command.startswith("podman exec rhel-batch")
+    finally:
+        rc.stop()
+
+
+def test_session_runs_commands():
+    session = ShellSession(["bash"]).start()
+    try:
+        outs = session.run_many(["echo a", "echo b >&2; exit 3", "echo c"], stop_on_failure=True)
+        assert [(out.exit_status, out.stdout, out.stderr) for out in outs] == [
+            (0, "a", ""),
+            (3, "", "b"),
+        ]
+    finally:
+        session.close()
+
+
+def test_hung_command_resets_session():
+    session = ShellSession(["bash"], timeout=0.5).start()
+    try:
+        first_proc = session._proc
+        started = time.monotonic()
+        outs = session.run_many(["echo done", "sleep 30", "echo never"])
+        assert time.monotonic() - started < 5
+        assert [out.stdout for out in outs[:1]] == ["done"]
+        assert outs[-1].timed_out and len(outs) == 2
+        # killed along with its children and replaced by a fresh shell.
+        assert first_proc.poll() is not None
+        assert session.alive and session.run("echo again").stdout == "again"
+
+        with deadline(0.3):
+            assert session.run("sleep 30", timeout=60).timed_out
+    finally:
+        session.close()
@@ -0,0 +1,58 @@
+import json
+from collections import Counter
+
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.status import parse_ps
+from rhel_containers.status import StatusProvider
+
+PODMAN_PS = [
+    {
+        "Names": ["rhel-a"],
+        "State": "running",
+        "Status": "Up 5 minutes (healthy)",
+        "ExitCode": 0,
+        "StartedAt": 1700000000,
+        "Labels": {"app": "rhel"},
+    },
+    {"Names": ["rhel-b"], "State": "exited", "Status": "Exited (3) 1 minute ago", "ExitCode": 3},
+]
+DOCKER_PS = [
+    {"Names": "rhel-c", "State": "exited", "Status": "Exited (137) 2 hours ago", "Labels": ""},
+    {"Names": "rhel-d", "State": "running", "Status": "Up 1 second (health: starting)"},
+]
+
+
+def test_parse_ps():
+    states = parse_ps(json.dumps(PODMAN_PS))
+    assert states["rhel-a"].running
+    assert (states["rhel-a"].health, states["rhel-a"].started_at) == ("healthy", 1700000000)
+    assert states["rhel-a"].exit_code is None
+    assert (states["rhel-b"].status, states["rhel-b"].exit_code) == ("Exited", 3)
+
+    states = parse_ps("\n".join(json.dumps(entry) for entry in DOCKER_PS))
+    assert (states["rhel-c"].status, states["rhel-c"].exit_code) == ("Exited", 137)
+    assert states["rhel-d"].health == "starting"
+    assert parse_ps("") == {}
+
+
+def test_shared_status_provider(stub_podman):
+    provider = StatusProvider(engine="podman", name_prefix="rhel-st-", ttl=60)
+    conts = [RhelContainer(name=f"rhel-st-{i}", status_provider=provider) for i in range(5)]
+    calls = Counter()
+    hook = tracing.add_hook(lambda span: calls.update([span.name]))
+    try:
+        for cont in conts:
+            cont.start(wait=False)
+        statuses = [cont.engine.status for cont in conts]
+        conts[0].stop()
+        after_stop = conts[0].engine.status
+    finally:
+        tracing.remove_hook(hook)
+
+    assert statuses == ["Running"] * 5
+    assert after_stop == "rhel-st-0 unavailable."
+    # one `ps` for five containers, one more after stop dropped the snapshot.
+    assert calls["engine.ps"] == 2
+    assert "engine.inspect" not in calls
+    assert conts[1].engine.state.running
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.steps import FAILED
+from rhel_containers.steps import SKIPPED
+from rhel_containers.steps import Step
+from rhel_containers.steps import StepGraph
+from rhel_containers.steps import SUCCEEDED
+
+
+class FakeEngine:
+    """Engine running each command as a sleep; `fail` commands exit 1."""
+
+    name = "rhel-test"
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _result(self, cmd):
+        return ContCommandResult(exit_status=1 if cmd == "fail" else 0, stdout=cmd, stderr="")
+
+    def exec_many(self, cmds, stop_on_failure=False):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        return [self._result(cmd) for cmd in cmds]
+
+
+class AsyncFakeEngine(FakeEngine):
+    async def exec_many(self, cmds, stop_on_failure=False):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return [self._result(cmd) for cmd in cmds]
+
+
+def graph(packages_cmd="dnf"):
+    return StepGraph(
+        [
+            Step("register", ["register"], requires=["packages", "configure"]),
+            Step("packages", [packages_cmd]),
+            Step("configure", ["configure"]),
+            Step("enable", ["enable"], requires=["register"]),
+        ]
+    )
+
+
+def test_independent_steps_overlap():
+    engine = FakeEngine()
+    start = time.perf_counter()
+    out = graph().run(engine)
+    elapsed = time.perf_counter() - start
+
+    assert out.exit_status == 0
+    assert engine.max_running == 2
+    # packages and configure together, then register, then enable.
+    assert elapsed < 4 * engine.delay
+    assert list(out.steps)[-1] == "enable"
+    assert all(result.status == SUCCEEDED for result in out.steps.values())
+    assert out.steps["packages"].duration >= engine.delay
+
+
+def test_failed_step_skips_dependents():
+    out = graph(packages_cmd="fail").run(FakeEngine(delay=0))
+
+    assert out.exit_status == 1
+    assert out.steps["packages"].status == FAILED
+    assert out.steps["configure"].status == SUCCEEDED
+    assert out.steps["register"].status == SKIPPED
+    assert out.steps["enable"].status == SKIPPED
+    assert out.failed == ["packages"]
+    assert sorted(out.skipped) == ["enable", "register"]
+
+
+def test_run_async():
+    engine = AsyncFakeEngine()
+    out = asyncio.run(graph().run_async(engine))
+
+    assert out.exit_status == 0
+    assert engine.max_running == 2
+    assert list(out.steps)[-1] == "enable"
+
+
+def test_invalid_graphs():
+    with pytest.raises(ValueError, match="cycle"):
+        StepGraph([Step("a", ["a"], requires=["b"]), Step("b", ["b"], requires=["a"])])
+    with pytest.raises(ValueError, match="unknown"):
+        StepGraph([Step("a", ["a"], requires=["missing"])])
+    with pytest.raises(ValueError, match="Duplicated"):
+        StepGraph([Step("a", ["a"]), Step("a", ["b"])])
+
+
+def test_sequential_engine_runs_one_step_at_a_time():
+    engine = FakeEngine(delay=0.05)
+    engine.sequential = True
+    out = graph().run(engine)
+
+    assert out.exit_status == 0
+    assert engine.max_running == 1
+    assert list(out.steps) == ["packages", "configure", "register", "enable"]
+
+
+def test_insights_client_profile_order(stub_podman):
+    config = {
+        "subscription": {"username": "u", "password": "p"},
+        "insights_client": {"conf_path": "etc/insights-client/insights-client.conf"},
+    }
+    rc = RhelContainer(name="rhel-steps", config={"RHEL_CONTAINERS": config})
+    requires = {step.name: step.requires for step in rc._insights_client_steps()}
+    assert requires == {
+        "subscribe": (),
+        "packages": ("subscribe",),
+        "configure": ("packages",),
+        "register": ("subscribe", "packages", "configure"),
+    }
+
+    rc.start()
+    spans = {}
+    hook = tracing.add_hook(lambda span: spans.setdefault(span.name, span))
+    try:
+        assert rc.setup("insights-client").exit_status == 0
+    finally:
+        tracing.remove_hook(hook)
+        rc.stop()
+    order = sorted(
+        ("subscribe", "packages", "configure", "register"),
+        key=lambda name: spans[f"step.{name}"].start,
+    )
+    assert order == ["subscribe", "packages", "configure", "register"]
+    packages = spans["step.packages"]
+    assert spans["step.configure"].start >= packages.start + packages.duration
@@ -0,0 +1,70 @@
+from rhel_containers import RhelContainer
+from rhel_containers import tracing
+from rhel_containers.engine import ContCommandResult
+from rhel_containers.tracing import LatencyMetrics
+from rhel_containers.tracing import redact
+from rhel_containers.tracing import traced
+
+
+class Dummy:
+    name = "rhel-test"
+
+    @traced("dummy")
+    def run(self, exit_status=0):
+        with tracing.span("engine.exec", self.name, ["podman", "exec", "--password=s3cret"]):
+            pass
+        return ContCommandResult(exit_status=exit_status, stdout="out", stderr="")
+
+
+def test_redact():
+    assert redact("register --username=u --password=p@ss --force") == (
+        "register --username=u --password=*** --force"
+    )
+    assert redact("login --token 'a b' x") == "login --token *** x"
+    assert redact("password: hunter2") == "password: ***"
+
+
+def test_traced_spans_and_metrics():
+    assert tracing.span("noop") is tracing.NO_SPAN
+
+    spans = []
+    tracing.add_hook(spans.append)
+    metrics = tracing.add_hook(LatencyMetrics(buckets=(1,)))
+    try:
+        Dummy().run()
+        Dummy().run(exit_status=1)
+    finally:
+        tracing.remove_hook(spans.append)
+        tracing.remove_hook(metrics)
+
+    inner, outer = spans[:2]
+    assert (inner.name, outer.name) == ("engine.exec", "dummy")
+    assert inner.parent_id == outer.span_id
+    assert inner.command == "podman exec --password=***"
+    assert (outer.container, outer.exit_status, outer.output_size) == ("rhel-test", 0, 3)
+
+    data = metrics.to_dict()
+    assert data["dummy"]["count"] == 2
+    assert data["dummy"]["failures"] == 1
+    assert data["dummy"]["buckets"] == {"1": 2, "+Inf": 2}
+    assert 'rhel_containers_operation_seconds_count{operation="dummy"} 2' in (
+        metrics.to_prometheus()
+    )
+
+
+def test_setup_profile_traces_register(stub_podman):
+    credentials = {"subscription": {"username": "u", "password": "p"}}
+    rc = RhelContainer(name="rhel-traced", config={"RHEL_CONTAINERS": credentials})
+    rc.start()
+    spans = []
+    tracing.add_hook(spans.append)
+    try:
+        rc.setup("insights-client")
+    finally:
+        tracing.remove_hook(spans.append)
+        rc.stop()
+
+    by_name = {span.name: span for span in spans}
+    register = by_name["subscription.register"]
+    assert register.parent_id == by_name["step.subscribe"].span_id
+    assert register.container == "rhel-traced"
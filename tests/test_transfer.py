@@ -0,0 +1,61 @@
+import logging
+
+from rhel_containers import RhelContainer
+from rhel_containers.transfer import put_script
+from rhel_containers.transfer import receive
+from rhel_containers.transfer import send
+from rhel_containers.transfer import SKIP
+from rhel_containers.transfer import Source
+
+# local bash stands in for an engine exec.
+CONTENT = b"\x00binary $HOME\nEOF\n"
+
+
+def _put(path, source, **kwargs):
+    script = put_script(str(path), **kwargs)
+    return send(["bash", "-c", script], source, handshake=True)
+
+
+def test_put_skips_identical_file(tmp_path):
+    path = tmp_path / "sub dir" / "file.bin"
+    source = Source(data=CONTENT)
+
+    assert _put(path, source, digest=source.sha256(), mode=0o600).exit_status == 0
+    assert path.read_bytes() == CONTENT
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert _put(path, source, digest=source.sha256()).stdout == SKIP
+
+    _put(path, Source(data="more\n"), append=True)
+    assert path.read_bytes() == CONTENT + b"more\n"
+
+
+def test_receive_removes_partial_file(tmp_path):
+    dest = tmp_path / "dest"
+    assert receive(["bash", "-c", "printf abc; exit 1"], dest).exit_status == 1
+    assert not dest.exists()
+    assert receive(["printf", "abc"], dest).exit_status == 0
+    assert dest.read_bytes() == b"abc"
+
+
+def test_send_drains_stderr(tmp_path):
+    # a child filling its stderr pipe before reading stdin would deadlock an undrained send.
+    script = "head -c 1000000 /dev/zero >&2; cat >/dev/null; echo done"
+    out = send(["bash", "-c", script], Source(data=b"x" * 1000000))
+    assert (out.exit_status, out.stdout) == (0, "done")
+
+
+def test_failure_logs_redacted(stub_podman, caplog):
+    rc = RhelContainer(name="rhel-redact")
+    rc.start(timeout=10)
+    with caplog.at_level(logging.DEBUG, logger="rhel_containers"):
+        stream = rc.engine.exec_stream("seq 3; echo --password=s3cret; exit 3", tail=1)
+        assert stream.wait().exit_status == 3
+        with rc.engine.exec_pipe("sleep 30; echo token: s3cret", timeout=0.5) as pipe:
+            assert pipe.wait().timed_out
+        out = rc.engine.put_file("/proc/rc-test/--password=s3cret", data="x", checksum=False)
+        assert out.exit_status != 0
+    rc.stop()
+
+    assert "truncated" in caplog.text and "Timed out" in caplog.text
+    assert caplog.text.count("Error:") == 2
+    assert "s3cret" not in caplog.text